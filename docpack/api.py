@@ -2,8 +2,14 @@
 
 from .constants import GitHubFileFieldEnum
 from .constants import ConfluencePageFieldEnum
+from .constants import GitHubFileSourceEnum
+from .constants import CompressionEnum
 from .find_matching_files import find_matching_files
 from .github_fetcher import GitHubFile
 from .github_fetcher import GitHubPipeline
 from .confluence_fetcher import ConfluencePage
 from .confluence_fetcher import ConfluencePipeline
+from .bundle import BundleReader
+from .dedup import ContentStore
+from .near_dedup import MinHashLSH
+from .tokens import TokenCounter
@@ -0,0 +1,509 @@
+# -*- coding: utf-8 -*-
+
+"""
+All-in-one knowledge base output.
+
+A pipeline with ``path_bundle`` streams every document straight into one
+bundle file, in the pipeline order, through a buffered writer, instead of
+writing one file per document and concatenating them afterwards. Next to the
+bundle, an offset index file records where each document starts and how long
+it is, so any document can be located without scanning the bundle, see
+:class:`BundleReader`.
+
+With ``max_bytes`` and / or ``max_tokens``, the bundle is split into numbered
+shards (``knowledge_base-001.txt``, ``knowledge_base-002.txt``, ...) that
+respect the upload limits of AI tools. A document is never split across shards.
+
+With ``compression``, every document is compressed into its own gzip member or
+zstd frame and the suffix (``.gz`` / ``.zst``) is appended to the file names.
+Concatenated members / frames are still a valid compressed file, so
+``zcat knowledge_base.txt.gz`` gives the same text as the uncompressed bundle,
+and :class:`BundleReader` can still decompress any single document without
+touching the others. Compressing each document on its own costs a few percent
+of compression ratio compared to one stream, in exchange for random access.
+"""
+
+import typing as T
+import io
+import json
+import mmap
+from pathlib import Path
+
+from pydantic import BaseModel, Field
+
+from .constants import CompressionEnum
+from .tokens import estimate_tokens
+from .compression import get_suffix, compress, decompress
+
+if T.TYPE_CHECKING:  # pragma: no cover
+    from .xml_serializer import XmlSerializer
+
+INDEX_SUFFIX = ".index.json"
+DOCUMENT_SEPARATOR = "\n"
+DEFAULT_BUFFER_SIZE = 1024 * 1024
+
+
+def get_path_index(path_bundle: Path) -> Path:
+    """
+    Get the path of the offset index of a bundle, e.g.
+    ``knowledge_base.txt`` -> ``knowledge_base.txt.index.json``.
+    """
+    return path_bundle.with_name(path_bundle.name + INDEX_SUFFIX)
+
+
+def get_path_shard(path_bundle: Path, nth: int) -> Path:
+    """
+    Get the path of the nth (starts from 1) shard of a bundle, e.g.
+    ``knowledge_base.txt`` -> ``knowledge_base-001.txt``.
+    """
+    return path_bundle.with_name(f"{path_bundle.stem}-{nth:03d}{path_bundle.suffix}")
+
+
+class BundleIndexEntry(BaseModel):
+    """
+    Where a document is in the bundle.
+
+    :param key: The document identifier, the relative path of a GitHub file
+        or the id of a Confluence page.
+    :param url: The GitHub url or the Confluence page url.
+    :param uri_hash: The :attr:`~docpack.github_fetcher.GitHubFile.uri_hash`
+        of a GitHub file, empty for a Confluence page.
+    :param shard: Position of the file that contains the document in
+        :attr:`BundleIndex.shards`.
+    :param offset: Byte offset of the document in that file.
+    :param length: Byte length of the document, without the separator.
+        In a compressed bundle, the offset and length of the compressed
+        document, which starts with the separator unless the offset is 0.
+    """
+
+    key: str = Field()
+    url: str = Field()
+    uri_hash: str = Field(default="")
+    shard: int = Field(default=0)
+    offset: int = Field()
+    length: int = Field()
+
+
+class BundleIndex(BaseModel):
+    """
+    The content of the offset index file.
+
+    To keep the file compact and fast to load, it is stored by column: the
+    nth item of ``keys``, ``urls``, ``uri_hashes``, ``shard_ids``, ``offsets``
+    and ``lengths`` describes the nth document, see :class:`BundleIndexEntry`.
+
+    :param bundle: File name of the bundle.
+    :param shards: File names of the files that hold the documents, it is
+        ``[bundle]`` (plus the compression suffix) unless the bundle is sharded.
+    :param compression: The compression of the documents, ``None`` if not
+        compressed, see :class:`~docpack.constants.CompressionEnum`.
+    """
+
+    bundle: str = Field()
+    shards: list[str] = Field(default_factory=list)
+    compression: T.Optional[str] = Field(default=None)
+    keys: list[str] = Field(default_factory=list)
+    urls: list[str] = Field(default_factory=list)
+    uri_hashes: list[str] = Field(default_factory=list)
+    shard_ids: list[int] = Field(default_factory=list)
+    offsets: list[int] = Field(default_factory=list)
+    lengths: list[int] = Field(default_factory=list)
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def append(self, entry: BundleIndexEntry):
+        """
+        Add a document at the end of the index.
+        """
+        self.keys.append(entry.key)
+        self.urls.append(entry.url)
+        self.uri_hashes.append(entry.uri_hash)
+        self.shard_ids.append(entry.shard)
+        self.offsets.append(entry.offset)
+        self.lengths.append(entry.length)
+
+    def get_entry(self, nth: int) -> BundleIndexEntry:
+        """
+        Get the entry of the nth document.
+        """
+        return BundleIndexEntry.model_construct(
+            key=self.keys[nth],
+            url=self.urls[nth],
+            uri_hash=self.uri_hashes[nth],
+            shard=self.shard_ids[nth],
+            offset=self.offsets[nth],
+            length=self.lengths[nth],
+        )
+
+    @property
+    def documents(self) -> list[BundleIndexEntry]:
+        """
+        The entries of all documents, in bundle order.
+        """
+        return [self.get_entry(nth) for nth in range(len(self))]
+
+    @classmethod
+    def read(cls, path_bundle: Path) -> "BundleIndex":
+        """
+        Read the offset index of a bundle.
+        """
+        path_index = get_path_index(path_bundle)
+        data = json.loads(path_index.read_text(encoding="utf-8"))
+        # validating every item of the columns would cost more than parsing
+        # them, the file is written by BundleWriter, only check the columns
+        data.setdefault("compression", None)
+        index = cls.model_construct(**data)
+        if len({len(getattr(index, name)) for name in _column_list}) != 1:
+            raise ValueError(f"Invalid bundle index: {path_index}")
+        return index
+
+    def write(self, path_bundle: Path):
+        """
+        Write the offset index next to the bundle.
+        """
+        path_index = get_path_index(path_bundle)
+        content = json.dumps(self.model_dump(), ensure_ascii=False)
+        path_index.write_text(content, encoding="utf-8")
+
+
+_separator_bytes = DOCUMENT_SEPARATOR.encode("utf-8")
+
+_column_list = ["keys", "urls", "uri_hashes", "shard_ids", "offsets", "lengths"]
+
+
+class BundleWriter:
+    """
+    Stream documents into a bundle file and write its offset index on close.
+    If the ``with`` block raises, the partial bundle and its index are
+    deleted instead, see :meth:`abort`.
+
+    It is a file like object: :meth:`write` encodes the text to UTF-8 and
+    counts the bytes, so the offsets are known without calling ``tell``
+    (which would flush the buffer on every document).
+
+    Example:
+
+    .. code-block:: python
+
+        with BundleWriter(path_bundle) as bundle_writer:
+            for github_file in github_file_list:
+                bundle_writer.add_document(
+                    obj=github_file,
+                    serializer=serializer,
+                    key=github_file.path,
+                    url=github_file.github_url,
+                    uri_hash=github_file.uri_hash,
+                )
+
+    If ``max_bytes`` or ``max_tokens`` is set, the documents are written into
+    numbered shards next to ``path_bundle`` (see :func:`get_path_shard`), a new
+    shard is started when the next document does not fit. A document larger
+    than the limit gets a shard of its own. Shards left over by a previous
+    run with more shards are removed on close. With ``compression``, the
+    limit applies to the compressed size.
+
+    :param path_bundle: Path of the bundle file, the parent directory is
+        created if needed.
+    :param buffer_size: Size of the write buffer in bytes.
+    :param max_bytes: Maximum size of a shard in bytes.
+    :param max_tokens: Maximum estimated number of tokens of a shard.
+    :param count_tokens: The function to estimate the number of tokens of
+        a document, default to :func:`estimate_tokens`.
+    :param compression: If set, compress every document, see
+        :class:`~docpack.constants.CompressionEnum`.
+    :param compression_level: The compression level, see
+        :func:`~docpack.compression.get_level`.
+    """
+
+    def __init__(
+        self,
+        path_bundle: Path,
+        buffer_size: int = DEFAULT_BUFFER_SIZE,
+        max_bytes: int | None = None,
+        max_tokens: int | None = None,
+        count_tokens: T.Callable[[str], int] = estimate_tokens,
+        compression: str | None = None,
+        compression_level: int | None = None,
+    ):
+        self.path_bundle = path_bundle
+        self.buffer_size = buffer_size
+        self.max_bytes = max_bytes
+        self.max_tokens = max_tokens
+        self.count_tokens = count_tokens
+        self.is_sharded = max_bytes is not None or max_tokens is not None
+        if compression is not None:
+            compression = CompressionEnum(compression).value
+        self.compression = compression
+        self.compression_level = compression_level
+        self.suffix = get_suffix(compression)
+        self.index = BundleIndex(bundle=path_bundle.name, compression=compression)
+        self.offset = 0
+        self.n_tokens = 0
+        self.n_document = 0  # number of documents in the current file
+        self.f: io.BufferedWriter | None = None
+        self.closed = False
+        self.path_bundle.parent.mkdir(parents=True, exist_ok=True)
+        try:
+            self.old_shards = BundleIndex.read(path_bundle).shards
+        except (FileNotFoundError, ValueError):
+            self.old_shards = []
+        if self.is_sharded is False:
+            self._open(path_bundle)
+
+    def _open(self, path: Path):
+        if self.f is not None:
+            self.f.close()
+        path = path.with_name(path.name + self.suffix)
+        self.f = path.open("wb", buffering=self.buffer_size)
+        self.index.shards.append(path.name)
+        self.offset = 0
+        self.n_tokens = 0
+        self.n_document = 0
+
+    def write(self, text: str):
+        self.write_bytes(text.encode("utf-8"))
+
+    def write_bytes(self, data: bytes):
+        self.f.write(data)
+        self.offset += len(data)
+
+    def _is_full(self, n_bytes: int, n_tokens: int) -> bool:
+        if self.f is None:
+            return True
+        if self.n_document == 0:
+            return False
+        if self.max_bytes is not None:
+            n_bytes_after = self.offset + len(DOCUMENT_SEPARATOR) + n_bytes
+            if n_bytes_after > self.max_bytes:
+                return True
+        if self.max_tokens is not None:
+            if self.n_tokens + n_tokens > self.max_tokens:
+                return True
+        return False
+
+    def _compress(self, data: bytes, has_separator: bool) -> bytes:
+        # the separator is compressed with the document, so decompressing
+        # the whole file gives the same text as an uncompressed bundle
+        if has_separator:
+            data = _separator_bytes + data
+        return compress(data, self.compression, self.compression_level)
+
+    def add_document(
+        self,
+        obj: T.Any,
+        serializer: "XmlSerializer",
+        key: str,
+        url: str,
+        uri_hash: str = "",
+    ) -> BundleIndexEntry:
+        """
+        Serialize a document into the bundle and record it in the index.
+
+        :param obj: The document, e.g. a :class:`~docpack.github_fetcher.GitHubFile`
+        :param serializer: The :class:`~docpack.xml_serializer.XmlSerializer`
+            of the document type.
+        """
+        if self.compression is not None:
+            text = serializer.to_xml(obj)
+            data = text.encode("utf-8")
+            n_tokens = 0 if self.max_tokens is None else self.count_tokens(text)
+            has_separator = self.n_document > 0
+            frame = self._compress(data, has_separator)
+            if self.is_sharded and self._is_full(n_bytes=len(frame), n_tokens=n_tokens):
+                nth = len(self.index.shards) + 1
+                self._open(get_path_shard(self.path_bundle, nth))
+                if has_separator:
+                    frame = self._compress(data, False)
+            offset = self.offset
+            self.write_bytes(frame)
+            self.n_tokens += n_tokens
+        elif self.is_sharded:
+            # the size must be known before choosing the shard,
+            # only this one document is held in memory
+            text = serializer.to_xml(obj)
+            data = text.encode("utf-8")
+            n_tokens = 0 if self.max_tokens is None else self.count_tokens(text)
+            if self._is_full(n_bytes=len(data), n_tokens=n_tokens):
+                nth = len(self.index.shards) + 1
+                self._open(get_path_shard(self.path_bundle, nth))
+            if self.n_document:
+                self.write(DOCUMENT_SEPARATOR)
+            offset = self.offset
+            self.write_bytes(data)
+            self.n_tokens += n_tokens
+        else:
+            if self.n_document:
+                self.write(DOCUMENT_SEPARATOR)
+            offset = self.offset
+            serializer.write_xml(obj, self)
+        self.n_document += 1
+        entry = BundleIndexEntry(
+            key=key,
+            url=url,
+            uri_hash=uri_hash,
+            shard=len(self.index.shards) - 1,
+            offset=offset,
+            length=self.offset - offset,
+        )
+        self.index.append(entry)
+        return entry
+
+    def close(self):
+        """
+        Flush the bundle and write the offset index.
+        """
+        if self.closed:
+            return
+        self.closed = True
+        if self.f is not None:
+            self.f.close()
+        for name in set(self.old_shards).difference(self.index.shards):
+            self.path_bundle.with_name(name).unlink(missing_ok=True)
+        self.index.write(self.path_bundle)
+
+    def abort(self):
+        """
+        Close and delete the partial bundle (all its shards), and the index
+        and shards of a previous run if any, so an incomplete bundle never
+        looks valid to a reader.
+        """
+        if self.closed:
+            return
+        self.closed = True
+        if self.f is not None:
+            self.f.close()
+        for name in set(self.old_shards).union(self.index.shards):
+            self.path_bundle.with_name(name).unlink(missing_ok=True)
+        get_path_index(self.path_bundle).unlink(missing_ok=True)
+
+    def __enter__(self) -> "BundleWriter":
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+class BundleReader:
+    """
+    Random access to the documents of a bundle written by :class:`BundleWriter`.
+
+    Only the offset index is parsed, the bundle files are memory mapped, so
+    reading one document is a single slice, no matter how big the bundle is.
+    Compressed bundles are read transparently, only the requested document
+    is decompressed.
+
+    Example:
+
+    .. code-block:: python
+
+        with BundleReader(path_bundle) as bundle_reader:
+            xml = bundle_reader.get("https://github.com/account/repo/blob/main/README.rst")
+            xml = bundle_reader.get("docs/source/index.rst") # GitHub file path
+            xml = bundle_reader.get("a1b2c3d") # GitHub file uri_hash
+            xml = bundle_reader.get("123456") # Confluence page id
+
+    :param path_bundle: Path of the bundle file, the same as the one given
+        to :class:`BundleWriter`.
+    """
+
+    def __init__(self, path_bundle: Path):
+        self.path_bundle = path_bundle
+        self.index = BundleIndex.read(path_bundle)
+        self.nth_by_key: dict[str, int] = dict()
+        self.nth_by_url: dict[str, int] = dict()
+        self.nth_by_uri_hash: dict[str, int] = dict()
+        index = self.index
+        for nth in range(len(index) - 1, -1, -1):
+            # iterate backward so the first document wins on duplicates,
+            # e.g. when two 7 character uri_hash collide
+            self.nth_by_key[index.keys[nth]] = nth
+            self.nth_by_url[index.urls[nth]] = nth
+            if index.uri_hashes[nth]:
+                self.nth_by_uri_hash[index.uri_hashes[nth]] = nth
+        self._mmap_list: list[mmap.mmap | None] = [None] * len(self.index.shards)
+        self._file_list: list[T.BinaryIO] = list()
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    def _get_mmap(self, shard: int) -> mmap.mmap:
+        mm = self._mmap_list[shard]
+        if mm is None:
+            f = self.path_bundle.with_name(self.index.shards[shard]).open("rb")
+            self._file_list.append(f)
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            self._mmap_list[shard] = mm
+        return mm
+
+    def _find(self, id: str) -> int:
+        for mapping in [self.nth_by_url, self.nth_by_key, self.nth_by_uri_hash]:
+            if id in mapping:
+                return mapping[id]
+        raise KeyError(id)
+
+    def find_entry(self, id: str) -> BundleIndexEntry:
+        """
+        Find the index entry of a document by its url, key (GitHub file path or
+        Confluence page id) or GitHub file uri_hash, in this order.
+
+        :raises KeyError: if no document matches
+        """
+        return self.index.get_entry(self._find(id))
+
+    def _read(self, shard: int, offset: int, length: int) -> bytes:
+        if length == 0:
+            return b""
+        data = self._get_mmap(shard)[offset : offset + length]
+        if self.index.compression is None:
+            return data
+        data = decompress(data)
+        if offset:
+            return data[len(_separator_bytes) :]
+        return data
+
+    def _read_bytes(self, nth: int) -> bytes:
+        index = self.index
+        return self._read(index.shard_ids[nth], index.offsets[nth], index.lengths[nth])
+
+    def read_bytes(self, entry: BundleIndexEntry) -> bytes:
+        """
+        Read the raw UTF-8 bytes of a document, decompressed if needed.
+        """
+        return self._read(entry.shard, entry.offset, entry.length)
+
+    def get(self, id: str) -> str:
+        """
+        Get the XML of a document, see :meth:`find_entry` for ``id``.
+
+        :raises KeyError: if no document matches
+        """
+        return self._read_bytes(self._find(id)).decode("utf-8")
+
+    def __iter__(self) -> T.Iterator[tuple[BundleIndexEntry, str]]:
+        """
+        Iterate over ``(index entry, XML)`` of all documents, in bundle order.
+        """
+        for nth in range(len(self.index)):
+            yield self.index.get_entry(nth), self._read_bytes(nth).decode("utf-8")
+
+    def close(self):
+        """
+        Close the memory maps and the bundle files.
+        """
+        for mm in self._mmap_list:
+            if mm is not None:
+                mm.close()
+        self._mmap_list = [None] * len(self.index.shards)
+        for f in self._file_list:
+            f.close()
+        self._file_list.clear()
+
+    def __enter__(self) -> "BundleReader":
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
@@ -0,0 +1,186 @@
+# -*- coding: utf-8 -*-
+
+"""
+Compressed output.
+
+The exported documents and the bundles can be written with gzip (standard
+library) or zstd (``pip install "docpack[zstd]"``), see
+:class:`~docpack.constants.CompressionEnum`. The writers stream the data
+through the compressor, the readers detect the format from the magic bytes,
+so a compressed file can be read without knowing how it was written.
+
+gzip is written with ``mtime=0``, the same input always gives the same bytes.
+"""
+
+import typing as T
+import io
+import gzip
+from pathlib import Path
+
+from .constants import CompressionEnum
+
+GZIP_MAGIC = b"\x1f\x8b"
+ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+
+_suffix_mapping = {
+    CompressionEnum.gzip.value: ".gz",
+    CompressionEnum.zstd.value: ".zst",
+}
+_default_level_mapping = {
+    CompressionEnum.gzip.value: 6,
+    CompressionEnum.zstd.value: 3,
+}
+
+
+def _import_zstandard():
+    try:
+        import zstandard
+    except ImportError as e:  # pragma: no cover
+        raise ImportError(
+            'zstd compression requires zstandard, run: pip install "docpack[zstd]"'
+        ) from e
+    return zstandard
+
+
+def _normalize(compression: T.Optional[str]) -> T.Optional[str]:
+    if compression is None:
+        return None
+    return CompressionEnum(compression).value
+
+
+def get_suffix(compression: T.Optional[str]) -> str:
+    """
+    Get the file name suffix of a compression, ``""`` if not compressed.
+    """
+    compression = _normalize(compression)
+    if compression is None:
+        return ""
+    return _suffix_mapping[compression]
+
+
+def get_level(compression: str, level: T.Optional[int] = None) -> int:
+    """
+    Get the compression level, default to 6 for gzip and 3 for zstd,
+    which are good trade-offs between speed and size.
+    """
+    if level is None:
+        return _default_level_mapping[_normalize(compression)]
+    return level
+
+
+def detect_compression(data: bytes) -> T.Optional[str]:
+    """
+    Detect the compression from the first bytes of the data,
+    ``None`` if it is not compressed.
+    """
+    if data.startswith(GZIP_MAGIC):
+        return CompressionEnum.gzip.value
+    if data.startswith(ZSTD_MAGIC):
+        return CompressionEnum.zstd.value
+    return None
+
+
+def compress(
+    data: bytes,
+    compression: str,
+    level: T.Optional[int] = None,
+) -> bytes:
+    """
+    Compress the data into one gzip member or zstd frame. Compressed members
+    or frames can be concatenated, the result decompresses to the
+    concatenation of the inputs.
+    """
+    compression = _normalize(compression)
+    level = get_level(compression, level)
+    if compression == CompressionEnum.gzip.value:
+        return gzip.compress(data, compresslevel=level, mtime=0)
+    zstandard = _import_zstandard()
+    return zstandard.ZstdCompressor(level=level).compress(data)
+
+
+def decompress(data: bytes) -> bytes:
+    """
+    Decompress the data, the format is detected from the magic bytes.
+    Data that is not compressed is returned as is.
+    """
+    compression = detect_compression(data)
+    if compression is None:
+        return data
+    if compression == CompressionEnum.gzip.value:
+        return gzip.decompress(data)
+    zstandard = _import_zstandard()
+    # a frame written by a stream writer does not record the content size,
+    # which ZstdDecompressor.decompress requires
+    with zstandard.ZstdDecompressor().stream_reader(
+        io.BytesIO(data), read_across_frames=True
+    ) as reader:
+        return reader.read()
+
+
+def open_binary_writer(
+    path: Path,
+    compression: T.Optional[str] = None,
+    level: T.Optional[int] = None,
+    buffer_size: int = io.DEFAULT_BUFFER_SIZE,
+) -> T.BinaryIO:
+    """
+    Open a file for writing, the data written to it is compressed on the fly.
+    """
+    compression = _normalize(compression)
+    f = path.open("wb", buffering=buffer_size)
+    if compression is None:
+        return f
+    level = get_level(compression, level)
+    if compression == CompressionEnum.gzip.value:
+        return _GzipWriter(f, level)
+    zstandard = _import_zstandard()
+    return zstandard.ZstdCompressor(level=level).stream_writer(f, closefd=True)
+
+
+class _GzipWriter(gzip.GzipFile):
+    """
+    A :class:`gzip.GzipFile` that closes the underlying file object.
+    """
+
+    def __init__(self, f: T.BinaryIO, level: int):
+        super().__init__(
+            filename="", mode="wb", fileobj=f, compresslevel=level, mtime=0
+        )
+        self._raw_fileobj = f
+
+    def close(self):
+        try:
+            super().close()
+        finally:
+            self._raw_fileobj.close()
+
+
+def open_text_writer(
+    path: Path,
+    compression: T.Optional[str] = None,
+    level: T.Optional[int] = None,
+) -> T.TextIO:
+    """
+    Open a UTF-8 text file for writing, see :func:`open_binary_writer`.
+    """
+    if compression is None:
+        return path.open("w", encoding="utf-8")
+    return io.TextIOWrapper(
+        open_binary_writer(path, compression, level),
+        encoding="utf-8",
+    )
+
+
+def read_bytes(path: Path) -> bytes:
+    """
+    Read a file written by docpack, compressed or not.
+    """
+    return decompress(path.read_bytes())
+
+
+def read_text(path: Path) -> str:
+    """
+    Read a UTF-8 text file written by docpack, compressed or not, with the
+    same newline translation as :meth:`pathlib.Path.read_text`.
+    """
+    return io.TextIOWrapper(io.BytesIO(read_bytes(path)), encoding="utf-8").read()
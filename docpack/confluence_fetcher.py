@@ -5,19 +5,127 @@ Confluence page fetching and processing utilities.
 """
 
 import typing as T
+import os
+import sys
 import json
+import math
+import bisect
 import gzip
+import contextlib
 from pathlib import Path
-from functools import cached_property
+from concurrent.futures import ThreadPoolExecutor
+from functools import cached_property, lru_cache
 
 from diskcache import Cache
-from pydantic import BaseModel, Field, ConfigDict
+from pydantic import BaseModel, Field, ConfigDict, PrivateAttr
 import pyatlassian.api as pyatlassian
 import atlas_doc_parser.api as atlas_doc_parser
-
-from .constants import TAB, ConfluencePageFieldEnum
+from atlas_doc_parser import __version__ as atlas_doc_parser_version
+
+from ._version import __version__
+from .constants import ConfluencePageFieldEnum
+from .xml_serializer import XmlElement, XmlSerializer
+from .compression import get_suffix
+from .bundle import BundleWriter
+from .dedup import DUPLICATE_OF, ContentStore, DuplicateDocument
+from .near_dedup import MinHashLSH
+from .tokens import (
+    estimate_tokens,
+    estimate_tokens_by_size,
+    TokenCounter,
+    pack_by_budget,
+)
+from .plan import PlanItem, Plan, count_bundle_shards
+from .manifest import get_fingerprint, Manifest, SyncSummary
 from .paths import dir_cache
 
+# maximum page size of the get pages API
+GET_PAGES_LIMIT = 250
+# number of page bodies downloaded per request, see fetch_page_bodies
+BODY_BATCH_SIZE = 50
+# the markdown of a page depends on both libraries, see get_markdown_cache_key
+MARKDOWN_CONVERTER_VERSION = (
+    f"docpack-{__version__}+atlas_doc_parser-{atlas_doc_parser_version}"
+)
+
+
+@lru_cache(maxsize=None)
+def _compile_confluence_page_xml_serializer(
+    wanted_fields: tuple[str, ...] | None,
+    duplicate: bool = False,
+) -> XmlSerializer:
+    if wanted_fields is None:
+        wanted_fields = tuple(field.value for field in ConfluencePageFieldEnum)
+    element_list = [
+        XmlElement(
+            field=ConfluencePageFieldEnum.source_type.value,
+            constant="Confluence Page",
+        ),
+        XmlElement(
+            field=ConfluencePageFieldEnum.confluence_url.value,
+            attr="webui_url",
+        ),
+        XmlElement(field=ConfluencePageFieldEnum.title.value, attr="title"),
+        XmlElement(
+            field=ConfluencePageFieldEnum.markdown_content.value,
+            attr="markdown",
+            block=True,
+        ),
+    ]
+    element_list = [
+        element for element in element_list if element.field in wanted_fields
+    ]
+    # the markdown content is the last element
+    if (
+        duplicate
+        and element_list
+        and element_list[-1].field == ConfluencePageFieldEnum.markdown_content.value
+    ):
+        element_list[-1] = XmlElement(field=DUPLICATE_OF, attr=DUPLICATE_OF)
+    return XmlSerializer.new(element_list)
+
+
+def get_confluence_page_xml_serializer(
+    wanted_fields: list[str] | None = None,
+    duplicate: bool = False,
+) -> XmlSerializer:
+    """
+    Get the :class:`~docpack.xml_serializer.XmlSerializer` of :class:`ConfluencePage`
+    for the given ``wanted_fields``, it is compiled only once per ``wanted_fields``.
+
+    :param duplicate: If True, the serializer of a
+        :class:`~docpack.dedup.DuplicateDocument`, the ``markdown_content``
+        is replaced by a ``<duplicate_of>`` reference.
+    """
+    return _compile_confluence_page_xml_serializer(
+        None if wanted_fields is None else tuple(wanted_fields),
+        duplicate,
+    )
+
+
+def estimate_markdown_size(atlas_doc: dict[str, T.Any]) -> int:
+    """
+    Estimate the number of characters of the markdown of an Atlas Doc Format
+    document without converting it: the length of the text nodes plus one
+    line break per other node.
+    """
+    n_chars = 0
+    stack = [atlas_doc]
+    while stack:
+        node = stack.pop()
+        if node.get("type") == "text":
+            n_chars += len(node.get("text", ""))
+        else:
+            n_chars += 1
+            stack.extend(node.get("content", ()))
+    return n_chars
+
+
+class _PageMetadata(T.NamedTuple):
+    webui_url: str
+    title: str
+    markdown: str
+
 
 class ConfluencePage(BaseModel):
     """
@@ -41,6 +149,8 @@ class ConfluencePage(BaseModel):
 
     Properties like `id`, `title`, `parent_id` provide convenient access to commonly
     used attributes from the raw page data.
+
+    The markdown is converted once per page object and body, see :attr:`markdown`.
     """
 
     page_data: dict[str, T.Any] = Field()
@@ -49,6 +159,9 @@ class ConfluencePage(BaseModel):
     position_path: T.Optional[str] = Field()
     breadcrumb_path: T.Optional[str] = Field()
 
+    # (title, Atlas Doc Format body, markdown) of the last conversion
+    _markdown: T.Optional[tuple[str, str, str]] = PrivateAttr(default=None)
+
     @property
     def space_id(self) -> str:
         return self.page_data["spaceId"]
@@ -73,6 +186,23 @@ class ConfluencePage(BaseModel):
     def position(self) -> int:
         return self.page_data["position"]
 
+    @property
+    def version(self) -> str:
+        """
+        The version of the page: ``version.number``, or the time of the last
+        modification if there is no number, an empty string if unknown.
+        It is in the metadata listing, no body is needed.
+        """
+        version = self.page_data.get("version") or {}
+        return str(version.get("number", version.get("createdAt", "")))
+
+    @property
+    def has_body(self) -> bool:
+        """
+        Whether the Atlas Doc Format body is in ``page_data``.
+        """
+        return "atlas_doc_format" in self.page_data.get("body", {})
+
     @property
     def atlas_doc(self) -> dict[str, T.Any]:
         return json.loads(self.page_data["body"]["atlas_doc_format"]["value"])
@@ -83,8 +213,10 @@ class ConfluencePage(BaseModel):
         webui_url = f"{self.site_url}/wiki{webui_link}"
         return webui_url
 
-    @property
-    def markdown(self) -> str:
+    def convert_markdown(self) -> str:
+        """
+        Convert the Atlas Doc Format body to markdown, without any cache.
+        """
         node_doc = atlas_doc_parser.NodeDoc.from_dict(
             dct=self.atlas_doc,
             ignore_error=True,
@@ -98,6 +230,24 @@ class ConfluencePage(BaseModel):
         md_content = "\n".join(lines)
         return md_content
 
+    def _get_markdown_source(self) -> tuple[str, str]:
+        return self.title, self.page_data["body"]["atlas_doc_format"]["value"]
+
+    @property
+    def markdown(self) -> str:
+        """
+        The markdown of the page, converted on first access and then reused
+        by the export, the duplicate detections and the token counting, until
+        the title or the body in ``page_data`` changes (e.g. in a hook). It
+        can also be loaded from a disk cache with :func:`load_markdown`.
+        """
+        title, body = self._get_markdown_source()
+        memo = self._markdown
+        if memo is None or memo[0] != title or memo[1] != body:
+            memo = (title, body, self.convert_markdown())
+            self._markdown = memo
+        return memo[2]
+
     def to_xml(
         self,
         wanted_fields: list[str] | None = None,
@@ -108,52 +258,67 @@ class ConfluencePage(BaseModel):
         This method generates an XML representation of the file including its GitHub
         metadata and content, suitable for document storage or AI context input.
         """
-        if wanted_fields is None:
-            wanted_fields = [field.value for field in ConfluencePageFieldEnum]
-        lines = list()
-        lines.append("<document>")
-        if ConfluencePageFieldEnum.source_type.value in wanted_fields:
-            field = ConfluencePageFieldEnum.source_type.value
-            lines.append(f"{TAB}<{field}>Confluence Page</{field}>")
-        if ConfluencePageFieldEnum.confluence_url.value in wanted_fields:
-            field = ConfluencePageFieldEnum.confluence_url.value
-            lines.append(f"{TAB}<{field}>{self.webui_url}</{field}>")
-        if ConfluencePageFieldEnum.title.value in wanted_fields:
-            field = ConfluencePageFieldEnum.title.value
-            lines.append(f"{TAB}<{field}>{self.title}</{field}>")
-        # if self.description:
-        #     lines.append(f"{TAB}<description>")
-        #     lines.append(self.description)
-        #     lines.append(f"{TAB}</description>")
-        if ConfluencePageFieldEnum.markdown_content.value in wanted_fields:
-            field = ConfluencePageFieldEnum.markdown_content.value
-            lines.append(f"{TAB}<{field}>")
-            lines.append(self.markdown)
-            lines.append(f"{TAB}</{field}>")
-        lines.append("</document>")
-
-        return "\n".join(lines)
+        return get_confluence_page_xml_serializer(wanted_fields).to_xml(self)
+
+    def write_xml(
+        self,
+        fileobj: T.TextIO,
+        wanted_fields: list[str] | None = None,
+    ):
+        """
+        Same as :meth:`to_xml`, but write the XML directly to an open text file.
+        """
+        get_confluence_page_xml_serializer(wanted_fields).write_xml(self, fileobj)
+
+    def estimate_tokens(
+        self,
+        wanted_fields: list[str] | None = None,
+        token_counter: TokenCounter | None = None,
+    ) -> int:
+        """
+        Count the tokens of the XML document, i.e. what it costs in the
+        context window of a model.
+
+        :param token_counter: The :class:`~docpack.tokens.TokenCounter`,
+            default to the built-in heuristic.
+        """
+        xml = self.to_xml(wanted_fields)
+        if token_counter is None:
+            return estimate_tokens(xml)
+        return token_counter.count(xml)
+
+    def get_path_out(
+        self,
+        dir_out: Path,
+        compression: str | None = None,
+    ) -> Path:
+        """
+        Get the path of the XML file that :meth:`export_to_file` writes.
+        """
+        fname = self.breadcrumb_path[3:].replace("||", "~")
+        return dir_out.joinpath(f"{fname}.xml{get_suffix(compression)}")
 
     def export_to_file(
         self,
         dir_out: Path,
         wanted_fields: list[str] | None = None,
+        compression: str | None = None,
+        compression_level: int | None = None,
     ) -> Path:
-        fname = self.breadcrumb_path[3:].replace("||", "~")
-        basename = f"{fname}.xml"
-        path_out = dir_out.joinpath(basename)
-        content = self.to_xml(wanted_fields=wanted_fields)
-        try:
-            path_out.write_text(content, encoding="utf-8")
-        except FileNotFoundError:
-            path_out.parent.mkdir(parents=True)
-            path_out.write_text(content, encoding="utf-8")
+        path_out = self.get_path_out(dir_out=dir_out, compression=compression)
+        get_confluence_page_xml_serializer(wanted_fields).write_file(
+            self,
+            path_out,
+            compression=compression,
+            compression_level=compression_level,
+        )
         return path_out
 
 
 def fetch_raw_pages_from_space(
     confluence: pyatlassian.confluence.Confluence,
     space_id: int,
+    body_format: str | None = None,
 ) -> list[ConfluencePage]:
     """
     Crawls and retrieves all pages from a Confluence space using pagination.
@@ -162,15 +327,26 @@ def fetch_raw_pages_from_space(
     to a ConfluencePage object with minimal initialization, and returns the complete
     collection without processing hierarchical relationships.
 
+    By default only the metadata (id, parentId, position, title, version, ...)
+    is listed, which is all the hierarchy needs, the bodies of the matched
+    pages are downloaded later with :func:`fetch_page_bodies`.
+
     :param confluence: Authenticated Confluence API client
     :param space_id: ID of the Confluence space to crawl
+    :param body_format: If set (e.g. ``"atlas_doc_format"``), also download
+        the body of every page with the listing.
 
     :returns: List of :class:`ConfluencePage` objects with initialized page_data and site_url,
         but without hierarchy information (id_path, position_path, breadcrumb_path)
     """
+    kwargs = dict()
+    if body_format is not None:
+        kwargs["body_format"] = body_format
     paginator = confluence.pagi_get_pages(
         space_id=[int(space_id)],
-        body_format="atlas_doc_format",
+        limit=GET_PAGES_LIMIT,
+        total_max_results=sys.maxsize,
+        **kwargs,
     )
     confluence_page_list = list()
     for ith, response in enumerate(paginator, start=1):
@@ -186,6 +362,179 @@ def fetch_raw_pages_from_space(
     return confluence_page_list
 
 
+def get_page_body_cache_key(page: ConfluencePage) -> tuple[str, str, str, str]:
+    """
+    Get the key of the body of a page in the cache, see :func:`fetch_page_bodies`.
+    The version is part of the key, so the body of an edited page is never
+    served from the cache.
+    """
+    return ("body", page.site_url, page.id, page.version)
+
+
+def load_page_bodies_from_cache(
+    pages: list[ConfluencePage],
+    cache: Cache,
+):
+    """
+    Set the body of the pages that do not have it yet from the cache, when
+    the body of their current version is there, see :func:`fetch_page_bodies`.
+    """
+    for page in pages:
+        if page.has_body or page.version == "":
+            continue
+        cache_value = cache.get(get_page_body_cache_key(page))
+        if cache_value is not None:
+            page.page_data["body"] = json.loads(
+                gzip.decompress(cache_value).decode("utf-8")
+            )
+
+
+def fetch_page_bodies(
+    confluence: pyatlassian.confluence.Confluence,
+    pages: list[ConfluencePage],
+    batch_size: int = BODY_BATCH_SIZE,
+    max_workers: int = 4,
+    cache: Cache | None = None,
+    expire: int | None = None,
+) -> list[ConfluencePage]:
+    """
+    Download the Atlas Doc Format body of the pages that do not have it yet,
+    ``batch_size`` pages per request (filtered by page id), with up to
+    ``max_workers`` concurrent requests. The body is stored in ``page_data``.
+
+    If ``cache`` is set, the bodies are cached by site, page id and version,
+    compressed with gzip: the cached bodies are not downloaded again, and the
+    downloaded ones are added to the cache.
+
+    :param confluence: Authenticated Confluence API client
+    :param pages: The pages, e.g. the matched pages of
+        :func:`find_matching_pages`
+    :param batch_size: Number of pages per request, at most
+        :data:`GET_PAGES_LIMIT`
+    :param max_workers: Maximum number of concurrent requests
+    :param cache: The cache of the page bodies, see :func:`get_page_body_cache_key`
+    :param expire: Expiration time in seconds of the cached bodies, no
+        expiration by default
+
+    :returns: The pages that have a body, in the given order, a page deleted
+        since the listing is left out
+    """
+    if cache is not None:
+        load_page_bodies_from_cache(pages=pages, cache=cache)
+    missing_pages = [page for page in pages if page.has_body is False]
+    batch_list = [
+        missing_pages[i : i + batch_size]
+        for i in range(0, len(missing_pages), batch_size)
+    ]
+
+    def fetch_batch(batch: list[ConfluencePage]) -> dict[str, dict[str, T.Any]]:
+        paginator = confluence.pagi_get_pages(
+            # the API takes a comma separated list of ids
+            id=[",".join(page.id for page in batch)],
+            body_format="atlas_doc_format",
+            limit=len(batch),
+            total_max_results=sys.maxsize,
+        )
+        return {
+            page_data["id"]: page_data["body"]
+            for response in paginator
+            for page_data in response.get("results", [])
+        }
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for batch, body_mapping in zip(
+            batch_list, executor.map(fetch_batch, batch_list)
+        ):
+            for page in batch:
+                if page.id in body_mapping:
+                    page.page_data["body"] = body_mapping[page.id]
+                    if cache is not None and page.version != "":
+                        data = json.dumps(page.page_data["body"], ensure_ascii=False)
+                        cache.set(
+                            get_page_body_cache_key(page),
+                            gzip.compress(data.encode("utf-8")),
+                            expire=expire,
+                        )
+    return [page for page in pages if page.has_body]
+
+
+def get_markdown_cache_key(page: ConfluencePage) -> tuple[str, str, str, str, str]:
+    """
+    Get the key of the markdown of a page in the cache, see
+    :func:`load_markdown`. The site is part of the key, page ids are only
+    unique within a site. A new page version or a new converter gives a new key.
+    """
+    return (
+        "markdown",
+        page.site_url,
+        page.id,
+        page.version,
+        MARKDOWN_CONVERTER_VERSION,
+    )
+
+
+def load_markdown(
+    page: ConfluencePage,
+    cache: Cache,
+) -> str:
+    """
+    Get the markdown of the page from the cache, or get it from the page
+    (see :attr:`ConfluencePage.markdown`) and add it to the cache. A page
+    without a version is not cached.
+
+    The key does not include the body, so the body must be the one of the
+    page version, as downloaded, not a body modified by a hook.
+
+    :param page: The page, with its body
+    :param cache: The cache, it is keyed by :func:`get_markdown_cache_key`,
+        so it can be shared by several spaces and sites. Set its
+        ``size_limit`` to bound the disk usage.
+    """
+    if page.version == "":
+        return page.markdown
+    key = get_markdown_cache_key(page)
+    markdown = cache.get(key)
+    if markdown is None:
+        markdown = page.markdown
+        cache.set(key, markdown)
+    else:
+        title, body = page._get_markdown_source()
+        page._markdown = (title, body, markdown)
+    return markdown
+
+
+def _get_sibling_sort_key(page: ConfluencePage) -> tuple[bool, int]:
+    position = page.position
+    return (position is None, 0 if position is None else position)
+
+
+def _find_cycle(
+    id_to_page_mapping: dict[str, ConfluencePage],
+    unvisited_ids: set[str],
+) -> list[str] | None:
+    """
+    Find a cycle in the parent links of the pages that are not reachable from
+    a root page. Every page is walked up at most once.
+
+    :returns: The page ids of the first cycle found, ``None`` if the pages
+        are only the descendants of pages whose parent is outside the space.
+    """
+    in_progress, done = 1, 2
+    state: dict[str, int] = dict()
+    for page_id in unvisited_ids:
+        chain = list()
+        current = page_id
+        while current in unvisited_ids and current not in state:
+            state[current] = in_progress
+            chain.append(current)
+            current = id_to_page_mapping[current].parent_id
+        if state.get(current) == in_progress:
+            return chain[chain.index(current) :]
+        for id in chain:
+            state[id] = done
+    return None
+
+
 def enrich_pages_with_hierarchy_data(
     raw_pages: list[ConfluencePage],
 ) -> list[ConfluencePage]:
@@ -198,90 +547,87 @@ def enrich_pages_with_hierarchy_data(
     2. Generate position-based paths (position_path) for correct sorting
     3. Build human-readable title hierarchies (breadcrumb_path) for display
 
-    The function creates a complete hierarchy tree by iteratively processing pages
-    for up to 20 levels of depth, starting with parent pages and moving to children.
+    The parent to children adjacency is built in a single pass, then the tree
+    is walked with an iterative depth first search from the root pages, so it
+    runs in linear time and there is no depth limit. The siblings are ordered
+    by their position. Pages whose parent is outside the collection (typically
+    Confluence folders) are left out, with their descendants.
 
     :param raw_pages: List of :class:`ConfluencePage` objects with basic data but no hierarchy info
 
-    :returns: List of :class:`ConfluencePage` objects enriched with hierarchy data and sorted by
-        their position in the hierarchy
+    :returns: List of :class:`ConfluencePage` objects enriched with hierarchy data, in
+        hierarchy order (a page comes before its children)
+
+    :raises ValueError: if the parent links of some pages form a cycle
     """
     # Create a mapping of page IDs to page objects for quick lookups
     id_to_page_mapping: dict[str, ConfluencePage] = {
         page.id: page for page in raw_pages
     }
 
-    # Create a working copy of the mapping to track unprocessed pages
-    remaining_pages = dict(id_to_page_mapping)
-
-    # Limit recursion depth to avoid infinite loops with circular references
-    max_next_level = 20
-
-    # Process pages level by level, starting from root pages
-    for ith in range(1, 1 + max_next_level):
-        # print(
-        #     f"=== {ith = }, {len(remaining_pages) = }, {len(id_to_page_mapping) = }"
-        # )
-        # Exit if all pages have been processed
-        if len(remaining_pages) == 0:
-            break
-
-        # Process each remaining page
-        for id, page in list(remaining_pages.items()):
-            # Process root pages (no parent or parent outside our space)
-            if page.parent_id is None:
-                # Create hierarchy paths for root pages
-                path = f"/{page.id}"
-                sort_key = f"/{page.position}"
-                title_chain = f"|| {page.title}"
-                page.id_path = path
-                page.position_path = sort_key
-                page.breadcrumb_path = title_chain
-                # Remove from remaining pages as it's now processed
-                remaining_pages.pop(page.id)
-
-            # Process child pages
-            else:
-                # Check if the parent page is in our collection
-                if page.parent_id in id_to_page_mapping:
-                    parent_page = id_to_page_mapping[page.parent_id]
-                    # Skip if parent's paths aren't set yet (will process in later iteration)
-                    if parent_page.id_path is None:
-                        continue
-
-                    # Create hierarchy paths based on parent's paths
-                    page.id_path = f"{parent_page.id_path}/{id}"
-                    page.position_path = f"{parent_page.position_path}/{page.position}"
-                    page.breadcrumb_path = (
-                        f"{parent_page.breadcrumb_path} || {page.title}"
-                    )
-
-                    # Remove from remaining pages as it's now processed
-                    remaining_pages.pop(id)
-
-                # Handle pages with parents outside our scope (typically Confluence folders)
-                else:
-                    # Remove these pages from both mappings as they can't be processed
-                    remaining_pages.pop(id)
-                    id_to_page_mapping.pop(id)
-
-    # Sort pages based on their positions in the hierarchy
-    sorted_pages = list(
-        sorted(
-            id_to_page_mapping.values(),
-            key=lambda page: page.position_path,
+    # Single pass: root pages and parent id -> child pages
+    root_pages: list[ConfluencePage] = list()
+    children_mapping: dict[str, list[ConfluencePage]] = dict()
+    for page in id_to_page_mapping.values():
+        parent_id = page.parent_id
+        if parent_id is None:
+            root_pages.append(page)
+        elif parent_id in id_to_page_mapping:
+            children_mapping.setdefault(parent_id, []).append(page)
+
+    # Iterative depth first search, the paths of a page are set when it is
+    # pushed to the stack, its parent paths are already set by then
+    for page in root_pages:
+        page.id_path = f"/{page.id}"
+        page.position_path = f"/{page.position}"
+        page.breadcrumb_path = f"|| {page.title}"
+    root_pages.sort(key=_get_sibling_sort_key)
+    stack = root_pages[::-1]
+    sorted_pages = list()
+    while stack:
+        page = stack.pop()
+        sorted_pages.append(page)
+        children = children_mapping.get(page.id)
+        if children is None:
+            continue
+        children.sort(key=_get_sibling_sort_key)
+        for child in reversed(children):
+            child.id_path = f"{page.id_path}/{child.id}"
+            child.position_path = f"{page.position_path}/{child.position}"
+            child.breadcrumb_path = f"{page.breadcrumb_path} || {child.title}"
+            stack.append(child)
+
+    if len(sorted_pages) < len(id_to_page_mapping):
+        visited_ids = {page.id for page in sorted_pages}
+        cycle = _find_cycle(
+            id_to_page_mapping=id_to_page_mapping,
+            unvisited_ids=set(id_to_page_mapping).difference(visited_ids),
         )
-    )
+        if cycle is not None:
+            raise ValueError(f"the parent links of pages {cycle} form a cycle")
 
     return sorted_pages
 
 
+def get_page_hierarchy_cache_key(
+    confluence: pyatlassian.confluence.Confluence,
+    space_id: int,
+    cache_key: str,
+) -> tuple[str, int, str]:
+    """
+    Get the key of the page hierarchy in the cache,
+    see :func:`load_or_build_page_hierarchy`.
+    """
+    return (confluence.url, space_id, cache_key)
+
+
 def load_or_build_page_hierarchy(
     confluence: pyatlassian.confluence.Confluence,
     space_id: int,
     cache: Cache,
     cache_key: str,
     expire: int = 24 * 60 * 60,
+    refresh: bool = False,
 ) -> list[ConfluencePage]:
     """
     Retrieves a complete Confluence page hierarchy with caching support.
@@ -299,13 +645,19 @@ def load_or_build_page_hierarchy(
     :param space_id: ID of the Confluence space to crawl
     :param cache_key: Additional key component for cache differentiation
         (e.g., to cache different point-in-time snapshot of the same space)
+    :param refresh: If True, ignore the cached hierarchy, fetch the pages
+        again and replace it in the cache.
 
     :returns: List of :class:`ConfluencePage` objects with complete hierarchy data,
         sorted by their hierarchical position
     """
-    real_cache_key = (confluence.url, space_id, cache_key)
+    real_cache_key = get_page_hierarchy_cache_key(
+        confluence=confluence,
+        space_id=space_id,
+        cache_key=cache_key,
+    )
     # print(f"{real_cache_key = }")  # for debug only
-    if real_cache_key in cache:  # pragma: no cover
+    if refresh is False and real_cache_key in cache:  # pragma: no cover
         print("Hit cache!")  # for debug only
         cache_value = cache[real_cache_key]
         data = json.loads(gzip.decompress(cache_value).decode("utf-8"))
@@ -426,7 +778,9 @@ def is_matching(
                 if parent_id in page_mapping:
                     parent_page = page_mapping[parent_id]
                     # Check if current page is a descendant of the specified parent
-                    if page.id_path.startswith(parent_page.id_path):
+                    if page.id == parent_id or page.id_path.startswith(
+                        f"{parent_page.id_path}/"
+                    ):
                         include_flag = True
                         break
             elif page.id == expr.rstrip("/*"):
@@ -449,7 +803,9 @@ def is_matching(
             if parent_id in page_mapping:
                 parent_page = page_mapping[parent_id]
                 # Check if current page is a descendant of the excluded parent
-                if page.id_path.startswith(parent_page.id_path):
+                if page.id == parent_id or page.id_path.startswith(
+                    f"{parent_page.id_path}/"
+                ):
                     return False
         elif page.id == expr.rstrip("/*"):
             # Direct page ID match for exclusion
@@ -459,6 +815,134 @@ def is_matching(
     return True
 
 
+class PageIntervals:
+    """
+    A set of positions in a :class:`PageHierarchy`, stored as sorted, disjoint
+    half open ``[start, end)`` intervals, so a membership test is a binary search.
+    """
+
+    __slots__ = ("starts", "ends")
+
+    def __init__(self, intervals: T.Iterable[tuple[int, int]]):
+        self.starts: list[int] = list()
+        self.ends: list[int] = list()
+        for start, end in sorted(intervals):
+            if self.ends and start <= self.ends[-1]:
+                self.ends[-1] = max(self.ends[-1], end)
+            else:
+                self.starts.append(start)
+                self.ends.append(end)
+
+    def __contains__(self, position: int) -> bool:
+        k = bisect.bisect_right(self.starts, position) - 1
+        return k >= 0 and position < self.ends[k]
+
+
+class PageHierarchy:
+    """
+    The pages of a space in hierarchy order (a page comes right before its
+    descendants), with the Euler tour interval of every page: the page at
+    position ``i`` and all its descendants are ``pages[i:ends[i]]``.
+
+    The intervals are computed in one pass over the pages, with a stack of
+    the open ancestors. An include / exclude pattern is then just an interval
+    (``ID/*``) or a single position (``ID``), see :meth:`compile_patterns`.
+
+    :param pages: The pages in hierarchy order, with ``id_path``, e.g. the
+        result of :func:`load_or_build_page_hierarchy`.
+    """
+
+    __slots__ = ("pages", "index", "ends")
+
+    def __init__(self, pages: list[ConfluencePage]):
+        self.pages = pages
+        self.index: dict[str, int] = {page.id: i for i, page in enumerate(pages)}
+        self.ends: list[int] = [0] * len(pages)
+        stack: list[tuple[int, str]] = list()
+        for i, page in enumerate(pages):
+            while stack and not page.id_path.startswith(stack[-1][1]):
+                self.ends[stack.pop()[0]] = i
+            stack.append((i, f"{page.id_path}/"))
+        for j, _ in stack:
+            self.ends[j] = len(pages)
+
+    def __len__(self) -> int:
+        return len(self.pages)
+
+    def get_interval(self, page_id: str) -> tuple[int, int]:
+        """
+        Get the ``[start, end)`` positions of the page and its descendants.
+
+        :raises KeyError: if the page is not in the hierarchy
+        """
+        i = self.index[page_id]
+        return i, self.ends[i]
+
+    def descendants(self, page_id: str) -> list[ConfluencePage]:
+        """
+        Get all descendants of the page, in hierarchy order. The interval is
+        found with one dict lookup, but the returned list is a new slice, it
+        costs O(k) for k descendants. Use :meth:`get_interval` to get the
+        positions in ``pages`` without copying.
+
+        :raises KeyError: if the page is not in the hierarchy
+        """
+        i = self.index[page_id]
+        return self.pages[i + 1 : self.ends[i]]
+
+    def compile_patterns(self, patterns: list[str]) -> PageIntervals:
+        """
+        Compile normalized patterns (see :func:`process_include_exclude`)
+        into intervals, ``ID/*`` is the page and its descendants, ``ID`` is
+        the page only. Patterns of pages that are not in the hierarchy
+        match nothing.
+        """
+        intervals = list()
+        for expr in patterns:
+            if expr.endswith("/*"):
+                i = self.index.get(expr[:-2])
+                if i is not None:
+                    intervals.append((i, self.ends[i]))
+            else:
+                i = self.index.get(expr)
+                if i is not None:
+                    intervals.append((i, i + 1))
+        return PageIntervals(intervals)
+
+    def find_matching_positions(
+        self,
+        include: T.List[str],
+        exclude: T.List[str],
+    ) -> list[int]:
+        """
+        Same as :meth:`find_matching_pages`, but return the positions.
+        """
+        new_include, new_exclude = process_include_exclude(include, exclude)
+        if new_include:
+            include_intervals = self.compile_patterns(new_include)
+        else:
+            include_intervals = PageIntervals([(0, len(self.pages))])
+        exclude_intervals = self.compile_patterns(new_exclude)
+        return [
+            i
+            for i in range(len(self.pages))
+            if i in include_intervals and i not in exclude_intervals
+        ]
+
+    def find_matching_pages(
+        self,
+        include: T.List[str],
+        exclude: T.List[str],
+    ) -> list[ConfluencePage]:
+        """
+        Filter the pages with the include / exclude patterns, see
+        :func:`find_matching_pages`. Each pattern is compiled once, then each
+        page is classified with a binary search in the include and exclude
+        intervals, whatever the number of patterns.
+        """
+        return [self.pages[i] for i in self.find_matching_positions(include, exclude)]
+
+
 def find_matching_pages(
     sorted_pages: list[ConfluencePage],
     include: T.List[str],
@@ -478,6 +962,9 @@ def find_matching_pages(
     3. Then, any page matching an exclude pattern is filtered out
     4. Patterns with /* match the specified page and all its descendants
 
+    It gives the same result as :func:`is_matching` for every page, but uses
+    the Euler tour intervals of a :class:`PageHierarchy`.
+
     :param sorted_pages: List of :class:`ConfluencePage` objects sorted by hierarchy
         (typically from `enrich_pages_with_hierarchy_data`)
     :param include: List of Confluence page URLs or IDs to include
@@ -487,19 +974,7 @@ def find_matching_pages(
 
     :return: Filtered list of :class:`ConfluencePage` objects that match the criteria
     """
-    page_mapping = {page.id: page for page in sorted_pages}
-    matched_pages = list()
-    new_include, new_exclude = process_include_exclude(include, exclude)
-    for page in sorted_pages:
-        flag = is_matching(
-            page_mapping=page_mapping,
-            page=page,
-            include=new_include,
-            exclude=new_exclude,
-        )
-        if flag:
-            matched_pages.append(page)
-    return matched_pages
+    return PageHierarchy(sorted_pages).find_matching_pages(include, exclude)
 
 
 class ConfluencePipeline(BaseModel):
@@ -548,7 +1023,50 @@ class ConfluencePipeline(BaseModel):
     :param dir_out: The directory where the XML files should be exported
     :param cache_key: Key for caching and retrieving page hierarchies
     :param cache_expire: Cache expiration time in seconds (default: 24 hours)
+    :param path_bundle: If set, also stream all matched pages, in hierarchy
+        order, into this single all-in-one file and write an offset index next
+        to it, see :class:`~docpack.bundle.BundleWriter`.
+    :param export_documents: If False, no per page XML file is written to
+        ``dir_out``, this is useful when only the bundle is needed.
+    :param max_bundle_bytes: If set, split the bundle into numbered shards of
+        at most this many bytes, a page is never split across shards.
+    :param max_bundle_tokens: If set, split the bundle into numbered shards of
+        at most this many estimated tokens.
+    :param compression: If set, compress the per document XML files and the
+        bundle on the fly, see :class:`~docpack.constants.CompressionEnum`.
+        The compression suffix (e.g. ``.gz``) is appended to the file names.
+    :param compression_level: The compression level, default to 6 for gzip
+        and 3 for zstd.
+    :param content_store: If set, a page whose markdown was already seen by
+        this store (in this run, or in another pipeline sharing the store) is
+        exported with a reference to the first page instead of its markdown,
+        see :mod:`docpack.dedup`.
+    :param minhash_lsh: If set, a page whose markdown is a near duplicate of
+        a page already exported (in this run, or in another pipeline sharing
+        it) is not exported, see :mod:`docpack.near_dedup`. Requires NumPy.
+    :param body_batch_size: Number of page bodies downloaded per request.
+    :param max_workers: Maximum number of concurrent requests to download the
+        page bodies.
+    :param token_counter: The :class:`~docpack.tokens.TokenCounter` used to
+        count the tokens of the pages, default to the built-in heuristic.
+    :param token_budget: If set, only export the pages that fit under this
+        total number of tokens, the most important ones first, see :meth:`fetch`.
+    :param include_weights: The weight of the pages matched by each pattern
+        (URL or ID, with the same ``/*`` syntax as ``include``), used with
+        ``token_budget``. Pages matched by several patterns get the highest
+        weight, pages matched by none get 0.
+    :param incremental: If True, keep a manifest in ``dir_out`` and only
+        export the pages whose version changed since the last run, see
+        :meth:`fetch_incremental`.
+    :param markdown_cache_size_limit: Size limit in bytes of the disk cache
+        of the page markdown (in the ``markdown`` folder of ``cache_path``),
+        so the pages whose version did not change are not converted again by
+        the next runs, see :func:`load_markdown`. Only the exported markdown
+        of the pages whose body was not changed by
+        ``post_process_confluence_page`` is cached. The least recently used
+        entries are evicted first. If None, the markdown is not cached on disk.
     """
+
     model_config = ConfigDict(
         arbitrary_types_allowed=True,
     )
@@ -562,6 +1080,21 @@ class ConfluencePipeline(BaseModel):
     cache_expire: int = Field(default=24 * 60 * 60)
     cache_path: str = Field(default=str(dir_cache))
     wanted_fields: list[str] | None = Field(default=None)
+    path_bundle: Path | None = Field(default=None)
+    export_documents: bool = Field(default=True)
+    max_bundle_bytes: int | None = Field(default=None)
+    max_bundle_tokens: int | None = Field(default=None)
+    compression: str | None = Field(default=None)
+    compression_level: int | None = Field(default=None)
+    content_store: ContentStore | None = Field(default=None)
+    minhash_lsh: MinHashLSH | None = Field(default=None)
+    body_batch_size: int = Field(default=BODY_BATCH_SIZE)
+    max_workers: int = Field(default=4)
+    token_counter: TokenCounter | None = Field(default=None)
+    token_budget: int | None = Field(default=None)
+    include_weights: dict[str, float] | None = Field(default=None)
+    incremental: bool = Field(default=False)
+    markdown_cache_size_limit: int | None = Field(default=256 * 1024 * 1024)
 
     @cached_property
     def _space_id(self) -> int:
@@ -586,6 +1119,42 @@ class ConfluencePipeline(BaseModel):
     def cache(self) -> Cache:
         return Cache(self.cache_path)
 
+    @cached_property
+    def markdown_cache(self) -> Cache | None:
+        if self.markdown_cache_size_limit is None:
+            return None
+        return Cache(
+            os.path.join(self.cache_path, "markdown"),
+            size_limit=self.markdown_cache_size_limit,
+            eviction_policy="least-recently-used",
+        )
+
+    @property
+    def _has_markdown(self) -> bool:
+        return (
+            self.wanted_fields is None
+            or ConfluencePageFieldEnum.markdown_content.value in self.wanted_fields
+        )
+
+    def _post_process_confluence_page(
+        self,
+        confluence_page: ConfluencePage,
+    ) -> ConfluencePage:
+        """
+        Call ``post_process_confluence_page``. If the markdown is exported and
+        the hook did not change the title or the body, the markdown is then
+        read from, or added to, ``markdown_cache``.
+        """
+        source = confluence_page._get_markdown_source()
+        confluence_page = self.post_process_confluence_page(confluence_page)
+        if (
+            self.markdown_cache is not None
+            and self._has_markdown
+            and confluence_page._get_markdown_source() == source
+        ):
+            load_markdown(confluence_page, cache=self.markdown_cache)
+        return confluence_page
+
     def post_process_confluence_page(
         self,
         confluence_page: ConfluencePage,
@@ -607,30 +1176,446 @@ class ConfluencePipeline(BaseModel):
         """
         pass
 
-    def fetch(self):
+    def fetch(self) -> SyncSummary:
         """
         Execute the pipeline to extract and export Confluence pages to the target directory.
 
         This method performs the complete workflow:
 
-        1. List all pages in the given Confluence space that match the include/exclude patterns
-        2. Converts each page to a ConfluencePage object with metadata
+        1. List the metadata of all pages in the given Confluence space (cached),
+           and keep the pages that match the include/exclude patterns
+        2. Download the bodies of the matched pages only, ``body_batch_size``
+           pages per request, with up to ``max_workers`` concurrent requests,
+           see :func:`fetch_page_bodies`. The bodies are cached by page id and
+           version for ``cache_expire`` seconds, so within the expiration of
+           the cached hierarchy a run makes no request at all, and after it
+           only the bodies of the edited pages are downloaded again
         3. Exports each page as an XML document to the specified output directory
+
+        If ``path_bundle`` is set, every page is also written to the bundle,
+        in hierarchy order. ``post_process_path_out`` is only called when
+        ``export_documents`` is True.
+
+        If ``token_budget`` is set, only the pages selected by ``_pack``
+        are exported, in hierarchy order, the others are reported in
+        ``over_budget`` of the summary.
+
+        If ``incremental`` is True, see :meth:`fetch_incremental`.
+
+        :returns: The page ids are reported as added, see :meth:`export_pages`.
+        """
+        if self.incremental:
+            return self.fetch_incremental()
+        sorted_pages = load_or_build_page_hierarchy(
+            confluence=self.confluence,
+            space_id=self._space_id,
+            cache_key=self.cache_key,
+            cache=self.cache,
+        )
+        hierarchy = PageHierarchy(sorted_pages)
+        matched_pages = hierarchy.find_matching_pages(
+            include=self.include,
+            exclude=self.exclude,
+        )
+        matched_pages = fetch_page_bodies(
+            confluence=self.confluence,
+            pages=matched_pages,
+            batch_size=self.body_batch_size,
+            max_workers=self.max_workers,
+            cache=self.cache,
+            expire=self.cache_expire,
+        )
+        sync_summary = SyncSummary()
+        matched_pages = self._pack(
+            hierarchy=hierarchy,
+            matched_pages=matched_pages,
+            sync_summary=sync_summary,
+        )
+        return self.export_pages(matched_pages, sync_summary=sync_summary)
+
+    def _pack(
+        self,
+        hierarchy: PageHierarchy,
+        matched_pages: list[ConfluencePage],
+        sync_summary: SyncSummary,
+    ) -> list[ConfluencePage]:
+        """
+        Select the pages that fit under ``token_budget`` with
+        :func:`~docpack.tokens.pack_by_budget`. The pages are considered by
+        descending ``include_weights``, then by the first ``include`` pattern
+        that matches them, then in hierarchy order. The tokens are counted
+        before ``post_process_confluence_page``, the duplicate and near
+        duplicate detections run after the selection.
+
+        :param hierarchy: All pages of the space, to resolve the ``/*`` patterns
+        :param matched_pages: The pages matching ``include`` and ``exclude``
+        :param sync_summary: The unselected pages are appended to its
+            ``over_budget``, ``n_tokens_by_source`` is set to the number of
+            tokens of every selected page and ``n_tokens`` to their total.
+
+        :returns: The selected pages, in the order of ``matched_pages``
+        """
+        if self.token_budget is None:
+            return matched_pages
+        n_tokens_list = [
+            page.estimate_tokens(
+                wanted_fields=self.wanted_fields,
+                token_counter=self.token_counter,
+            )
+            for page in matched_pages
+        ]
+        selected = self._pack_by_budget(hierarchy, matched_pages, n_tokens_list)
+        selected_set = set(selected)
+        sync_summary.over_budget.extend(
+            page.id for i, page in enumerate(matched_pages) if i not in selected_set
+        )
+        sync_summary.n_tokens_by_source = {
+            matched_pages[i].id: n_tokens_list[i] for i in selected
+        }
+        sync_summary.n_tokens = sum(sync_summary.n_tokens_by_source.values())
+        return [matched_pages[i] for i in selected]
+
+    def _pack_by_budget(
+        self,
+        hierarchy: PageHierarchy,
+        matched_pages: list[ConfluencePage],
+        n_tokens_list: list[int],
+    ) -> list[int]:
+        include, _ = process_include_exclude(self.include, [])
+        include_intervals_list = [
+            hierarchy.compile_patterns([pattern]) for pattern in include
+        ]
+        weight_intervals_list = [
+            (hierarchy.compile_patterns(process_include_exclude([pattern], [])[0]), w)
+            for pattern, w in (self.include_weights or {}).items()
+        ]
+        weight_list, priority_list = list(), list()
+        for page in matched_pages:
+            i = hierarchy.index[page.id]
+            weight_list.append(
+                max(
+                    (w for intervals, w in weight_intervals_list if i in intervals),
+                    default=0.0,
+                )
+            )
+            priority_list.append(
+                next(
+                    (
+                        nth
+                        for nth, intervals in enumerate(include_intervals_list)
+                        if i in intervals
+                    ),
+                    len(include_intervals_list),
+                )
+            )
+        return pack_by_budget(
+            n_tokens_list=n_tokens_list,
+            token_budget=self.token_budget,
+            weight_list=weight_list,
+            priority_list=priority_list,
+        )
+
+    def plan(self) -> Plan:
+        """
+        Dry run of :meth:`fetch`, see :mod:`docpack.plan`: list the matched
+        pages from the cached page hierarchy (it is built and cached first if
+        needed) and estimate the output, no Atlas Doc Format body is
+        converted to markdown.
+
+        The markdown size of a page is estimated from the text nodes of its
+        body (see :func:`estimate_markdown_size`), and the number of tokens
+        from the XML size with the built-in heuristic, also to apply
+        ``token_budget``. The hierarchy only has the metadata of the pages,
+        the bodies are read from the cache of :meth:`fetch` when they are
+        there, otherwise the size and the number of tokens of a document are
+        unknown (``None``) if the markdown is a wanted field, see
+        :attr:`~docpack.plan.Plan.n_unknown`. The budget can not be split
+        then: ``token_budget`` is not applied, all the matched pages are
+        listed and ``over_budget`` is empty.
+        ``n_api_call`` counts the requests to list the space (0 if the
+        hierarchy was already cached) and to download the bodies of the
+        matched pages that are not cached. The plan is the one of a full
+        export, even if ``incremental`` is set.
         """
+        is_cached = (
+            get_page_hierarchy_cache_key(
+                confluence=self.confluence,
+                space_id=self._space_id,
+                cache_key=self.cache_key,
+            )
+            in self.cache
+        )
         sorted_pages = load_or_build_page_hierarchy(
             confluence=self.confluence,
             space_id=self._space_id,
             cache_key=self.cache_key,
             cache=self.cache,
         )
+        hierarchy = PageHierarchy(sorted_pages)
+        matched_pages = hierarchy.find_matching_pages(
+            include=self.include,
+            exclude=self.exclude,
+        )
+        load_page_bodies_from_cache(pages=matched_pages, cache=self.cache)
+        serializer = get_confluence_page_xml_serializer(self.wanted_fields)
+        item_list = list()
+        for page in matched_pages:
+            # the markdown is written as is, only the metadata is serialized
+            xml = serializer.to_xml(
+                _PageMetadata(webui_url=page.webui_url, title=page.title, markdown="")
+            )
+            n_chars, n_bytes = len(xml), len(xml.encode("utf-8"))
+            size, n_tokens = None, None
+            if page.has_body:
+                size = len(
+                    page.page_data["body"]["atlas_doc_format"]["value"].encode("utf-8")
+                )
+                if self._has_markdown:
+                    n_markdown = len(f"# {page.title}\n") + estimate_markdown_size(
+                        page.atlas_doc
+                    )
+                    n_chars, n_bytes = n_chars + n_markdown, n_bytes + n_markdown
+            elif self._has_markdown:
+                n_chars, n_bytes = None, None
+            if n_chars is not None:
+                n_tokens = estimate_tokens_by_size(n_chars)
+            item_list.append(
+                PlanItem(
+                    key=page.id,
+                    url=page.webui_url,
+                    size=size,
+                    n_bytes=n_bytes,
+                    n_tokens=n_tokens,
+                )
+            )
+
+        plan = Plan()
+        if self.token_budget is not None and all(
+            item.n_tokens is not None for item in item_list
+        ):
+            selected = self._pack_by_budget(
+                hierarchy, matched_pages, [item.n_tokens for item in item_list]
+            )
+            selected_set = set(selected)
+            plan.over_budget = [
+                item.key for i, item in enumerate(item_list) if i not in selected_set
+            ]
+            item_list = [item_list[i] for i in selected]
+        plan.items = item_list
+        if is_cached is False:
+            plan.n_api_call = max(1, math.ceil(len(sorted_pages) / GET_PAGES_LIMIT))
+        plan.n_body_download = sum(1 for page in matched_pages if not page.has_body)
+        plan.n_api_call += math.ceil(plan.n_body_download / self.body_batch_size)
+        if self.export_documents:
+            plan.n_file_to_write += len(item_list)
+        if self.path_bundle is not None:
+            plan.n_file_to_write += 1 + count_bundle_shards(
+                item_list,
+                max_bytes=self.max_bundle_bytes,
+                max_tokens=self.max_bundle_tokens,
+            )
+        return plan
+
+    def _open_bundle_writer(self) -> T.ContextManager[BundleWriter | None]:
+        if self.path_bundle is None:
+            return contextlib.nullcontext()
+        return BundleWriter(
+            path_bundle=self.path_bundle,
+            max_bytes=self.max_bundle_bytes,
+            max_tokens=self.max_bundle_tokens,
+            count_tokens=(
+                estimate_tokens if self.token_counter is None else self.token_counter
+            ),
+            compression=self.compression,
+            compression_level=self.compression_level,
+        )
+
+    def export_pages(
+        self,
+        pages: T.Iterable[ConfluencePage],
+        sync_summary: SyncSummary | None = None,
+    ) -> SyncSummary:
+        """
+        Call the hooks and export the pages to ``dir_out`` and / or the bundle,
+        in the given order.
+
+        :param pages: The pages to export
+        :param sync_summary: If set, the results are appended to this summary,
+            otherwise to a new one.
+
+        :returns: The page ids are reported as added, the duplicated ones
+            (see ``content_store``) also in ``duplicated``, and the near
+            duplicated ones (see ``minhash_lsh``) only in ``near_duplicated``.
+        """
+        if sync_summary is None:
+            sync_summary = SyncSummary()
+        with self._open_bundle_writer() as bundle_writer:
+            for page in pages:
+                page = self._post_process_confluence_page(page)
+                if self.minhash_lsh is not None:
+                    original = self.minhash_lsh.add(
+                        key=page.webui_url,
+                        text=page.markdown,
+                    )
+                    if original is not None:
+                        sync_summary.near_duplicated.append(page.id)
+                        continue
+                document = page
+                if self.content_store is not None:
+                    original = self.content_store.add(
+                        key=page.id,
+                        url=page.webui_url,
+                        body=page.markdown,
+                    )
+                    if original is not None:
+                        document = DuplicateDocument(document=page, original=original)
+                        sync_summary.duplicated.append(page.id)
+                        sync_summary.n_bytes_saved += original.size
+                serializer = get_confluence_page_xml_serializer(
+                    self.wanted_fields,
+                    duplicate=document is not page,
+                )
+                if bundle_writer is not None:
+                    bundle_writer.add_document(
+                        obj=document,
+                        serializer=serializer,
+                        key=page.id,
+                        url=page.webui_url,
+                    )
+                if self.export_documents:
+                    path_out = page.get_path_out(
+                        dir_out=self.dir_out,
+                        compression=self.compression,
+                    )
+                    serializer.write_file(
+                        document,
+                        path_out,
+                        compression=self.compression,
+                        compression_level=self.compression_level,
+                    )
+                    self.post_process_path_out(confluence_page=page, path_out=path_out)
+                sync_summary.added.append(page.id)
+        return sync_summary
+
+    def _ensure_document_output_only(self, method: str):
+        # same limits as GitHubPipeline, the per page files are updated in
+        # place, the unchanged pages are never downloaded
+        if (
+            self.path_bundle is not None
+            or self.export_documents is False
+            or self.content_store is not None
+            or self.minhash_lsh is not None
+            or self.token_budget is not None
+        ):
+            raise ValueError(
+                f"path_bundle, export_documents=False, content_store, minhash_lsh "
+                f"and token_budget are only supported by a full export, "
+                f"not by {method}"
+            )
+
+    def fetch_incremental(self) -> SyncSummary:
+        """
+        Export only the pages that changed since the last run.
+
+        A :class:`~docpack.manifest.Manifest` in ``dir_out`` records the
+        version of every exported page (see :attr:`ConfluencePage.version`)
+        and the output file written for it. Every run lists the metadata of
+        the space again, it is cheap (one request per
+        :data:`GET_PAGES_LIMIT` pages) and refreshes the cached hierarchy, then:
+
+        - a page whose version and output file name did not change is not
+          downloaded, its output is left untouched
+        - the bodies of the added and modified pages are downloaded with
+          :func:`fetch_page_bodies` and exported
+        - the outputs of the pages that were deleted or no longer match are
+          deleted
+
+        The ``post_process_confluence_page`` and ``post_process_path_out``
+        hooks are only called for exported pages. If an output file was
+        modified or removed by someone else, the page is exported again.
+        Moving or renaming a parent page changes the output file name, so
+        the page is exported again. Changing the site, ``space_id``,
+        ``wanted_fields``, ``compression`` or ``compression_level`` exports
+        everything again.
+        """
+        self._ensure_document_output_only("fetch_incremental")
+        fingerprint = get_fingerprint(
+            site_url=self.confluence.url,
+            space_id=self._space_id,
+            wanted_fields=self.wanted_fields,
+            compression=self.compression,
+            compression_level=self.compression_level,
+        )
+        manifest = Manifest.read(dir_out=self.dir_out, fingerprint=fingerprint)
+        old_entries = manifest.entries
+        manifest.entries = dict()
+
+        sorted_pages = load_or_build_page_hierarchy(
+            confluence=self.confluence,
+            space_id=self._space_id,
+            cache_key=self.cache_key,
+            cache=self.cache,
+            refresh=True,
+        )
         matched_pages = find_matching_pages(
             sorted_pages=sorted_pages,
             include=self.include,
             exclude=self.exclude,
         )
+        sync_summary = SyncSummary()
+        changed_pages = list()
         for page in matched_pages:
-            page = self.post_process_confluence_page(page)
+            entry = old_entries.get(page.id)
+            path_out = page.get_path_out(
+                dir_out=self.dir_out,
+                compression=self.compression,
+            )
+            if (
+                entry is not None
+                and entry.content_hash != ""
+                and entry.content_hash == page.version
+                and entry.output == path_out.name
+                and entry.is_output_intact(self.dir_out)
+            ):
+                manifest.entries[page.id] = old_entries.pop(page.id)
+                sync_summary.unchanged.append(page.id)
+            else:
+                changed_pages.append(page)
+
+        # a page deleted since the listing is not returned, its old output
+        # is deleted below
+        changed_pages = fetch_page_bodies(
+            confluence=self.confluence,
+            pages=changed_pages,
+            batch_size=self.body_batch_size,
+            max_workers=self.max_workers,
+            cache=self.cache,
+            expire=self.cache_expire,
+        )
+        for page in changed_pages:
+            entry = old_entries.pop(page.id, None)
+            page = self._post_process_confluence_page(page)
             path_out = page.export_to_file(
-                dir_out=self.dir_out, wanted_fields=self.wanted_fields
+                dir_out=self.dir_out,
+                wanted_fields=self.wanted_fields,
+                compression=self.compression,
+                compression_level=self.compression_level,
             )
             self.post_process_path_out(confluence_page=page, path_out=path_out)
+            if entry is not None and entry.output != path_out.name:
+                self.dir_out.joinpath(entry.output).unlink(missing_ok=True)
+            manifest.new_entry(
+                key=page.id,
+                content_hash=page.version,
+                path_out=path_out,
+            )
+            if entry is None:
+                sync_summary.added.append(page.id)
+            else:
+                sync_summary.modified.append(page.id)
+
+        for page_id, entry in old_entries.items():
+            self.dir_out.joinpath(entry.output).unlink(missing_ok=True)
+            sync_summary.deleted.append(page_id)
+        manifest.write(self.dir_out)
+        return sync_summary
@@ -34,3 +34,33 @@ class ConfluencePageFieldEnum(str, enum.Enum):
     confluence_url = "confluence_url"
     title = "title"
     markdown_content = "markdown_content"
+
+
+class GitHubFileSourceEnum(str, enum.Enum):
+    """
+    Enum for where :class:`~docpack.github_fetcher.GitHubPipeline` lists
+    the files of the cloned repository from.
+
+    - ``filesystem``: walk the working tree
+    - ``git_index``: list the files tracked in the git index
+    - ``git_object``: list and read the files of a branch, tag or commit
+      straight from the git object database, without touching the working tree
+    """
+
+    filesystem = "filesystem"
+    git_index = "git_index"
+    git_object = "git_object"
+
+
+class CompressionEnum(str, enum.Enum):
+    """
+    Enum for the compression of the exported documents and bundles,
+    see :mod:`docpack.compression`.
+
+    - ``gzip``: from the standard library, adds the ``.gz`` suffix
+    - ``zstd``: faster and smaller, requires ``pip install "docpack[zstd]"``,
+      adds the ``.zst`` suffix
+    """
+
+    gzip = "gzip"
+    zstd = "zstd"
@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+
+"""
+Content addressed dedup of identical documents.
+
+When several branches, forks or vendored copies are packed, many documents
+have a byte identical body (the ``content`` of a GitHub file, the markdown of
+a Confluence page). A :class:`ContentStore` shared by the pipelines records the
+sha256 of every body it sees. The first document with a given body is exported
+as usual, the later ones are exported as a :class:`DuplicateDocument`: the
+metadata is kept, and the body is replaced by a reference to the first one::
+
+    <document>
+      <source_type>GitHub Repository</source_type>
+      <github_url>https://github.com/account/fork/blob/main/LICENSE</github_url>
+      ...
+      <duplicate_of>https://github.com/account/repo/blob/main/LICENSE</duplicate_of>
+    </document>
+"""
+
+import typing as T
+import hashlib
+
+from pydantic import BaseModel, Field
+
+DUPLICATE_OF = "duplicate_of"
+
+
+class ContentStoreEntry(BaseModel):
+    """
+    The first document seen with a given body.
+
+    :param key: The document identifier, the relative path of a GitHub file
+        or the id of a Confluence page.
+    :param url: The GitHub url or the Confluence page url, duplicates
+        reference it.
+    :param size: Size of the UTF-8 encoded body in bytes.
+    """
+
+    key: str = Field()
+    url: str = Field()
+    size: int = Field()
+
+
+class ContentStore(BaseModel):
+    """
+    Where each unique body is stored, keyed by its sha256. Pass the same
+    store to several pipelines to dedup across all of them, in run order.
+
+    :param min_size: Bodies smaller than this many bytes are never
+        deduplicated, a reference would be about as long as the body.
+    :param entries: The first document of each body, by body sha256.
+    :param n_duplicate: Number of duplicates found so far.
+    :param n_bytes_saved: Total size of the duplicated bodies in bytes, which
+        were not written again.
+    """
+
+    min_size: int = Field(default=64)
+    entries: dict[str, ContentStoreEntry] = Field(default_factory=dict)
+    n_duplicate: int = Field(default=0)
+    n_bytes_saved: int = Field(default=0)
+
+    def add(
+        self,
+        key: str,
+        url: str,
+        body: str,
+    ) -> T.Optional[ContentStoreEntry]:
+        """
+        Record the body of a document.
+
+        :returns: The entry of the first document with the same body if the
+            document is a duplicate, otherwise ``None``.
+        """
+        data = body.encode("utf-8")
+        if len(data) < self.min_size:
+            return None
+        content_hash = hashlib.sha256(data).hexdigest()
+        entry = self.entries.get(content_hash)
+        if entry is None:
+            self.entries[content_hash] = ContentStoreEntry(
+                key=key,
+                url=url,
+                size=len(data),
+            )
+            return None
+        self.n_duplicate += 1
+        self.n_bytes_saved += entry.size
+        return entry
+
+
+class DuplicateDocument:
+    """
+    A document whose body is already stored by another document. Every
+    attribute is read from the wrapped ``document``, plus ``duplicate_of``,
+    so it can be serialized by an :class:`~docpack.xml_serializer.XmlSerializer`
+    compiled with ``duplicate=True``.
+
+    :param document: The duplicated document, e.g. a
+        :class:`~docpack.github_fetcher.GitHubFile`.
+    :param original: The entry of the document that stores the body.
+    """
+
+    __slots__ = ("document", "original")
+
+    def __init__(self, document: T.Any, original: ContentStoreEntry):
+        self.document = document
+        self.original = original
+
+    @property
+    def duplicate_of(self) -> str:
+        return self.original.url
+
+    def __getattr__(self, name: str) -> T.Any:
+        return getattr(self.document, name)
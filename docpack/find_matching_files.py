@@ -9,9 +9,17 @@ files in complex directory structures while maintaining a clean filtering approa
 """
 
 import typing as T
+import os
+import re
+import dataclasses
 from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 
-from pathpick.api import PathPick
+import pathspec
+from pathspec.util import normalize_file
+from pathspec.patterns import GitWildMatchPattern
+
+from .git_utils import list_tracked_files, list_tree_blobs
 
 
 def remove_dupes(lst: list) -> list:
@@ -44,10 +52,523 @@ def process_include_exclude(
     return include, exclude
 
 
+_unanchored_prefix = "^(?:.+/)?"
+# the "this path and everything inside it" regex suffix, pathspec 0.x / 1.x
+_dir_suffix_list = [
+    "(?:(?P<ps_d>/).*)?$",
+    "(?:(?P<ps_d>/)|$)",
+]
+
+
+@dataclasses.dataclass
+class CompiledPatterns:
+    """
+    A list of GitWildMatch patterns compiled into a single matcher.
+
+    Instead of testing every pattern one by one like
+    :meth:`pathspec.PathSpec.match_file`, the patterns are grouped into:
+
+    - ``literal_set``: anchored literal paths, e.g. ``/README.rst``,
+      ``docs/source/conf.py``, a path matches if it or any parent is in the set.
+    - ``name_set``: unanchored literal names, e.g. ``Makefile``, ``__pycache__``,
+      a path matches if any of its components is in the set.
+    - ``ext_set``: unanchored extension patterns, e.g. ``*.py``, ``**/*.py``,
+      a path matches if any of its components ends with the extension.
+    - ``regex``: the union of the regular expressions of all other patterns.
+
+    If any pattern is a negation (``!pattern``), the "last matching pattern wins"
+    rule can not be expressed as a union, and ``path_spec`` is used instead.
+
+    Paths must be normalized (see :func:`pathspec.util.normalize_file`).
+    """
+
+    literal_set: set[str] = dataclasses.field(default_factory=set)
+    name_set: set[str] = dataclasses.field(default_factory=set)
+    ext_set: set[str] = dataclasses.field(default_factory=set)
+    regex: T.Optional[re.Pattern] = dataclasses.field(default=None)
+    path_spec: T.Optional[pathspec.PathSpec] = dataclasses.field(default=None)
+
+    @classmethod
+    def new(cls, patterns: list[str]):
+        """
+        Compile the list of GitWildMatch patterns.
+        """
+        compiled_patterns = cls()
+        if any(pattern.startswith("!") for pattern in patterns):
+            compiled_patterns.path_spec = pathspec.PathSpec.from_lines(
+                GitWildMatchPattern, patterns
+            )
+            return compiled_patterns
+
+        regex_list = list()
+        for pattern in patterns:
+            regex, include = GitWildMatchPattern.pattern_to_regex(pattern)
+            if regex is None or include is not True:
+                continue
+            # the hash based matching only works if pathspec would build
+            # exactly the regex we expect, otherwise we fall back to regex
+            literal = pattern[3:] if pattern.startswith("**/") else pattern
+            anchored_literal = literal.lstrip("/")
+            name_regex_set = {
+                f"{_unanchored_prefix}{re.escape(literal)}{dir_suffix}"
+                for dir_suffix in _dir_suffix_list
+            }
+            ext_regex_set = {
+                f"{_unanchored_prefix}[^/]*{re.escape(literal[1:])}{dir_suffix}"
+                for dir_suffix in _dir_suffix_list
+            }
+            literal_regex_set = {
+                f"^{re.escape(anchored_literal)}{dir_suffix}"
+                for dir_suffix in _dir_suffix_list
+            }
+            # name_set and ext_set are compared with one path component at a
+            # time, a multi segment pattern such as ``**/a/b`` goes to the regex
+            is_single_part = "/" not in literal
+            if is_single_part and regex in name_regex_set:
+                compiled_patterns.name_set.add(literal)
+            elif is_single_part and literal.startswith("*.") and regex in ext_regex_set:
+                compiled_patterns.ext_set.add(literal[1:])
+            elif regex in literal_regex_set:
+                compiled_patterns.literal_set.add(anchored_literal)
+            else:
+                # named group can only be defined once in the union
+                regex_list.append(regex.replace("(?P<ps_d>/)", "/"))
+        if regex_list:
+            compiled_patterns.regex = re.compile(
+                "|".join(f"(?:{regex})" for regex in regex_list)
+            )
+        return compiled_patterns
+
+    def is_match(self, path: str) -> bool:
+        """
+        Check whether the normalized ``path`` matches any of the patterns.
+        """
+        if self.path_spec is not None:
+            return self.path_spec.match_file(path)
+        if self.literal_set or self.name_set or self.ext_set:
+            parts = path.split("/")
+            if self.literal_set:
+                prefix = ""
+                for part in parts:
+                    prefix = f"{prefix}/{part}" if prefix else part
+                    if prefix in self.literal_set:
+                        return True
+            if self.name_set:
+                for part in parts:
+                    if part in self.name_set:
+                        return True
+            if self.ext_set:
+                for part in parts:
+                    ind = part.find(".")
+                    while ind != -1:
+                        if part[ind:] in self.ext_set:
+                            return True
+                        ind = part.find(".", ind + 1)
+        if self.regex is not None:
+            return self.regex.match(path) is not None
+        return False
+
+
+@dataclasses.dataclass
+class PathMatcher:
+    """
+    Include / exclude matcher that gives the same result as
+    :meth:`pathpick.api.PathPick.is_match`, but compiles each pattern list
+    into a :class:`CompiledPatterns` so the cost per path does not grow
+    with the number of patterns.
+
+    Example:
+
+    .. code-block:: python
+
+        path_matcher = PathMatcher.new(
+            include=["docpack/**/*.py", "README.rst"],
+            exclude=["docpack/tests/**"],
+        )
+        path_matcher.is_match("docpack/api.py") # True
+        path_matcher.filter(["docpack/api.py", "docpack/tests/helper.py"])
+        # ["docpack/api.py"]
+    """
+
+    include: T.Optional[CompiledPatterns] = dataclasses.field()
+    exclude: T.Optional[CompiledPatterns] = dataclasses.field()
+
+    @classmethod
+    def new(cls, include: list[str], exclude: list[str]):
+        """
+        Create a new :class:`PathMatcher`. Empty ``include`` means include all paths,
+        empty ``exclude`` means exclude nothing.
+        """
+        return cls(
+            include=CompiledPatterns.new(include) if include else None,
+            exclude=CompiledPatterns.new(exclude) if exclude else None,
+        )
+
+    def is_match(self, path: str) -> bool:
+        """
+        Determines if a path should be included based on include/exclude patterns.
+
+        :param path: A relative path string using forward slash (/) as directory separator.
+        """
+        path = normalize_file(path)
+        if self.include is not None:
+            if self.include.is_match(path) is False:
+                return False
+        if self.exclude is None:
+            return True
+        return self.exclude.is_match(path) is False
+
+    def filter(self, paths: T.Iterable[str]) -> list[str]:
+        """
+        Filter a batch of relative paths in one call, the order is preserved.
+        """
+        include, exclude = self.include, self.exclude
+        matched = list()
+        for path in paths:
+            norm_path = normalize_file(path)
+            if include is not None and include.is_match(norm_path) is False:
+                continue
+            if exclude is not None and exclude.is_match(norm_path):
+                continue
+            matched.append(path)
+        return matched
+
+
+# Exclude pattern suffixes that cover every candidate below a directory.
+# Candidates are the entries yielded by ``glob("**/*.*")``, so their last path
+# component is never empty and always contains a dot.
+_subtree_suffix_list = [
+    "/**/*.*",
+    "/**/*",
+    "/*",
+]
+
+
+def compile_prune_patterns(
+    exclude: list[str],
+) -> list[tuple[re.Pattern, bool]]:
+    """
+    Compile the exclude patterns that can exclude an entire directory subtree.
+
+    A directory can be skipped during the walk only when every candidate file
+    below it is guaranteed to be excluded. GitWildMatch patterns match a path
+    and everything inside it, so this is decided per directory by:
+
+    - ``regex.match("dir")`` for patterns ending with the
+      ``(?:/.*)?$`` "and its contents" group (e.g. ``.venv``, ``**/__pycache__``)
+    - ``regex.match("dir/")`` for patterns ending with ``/**`` (e.g. ``.venv/**``),
+      whose regex ends with ``/.*$`` (or just ``/`` in pathspec 1.x, which is
+      a prefix match)
+
+    Patterns such as ``.venv/**/*.*``, ``.venv/**/*`` and ``.venv/*`` are treated
+    as ``.venv/**`` because they are equivalent for the ``*.*`` candidates.
+
+    :param exclude: List of glob patterns to exclude files from the results
+
+    :returns: List of ``(regex, is_dir_slash)`` tuples. ``is_dir_slash`` tells
+        whether the directory path must be tested with a trailing slash.
+        If any exclude pattern is a negation (``!pattern``), an empty list
+        is returned because a later pattern may re-include part of the subtree.
+    """
+    prune_pattern_list = list()
+    for pattern in exclude:
+        if pattern.startswith("!"):
+            return []
+        for suffix in _subtree_suffix_list:
+            if pattern.endswith(suffix) and len(pattern) > len(suffix):
+                pattern = pattern[: -len(suffix)] + "/**"
+                break
+        regex, include = GitWildMatchPattern.pattern_to_regex(pattern)
+        if regex is None or include is not True:
+            continue
+        if regex.endswith("(?:/.*)?$") or any(
+            regex.endswith(dir_suffix) for dir_suffix in _dir_suffix_list
+        ):
+            prune_pattern_list.append((re.compile(regex), False))
+        elif regex.endswith("/.*$") or (regex.startswith("^") and regex.endswith("/")):
+            prune_pattern_list.append((re.compile(regex), True))
+    return prune_pattern_list
+
+
+def is_pruned(
+    prune_pattern_list: list[tuple[re.Pattern, bool]],
+    relpath: str,
+) -> bool:
+    """
+    Check whether the directory at ``relpath`` is fully covered by an exclude
+    pattern from :func:`compile_prune_patterns`.
+    """
+    for regex, is_dir_slash in prune_pattern_list:
+        if is_dir_slash:
+            if regex.match(f"{relpath}/") is not None:
+                return True
+        else:
+            if regex.match(relpath) is not None:
+                return True
+    return False
+
+
+_wildcard_char_set = set("*?[]\\!")
+
+
+def plan_walk_roots(
+    include: list[str],
+) -> list[str]:
+    """
+    Analyze the include patterns and compute the minimal set of walk roots.
+
+    Only an anchored pattern (a pattern with a ``/`` before its last character)
+    is bound to a fixed location, and only its literal leading segments
+    can be used as a root. For example:
+
+    - ``docpack/**/*.py`` -> ``docpack``
+    - ``docs/source/*/**/index.rst`` -> ``docs/source``
+    - ``.github/workflows/main.yml`` -> ``.github/workflows/main.yml``
+
+    A root is either a base directory to walk, or a literal path to check
+    directly; which one it is is only known when we look at the file system.
+    Unanchored patterns like ``*.py`` or ``README.rst`` match at any depth
+    (``README.rst`` also matches ``bin/README.rst``), so they require
+    walking from ``dir_root``, represented by the empty string root ``""``.
+    Roots nested in another root are removed.
+
+    :param include: List of glob patterns to match files for inclusion
+
+    :returns: Sorted list of relative root paths using ``/`` as separator,
+        ``[""]`` means the whole tree must be walked.
+    """
+    root_list = list()
+    for pattern in include:
+        # negation patterns can only remove matches, never add one
+        if pattern.startswith("!"):
+            continue
+        regex, _ = GitWildMatchPattern.pattern_to_regex(pattern)
+        if regex is None:
+            continue
+        if regex.startswith(_unanchored_prefix) or not regex.startswith("^"):
+            return [""]
+        root_parts = list()
+        for part in pattern.strip("/").split("/"):
+            if part in ("", ".", "..") or (_wildcard_char_set & set(part)):
+                break
+            root_parts.append(part)
+        if not root_parts:
+            return [""]
+        root_list.append("/".join(root_parts))
+    if not root_list:
+        return [""]
+
+    minimal_root_list = list()
+    for root in sorted(set(root_list)):
+        if minimal_root_list:
+            last_root = minimal_root_list[-1]
+            if root.startswith(f"{last_root}/"):
+                continue
+        minimal_root_list.append(root)
+    return minimal_root_list
+
+
+def scan_dir(
+    rel_dir: str,
+    abs_dir: str,
+    prune_pattern_list: list[tuple[re.Pattern, bool]],
+) -> tuple[list[tuple[str, str]], list[tuple[str, str]]]:
+    """
+    List one directory with :func:`os.scandir`.
+
+    :returns: A tuple of two lists of ``(relpath, abspath)`` tuples:
+
+        1. the ``glob("**/*.*")`` candidates in this directory (name contains a dot)
+        2. the sub directories to walk next, symlinked directories and directories
+            covered by ``prune_pattern_list`` are skipped
+    """
+    candidate_list, sub_dir_list = list(), list()
+    try:
+        with os.scandir(abs_dir) as scandir_it:
+            entries = list(scandir_it)
+    except PermissionError:
+        return candidate_list, sub_dir_list
+    for entry in entries:
+        name = entry.name
+        relpath = f"{rel_dir}/{name}" if rel_dir else name
+        if "." in name:
+            candidate_list.append((relpath, entry.path))
+        try:
+            is_dir = entry.is_dir(follow_symlinks=False)
+        except OSError:
+            is_dir = False
+        if is_dir and is_pruned(prune_pattern_list, relpath) is False:
+            sub_dir_list.append((relpath, entry.path))
+    return candidate_list, sub_dir_list
+
+
+def walk_candidates(
+    dir_root: Path,
+    prune_pattern_list: list[tuple[re.Pattern, bool]],
+    rel_dir: str = "",
+) -> T.Iterable[tuple[str, str]]:
+    """
+    Walk the directory tree with :func:`os.scandir` and yield the same candidate
+    entries as ``dir_root.glob("**/*.*")``, in the same order, without descending
+    into directories covered by ``prune_pattern_list``.
+
+    Like :meth:`pathlib.Path.glob`, symlinked directories are not followed and
+    directories that cannot be read are silently skipped.
+
+    :param rel_dir: Optional sub directory of ``dir_root`` to start the walk from,
+        the yielded ``relpath`` is still relative to ``dir_root``.
+
+    :returns: ``(relpath, abspath)`` tuples, ``relpath`` uses ``/`` as separator.
+    """
+    if rel_dir:
+        stack = [(rel_dir, os.path.join(str(dir_root), *rel_dir.split("/")))]
+    else:
+        stack = [("", str(dir_root))]
+    while stack:
+        rel_dir, abs_dir = stack.pop()
+        candidate_list, sub_dir_list = scan_dir(rel_dir, abs_dir, prune_pattern_list)
+        yield from candidate_list
+        # reversed, so the sub directories are popped in scandir order
+        stack.extend(reversed(sub_dir_list))
+
+
+def resolve_walk_roots(
+    dir_root: Path,
+    root_list: list[str],
+    prune_pattern_list: list[tuple[re.Pattern, bool]],
+) -> tuple[list[tuple[str, str]], list[tuple[str, str]]]:
+    """
+    Resolve the roots computed by :func:`plan_walk_roots` on the file system.
+
+    Each root is resolved segment by segment by listing its parent directories
+    (once per distinct parent), so the exact file name case and the
+    "do not follow symlinked directories" rule are the same as a full walk.
+
+    :returns: A tuple of two lists of ``(relpath, abspath)`` tuples:
+
+        1. the roots that are ``glob("**/*.*")`` candidates themselves
+        2. the roots that are directories to walk
+    """
+    if root_list == [""]:
+        return [], [("", str(dir_root))]
+
+    listing_cache: dict[str, dict[str, os.DirEntry] | None] = dict()
+
+    def get_entry(rel_dir: str, name: str) -> os.DirEntry | None:
+        if rel_dir not in listing_cache:
+            if rel_dir:
+                abs_dir = os.path.join(str(dir_root), *rel_dir.split("/"))
+            else:
+                abs_dir = str(dir_root)
+            try:
+                with os.scandir(abs_dir) as scandir_it:
+                    listing_cache[rel_dir] = {entry.name: entry for entry in scandir_it}
+            except OSError:
+                listing_cache[rel_dir] = None
+        listing = listing_cache[rel_dir]
+        if listing is None:
+            return None
+        return listing.get(name)
+
+    candidate_list, dir_list = list(), list()
+    for root in root_list:
+        parts = root.split("/")
+        rel_dir = ""
+        entry = None
+        for part in parts:
+            if rel_dir:
+                # the parent must be a real directory, not pruned
+                try:
+                    is_dir = entry.is_dir(follow_symlinks=False)
+                except OSError:
+                    is_dir = False
+                if is_dir is False or is_pruned(prune_pattern_list, rel_dir):
+                    entry = None
+                    break
+            entry = get_entry(rel_dir, part)
+            if entry is None:
+                break
+            rel_dir = f"{rel_dir}/{part}" if rel_dir else part
+        if entry is None:
+            continue
+
+        if "." in entry.name:
+            candidate_list.append((root, entry.path))
+        try:
+            is_dir = entry.is_dir(follow_symlinks=False)
+        except OSError:
+            is_dir = False
+        if is_dir and is_pruned(prune_pattern_list, root) is False:
+            dir_list.append((root, entry.path))
+    return candidate_list, dir_list
+
+
+def walk_candidates_from_roots(
+    dir_root: Path,
+    root_list: list[str],
+    prune_pattern_list: list[tuple[re.Pattern, bool]],
+) -> T.Iterable[tuple[str, str]]:
+    """
+    Yield the ``glob("**/*.*")`` candidates that live under the roots computed
+    by :func:`plan_walk_roots`, see :func:`resolve_walk_roots`.
+
+    :returns: ``(relpath, abspath)`` tuples, ``relpath`` uses ``/`` as separator.
+    """
+    candidate_list, dir_list = resolve_walk_roots(
+        dir_root=dir_root,
+        root_list=root_list,
+        prune_pattern_list=prune_pattern_list,
+    )
+    yield from candidate_list
+    for rel_dir, _ in dir_list:
+        yield from walk_candidates(dir_root, prune_pattern_list, rel_dir=rel_dir)
+
+
+def walk_candidates_in_parallel(
+    dir_root: Path,
+    root_list: list[str],
+    prune_pattern_list: list[tuple[re.Pattern, bool]],
+    workers: int,
+) -> list[tuple[str, str]]:
+    """
+    The thread pool version of :func:`walk_candidates_from_roots`.
+
+    Every directory is listed by a :func:`scan_dir` task in the pool, and the
+    sub directories it finds are submitted as new tasks. This helps when
+    the walk is bound by file system latency (e.g. network mounted or very wide
+    checkouts) rather than CPU.
+
+    :param workers: Number of threads in the pool.
+
+    :returns: List of ``(relpath, abspath)`` tuples, the order is not guaranteed.
+    """
+    candidate_list, dir_list = resolve_walk_roots(
+        dir_root=dir_root,
+        root_list=root_list,
+        prune_pattern_list=prune_pattern_list,
+    )
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        pending = {
+            executor.submit(scan_dir, rel_dir, abs_dir, prune_pattern_list)
+            for rel_dir, abs_dir in dir_list
+        }
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                sub_candidate_list, sub_dir_list = future.result()
+                candidate_list.extend(sub_candidate_list)
+                for rel_dir, abs_dir in sub_dir_list:
+                    pending.add(
+                        executor.submit(scan_dir, rel_dir, abs_dir, prune_pattern_list)
+                    )
+    return candidate_list
+
+
 def find_matching_files(
     dir_root: Path,
     include: list[str],
     exclude: list[str],
+    workers: T.Optional[int] = None,
 ) -> T.Iterable[Path]:
     """
     Find files in a directory that match include patterns but not exclude patterns.
@@ -59,22 +580,142 @@ def find_matching_files(
        (or all files if include list is empty)
     2. Then, matching files are excluded if they match any pattern in the exclude list
 
+    Directories that are entirely covered by an exclude pattern
+    (e.g. ``.venv/**``, ``node_modules/**/*.*``, ``**/__pycache__``) are never entered,
+    see :func:`compile_prune_patterns`. If all include patterns are anchored
+    (e.g. ``docpack/**/*.py``, ``docs/source/**/index.rst``), only the sub directories
+    they can match are walked, see :func:`plan_walk_roots`. The order of the
+    returned paths is not guaranteed, sort them if you need a stable order.
+
     .. note::
 
-        We use `pathpick <https://github.com/MacHu-GWU/pathpick-project>`_ library
-        under the hood.
+        The patterns follow the `pathpick <https://github.com/MacHu-GWU/pathpick-project>`_
+        syntax, they are compiled into a :class:`PathMatcher` for speed.
 
     :param dir_root: The root directory to start the search from
     :param include: List of glob patterns to match files for inclusion
         If empty, defaults to ["**/*.*"] (all files)
     :param exclude: List of glob patterns to exclude files from the results
         If empty, no files are excluded
+    :param workers: If given, the directories are listed by a thread pool of
+        this size (see :func:`walk_candidates_in_parallel`), and the paths are
+        returned sorted by their relative path.
     """
     # process input parameter
     if not dir_root.exists() or not dir_root.is_dir():
         raise ValueError(f"Directory {dir_root} does not exist or is not a directory")
 
-    path_pick = PathPick.new(include=include, exclude=exclude)
-    for path in dir_root.glob("**/*.*"):
-        if path_pick.is_match(str(path.relative_to(dir_root))):
+    include, exclude = process_include_exclude(include, exclude)
+    path_matcher = PathMatcher.new(include=include, exclude=exclude)
+    prune_pattern_list = compile_prune_patterns(exclude)
+    root_list = plan_walk_roots(include)
+    if workers is None:
+        for relpath, abspath in walk_candidates_from_roots(
+            dir_root=dir_root,
+            root_list=root_list,
+            prune_pattern_list=prune_pattern_list,
+        ):
+            if path_matcher.is_match(relpath):
+                yield Path(abspath)
+    else:
+        candidate_list = walk_candidates_in_parallel(
+            dir_root=dir_root,
+            root_list=root_list,
+            prune_pattern_list=prune_pattern_list,
+            workers=workers,
+        )
+        abspath_mapping = dict(candidate_list)
+        for relpath in sorted(path_matcher.filter(abspath_mapping)):
+            yield Path(abspath_mapping[relpath])
+
+
+def filter_matching_paths(
+    relpath_list: list[str],
+    include: list[str],
+    exclude: list[str],
+) -> list[str]:
+    """
+    Apply the include/exclude patterns to a list of relative paths that are
+    already known (e.g. listed by git), without touching the file system.
+
+    Like :func:`find_matching_files`, only files whose name contains a dot
+    are candidates.
+
+    :param relpath_list: Relative paths using ``/`` as separator
+    :param include: List of glob patterns to match files for inclusion
+        If empty, defaults to ["**/*.*"] (all files)
+    :param exclude: List of glob patterns to exclude files from the results
+        If empty, no files are excluded
+
+    :returns: The matching relative paths, sorted
+    """
+    include, exclude = process_include_exclude(include, exclude)
+    path_matcher = PathMatcher.new(include=include, exclude=exclude)
+    candidate_list = [
+        relpath for relpath in relpath_list if "." in relpath.rsplit("/", 1)[-1]
+    ]
+    return sorted(path_matcher.filter(candidate_list))
+
+
+def find_matching_files_in_git_index(
+    dir_repo: Path,
+    include: list[str],
+    exclude: list[str],
+) -> T.Iterable[Path]:
+    """
+    Same as :func:`find_matching_files`, but the candidate files are listed from
+    the git index of a cloned repository (see
+    :func:`docpack.git_utils.list_tracked_files`) instead of walking the file system.
+
+    Untracked and git ignored files are never considered, so the result matches
+    what is actually committed to the repository. Like :func:`find_matching_files`,
+    only files whose name contains a dot are candidates, and tracked files that
+    are deleted from the working tree are skipped.
+
+    :param dir_repo: Path to the root of the cloned repository
+    :param include: List of glob patterns to match files for inclusion
+        If empty, defaults to ["**/*.*"] (all files)
+    :param exclude: List of glob patterns to exclude files from the results
+        If empty, no files are excluded
+
+    :returns: The matching paths, sorted by relative path
+    """
+    relpath_list = filter_matching_paths(
+        relpath_list=list_tracked_files(dir_repo),
+        include=include,
+        exclude=exclude,
+    )
+    for relpath in relpath_list:
+        path = dir_repo.joinpath(relpath)
+        if os.path.lexists(path):
             yield path
+
+
+def find_matching_blobs_in_git_tree(
+    dir_repo: Path,
+    ref: str,
+    include: list[str],
+    exclude: list[str],
+) -> list[tuple[str, str]]:
+    """
+    Same as :func:`find_matching_files_in_git_index`, but the candidate files
+    are listed from a branch, tag or commit in the object database (see
+    :func:`docpack.git_utils.list_tree_blobs`), so the checked out working tree
+    does not matter.
+
+    :param dir_repo: Path to the root of the cloned repository
+    :param ref: Branch name, tag name or commit sha
+    :param include: List of glob patterns to match files for inclusion
+        If empty, defaults to ["**/*.*"] (all files)
+    :param exclude: List of glob patterns to exclude files from the results
+        If empty, no files are excluded
+
+    :returns: The matching ``(relative path, blob sha)`` tuples, sorted by relative path
+    """
+    blob_mapping = dict(list_tree_blobs(dir_repo, ref))
+    relpath_list = filter_matching_paths(
+        relpath_list=list(blob_mapping),
+        include=include,
+        exclude=exclude,
+    )
+    return [(relpath, blob_mapping[relpath]) for relpath in relpath_list]
@@ -0,0 +1,256 @@
+# -*- coding: utf-8 -*-
+
+"""
+Thin wrappers around the ``git`` command line for reading a local clone
+without walking the working tree.
+"""
+
+import subprocess
+import threading
+from pathlib import Path
+
+# file mode of a submodule (gitlink) entry in the index / tree
+GITLINK_MODE = b"160000"
+# file mode of a symlink entry in the index / tree
+SYMLINK_MODE = b"120000"
+# file modes of a regular file entry in the index / tree
+REGULAR_FILE_MODE_SET = {b"100644", b"100755"}
+
+
+def run_git(
+    dir_repo: Path,
+    args: list[str],
+) -> bytes:
+    """
+    Run a ``git`` command in ``dir_repo`` and return the raw stdout.
+
+    :raises subprocess.CalledProcessError: if the command fails
+    """
+    res = subprocess.run(
+        ["git", *args],
+        cwd=dir_repo,
+        capture_output=True,
+        check=True,
+    )
+    return res.stdout
+
+
+def list_tracked_files(
+    dir_repo: Path,
+) -> list[str]:
+    """
+    List the files tracked in the git index with ``git ls-files -z --stage``.
+
+    Untracked and ignored files (virtualenvs, build artifacts, caches, ...) are
+    never listed, and no directory traversal is needed. Submodules are skipped.
+    If ``dir_repo`` is a sub directory of the repository, only files under it
+    are listed, relative to it.
+
+    :param dir_repo: Path to the root of the cloned repository
+
+    :returns: Sorted list of relative paths using ``/`` as separator
+    """
+    stdout = run_git(dir_repo, ["ls-files", "-z", "--stage"])
+    path_list = list()
+    for record in stdout.split(b"\0"):
+        if not record:
+            continue
+        meta, path = record.split(b"\t", 1)
+        mode = meta.split(b" ", 1)[0]
+        if mode == GITLINK_MODE:
+            continue
+        path_list.append(path.decode("utf-8"))
+    # a conflicted file has one entry per merge stage
+    return list(dict.fromkeys(path_list))
+
+
+def list_tree_blobs(
+    dir_repo: Path,
+    ref: str,
+) -> list[tuple[str, str]]:
+    """
+    List the files of a branch, tag or commit with ``git ls-tree -r -z``,
+    straight from the object database, the working tree is not touched.
+
+    Submodules and symlinks are skipped, a symlink blob only contains the
+    link target, not the content of the file it points to.
+    If ``dir_repo`` is a sub directory of the repository, only files under it
+    are listed, relative to it.
+
+    :param dir_repo: Path to the root of the cloned repository
+    :param ref: Branch name, tag name or commit sha
+
+    :returns: Sorted list of ``(relative path, blob sha)`` tuples
+    """
+    stdout = run_git(dir_repo, ["ls-tree", "-r", "-z", ref])
+    blob_list = list()
+    for record in stdout.split(b"\0"):
+        if not record:
+            continue
+        meta, path = record.split(b"\t", 1)
+        mode, type, sha = meta.split(b" ", 2)
+        if type != b"blob" or mode == SYMLINK_MODE:
+            continue
+        blob_list.append((path.decode("utf-8"), sha.decode("ascii")))
+    return blob_list
+
+
+def read_object_sizes(
+    dir_repo: Path,
+    object_name_list: list[str],
+) -> list[int]:
+    """
+    Get the size in bytes of many objects with one
+    ``git cat-file --batch-check`` process, the contents are not read.
+
+    :param dir_repo: Path to the root of the cloned repository
+    :param object_name_list: Object shas, or ``<ref>:<path>``
+
+    :returns: The sizes, in the same order
+
+    :raises KeyError: if an object does not exist
+    """
+    if not object_name_list:
+        return []
+    res = subprocess.run(
+        ["git", "cat-file", "--batch-check"],
+        cwd=dir_repo,
+        input="".join(f"{name}\n" for name in object_name_list).encode("utf-8"),
+        capture_output=True,
+        check=True,
+    )
+    size_list = list()
+    for object_name, line in zip(object_name_list, res.stdout.splitlines()):
+        if line.endswith(b" missing"):
+            raise KeyError(object_name)
+        size_list.append(int(line.split(b" ")[2]))
+    return size_list
+
+
+class GitCatFile:
+    """
+    A persistent ``git cat-file --batch`` process to read many objects
+    from the object database without starting one ``git`` process per object.
+
+    Example:
+
+    .. code-block:: python
+
+        with GitCatFile(dir_repo=dir_repo) as git_cat_file:
+            content = git_cat_file.read("main:README.rst")
+
+    :meth:`read` is thread safe, the requests are sent to the process one at a time.
+
+    :param dir_repo: Path to the root of the cloned repository
+    """
+
+    def __init__(self, dir_repo: Path):
+        self.dir_repo = dir_repo
+        self.lock = threading.Lock()
+        self.process = subprocess.Popen(
+            ["git", "cat-file", "--batch"],
+            cwd=dir_repo,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+        )
+
+    def read(self, object_name: str) -> bytes:
+        """
+        Read the raw content of an object.
+
+        :param object_name: Object sha, or ``<ref>:<path>``
+
+        :raises KeyError: if the object does not exist
+        """
+        with self.lock:
+            self.process.stdin.write(f"{object_name}\n".encode("utf-8"))
+            self.process.stdin.flush()
+            header = self.process.stdout.readline()
+            if header.endswith(b" missing\n") or not header:
+                raise KeyError(object_name)
+            size = int(header.split(b" ")[2])
+            content = self.process.stdout.read(size)
+            # each object content is followed by a line feed
+            self.process.stdout.read(1)
+            return content
+
+    def close(self):
+        """
+        Terminate the ``git cat-file --batch`` process.
+        """
+        if self.process.poll() is None:
+            self.process.stdin.close()
+            self.process.wait()
+            self.process.stdout.close()
+
+    def __enter__(self) -> "GitCatFile":
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+def diff_blobs(
+    dir_repo: Path,
+    old_ref: str,
+    new_ref: str,
+) -> tuple[list[tuple[str, str, str]], list[str]]:
+    """
+    List the files that changed between two branches, tags or commits with
+    ``git diff --raw -z --no-abbrev``, straight from the object database.
+
+    ``--raw`` is ``--name-status`` plus the file modes and blob shas, so the
+    new content can be read with :class:`GitCatFile` without checking out
+    ``new_ref``. Like :func:`list_tree_blobs`, only regular files count,
+    a file replaced by a symlink or submodule is reported as deleted.
+    A renamed file is reported as deleted under the old path and added under
+    the new path. If ``dir_repo`` is a sub directory of the repository, only
+    files under it are listed, relative to it.
+
+    :param dir_repo: Path to the root of the cloned repository
+    :param old_ref: Branch name, tag name or commit sha before the change
+    :param new_ref: Branch name, tag name or commit sha after the change
+
+    :returns: A tuple of the ``(status, relative path, new blob sha)`` of the
+        added (status ``"A"``) and modified (status ``"M"``) files, and the
+        relative paths of the deleted files
+    """
+    stdout = run_git(
+        dir_repo,
+        ["diff", "--raw", "-z", "--no-abbrev", "--relative", old_ref, new_ref],
+    )
+    changed_list = list()
+    deleted_list = list()
+    token_list = stdout.split(b"\0")
+    i = 0
+    while i < len(token_list):
+        meta = token_list[i]
+        if not meta:
+            i += 1
+            continue
+        # e.g. ":100644 100644 <old sha> <new sha> R087"
+        old_mode, new_mode, _, new_sha, status = meta[1:].split(b" ", 4)
+        status = status[:1]
+        if status in (b"R", b"C"):
+            old_path, new_path = token_list[i + 1], token_list[i + 2]
+            i += 3
+        else:
+            old_path = new_path = token_list[i + 1]
+            i += 2
+        old_path, new_path = old_path.decode("utf-8"), new_path.decode("utf-8")
+        was_file = old_mode in REGULAR_FILE_MODE_SET
+        is_file = new_mode in REGULAR_FILE_MODE_SET
+        if status == b"R" and was_file:
+            deleted_list.append(old_path)
+        if status in (b"A", b"R", b"C"):
+            if is_file:
+                changed_list.append(("A", new_path, new_sha.decode("ascii")))
+        elif is_file:
+            changed_list.append(
+                ("A" if not was_file else "M", new_path, new_sha.decode("ascii"))
+            )
+        elif was_file:
+            deleted_list.append(old_path)
+    changed_list.sort(key=lambda x: x[1])
+    deleted_list.sort()
+    return changed_list, deleted_list
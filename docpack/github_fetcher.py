@@ -15,13 +15,39 @@ them suitable for knowledge extraction, documentation generation, and AI context
 """
 
 import typing as T
+import os
 import hashlib
+import functools
+import contextlib
 from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
 
 from pydantic import BaseModel, Field
 
-from .constants import TAB, GitHubFileFieldEnum
-from .find_matching_files import find_matching_files
+from .constants import GitHubFileFieldEnum, GitHubFileSourceEnum
+from .find_matching_files import (
+    process_include_exclude,
+    PathMatcher,
+    filter_matching_paths,
+    find_matching_files,
+    find_matching_files_in_git_index,
+    find_matching_blobs_in_git_tree,
+)
+from .git_utils import diff_blobs, read_object_sizes, GitCatFile
+from .parallel import imap_ordered
+from .xml_serializer import XmlElement, XmlSerializer
+from .compression import get_suffix
+from .bundle import BundleWriter
+from .dedup import DUPLICATE_OF, ContentStore, DuplicateDocument
+from .near_dedup import MinHashLSH
+from .tokens import (
+    estimate_tokens,
+    estimate_tokens_by_size,
+    TokenCounter,
+    pack_by_budget,
+)
+from .plan import PlanItem, Plan, count_bundle_shards
+from .manifest import sha256_of_text, get_fingerprint, Manifest, SyncSummary
 
 
 def extract_domain(url: str) -> str:
@@ -67,7 +93,183 @@ def get_github_url(
     return f"https://{domain}/{account}/{repo}/blob/{branch}/{path}"
 
 
-class GitHubFile(BaseModel):
+def get_uri_hash(
+    domain: str,
+    account: str,
+    repo: str,
+    branch: str,
+    path: str,
+) -> str:
+    """
+    Generate the 7-character hash identifier of a file, see :attr:`GitHubFile.uri_hash`.
+    """
+    hash_key = f"{domain}/{account}/{repo}/{branch}/{path}"
+    return hashlib.sha256(hash_key.encode("utf-8")).hexdigest()[:7]
+
+
+@functools.lru_cache(maxsize=None)
+def _compile_github_file_xml_serializer(
+    wanted_fields: tuple[str, ...] | None,
+    duplicate: bool = False,
+) -> XmlSerializer:
+    if wanted_fields is None:
+        wanted_fields = tuple(field.value for field in GitHubFileFieldEnum)
+    element_list = [
+        XmlElement(
+            field=GitHubFileFieldEnum.source_type.value,
+            constant="GitHub Repository",
+        ),
+        XmlElement(field=GitHubFileFieldEnum.github_url.value, attr="github_url"),
+        XmlElement(field=GitHubFileFieldEnum.account.value, attr="account"),
+        XmlElement(field=GitHubFileFieldEnum.repo.value, attr="repo"),
+        XmlElement(field=GitHubFileFieldEnum.branch.value, attr="branch"),
+        XmlElement(field=GitHubFileFieldEnum.path.value, attr="path"),
+        XmlElement(
+            field=GitHubFileFieldEnum.title.value,
+            attr="title",
+            optional=True,
+        ),
+        XmlElement(
+            field=GitHubFileFieldEnum.description.value,
+            attr="description",
+            block=True,
+            optional=True,
+        ),
+        XmlElement(
+            field=GitHubFileFieldEnum.content.value,
+            attr="content",
+            block=True,
+        ),
+    ]
+    element_list = [
+        element for element in element_list if element.field in wanted_fields
+    ]
+    # the content is the last element
+    if (
+        duplicate
+        and element_list
+        and element_list[-1].field == GitHubFileFieldEnum.content.value
+    ):
+        element_list[-1] = XmlElement(field=DUPLICATE_OF, attr=DUPLICATE_OF)
+    return XmlSerializer.new(element_list)
+
+
+def get_github_file_xml_serializer(
+    wanted_fields: list[str] | None = None,
+    duplicate: bool = False,
+) -> XmlSerializer:
+    """
+    Get the :class:`~docpack.xml_serializer.XmlSerializer` of :class:`GitHubFile`
+    for the given ``wanted_fields``, it is compiled only once per ``wanted_fields``.
+
+    :param duplicate: If True, the serializer of a
+        :class:`~docpack.dedup.DuplicateDocument`, the ``content`` is replaced
+        by a ``<duplicate_of>`` reference.
+    """
+    return _compile_github_file_xml_serializer(
+        None if wanted_fields is None else tuple(wanted_fields),
+        duplicate,
+    )
+
+
+class GitHubFileMixin:
+    """
+    Serialization and export methods shared by :class:`GitHubFile` and
+    :class:`GitHubFileRecord`, they only use the ``github_url``, ``account``,
+    ``repo``, ``branch``, ``path``, ``title``, ``description``, ``content``,
+    ``breadcrumb_path`` and ``uri_hash`` attributes.
+    """
+
+    __slots__ = ()
+
+    def to_xml(
+        self,
+        wanted_fields: list[str] | None = None,
+    ) -> str:
+        """
+        Serialize the file data to XML format.
+
+        This method generates an XML representation of the file including its GitHub
+        metadata and content, suitable for document storage or AI context input.
+        """
+        return get_github_file_xml_serializer(wanted_fields).to_xml(self)
+
+    def write_xml(
+        self,
+        fileobj: T.TextIO,
+        wanted_fields: list[str] | None = None,
+    ):
+        """
+        Same as :meth:`to_xml`, but write the XML directly to an open text file.
+        """
+        get_github_file_xml_serializer(wanted_fields).write_xml(self, fileobj)
+
+    def estimate_tokens(
+        self,
+        wanted_fields: list[str] | None = None,
+        token_counter: TokenCounter | None = None,
+    ) -> int:
+        """
+        Count the tokens of the XML document, i.e. what it costs in the
+        context window of a model.
+
+        :param token_counter: The :class:`~docpack.tokens.TokenCounter`,
+            default to the built-in heuristic.
+        """
+        xml = self.to_xml(wanted_fields)
+        if token_counter is None:
+            return estimate_tokens(xml)
+        return token_counter.count(xml)
+
+    def get_path_out(
+        self,
+        dir_out: Path,
+        compression: str | None = None,
+    ) -> Path:
+        """
+        Get the path of the XML file that :meth:`export_to_file` writes,
+        it only depends on the location of the file, not on its content.
+
+        :param dir_out: The directory where the XML file should be saved
+        :param compression: The compression suffix (e.g. ``.gz``) is appended
+            if set, see :class:`~docpack.constants.CompressionEnum`.
+        """
+        return dir_out.joinpath(
+            f"{self.breadcrumb_path}~{self.uri_hash}.xml{get_suffix(compression)}"
+        )
+
+    def export_to_file(
+        self,
+        dir_out: Path,
+        wanted_fields: list[str] | None = None,
+        compression: str | None = None,
+        compression_level: int | None = None,
+    ) -> Path:
+        """
+        Export the file data as an XML document to the specified directory.
+
+        Creates an XML file in the specified directory with a filename that
+        combines the breadcrumb path and URI hash to ensure uniqueness.
+
+        :param dir_out: The directory where the XML file should be saved
+        :param compression: If set, the XML is compressed on the fly, see
+            :class:`~docpack.constants.CompressionEnum`.
+        :param compression_level: The compression level, see
+            :func:`~docpack.compression.get_level`.
+
+        :returns: The path to the created XML file
+        """
+        path_out = self.get_path_out(dir_out=dir_out, compression=compression)
+        get_github_file_xml_serializer(wanted_fields).write_file(
+            self,
+            path_out,
+            compression=compression,
+            compression_level=compression_level,
+        )
+        return path_out
+
+
+class GitHubFile(GitHubFileMixin, BaseModel):
     """
     A data container representing a file in a GitHub repository with metadata and content.
 
@@ -106,57 +308,6 @@ class GitHubFile(BaseModel):
         """
         return "/".join(self.path_parts)
 
-    def to_xml(
-        self,
-        wanted_fields: list[str] | None = None,
-    ) -> str:
-        """
-        Serialize the file data to XML format.
-
-        This method generates an XML representation of the file including its GitHub
-        metadata and content, suitable for document storage or AI context input.
-        """
-        if wanted_fields is None:
-            wanted_fields = [field.value for field in GitHubFileFieldEnum]
-        lines = list()
-
-        lines.append("<document>")
-        if GitHubFileFieldEnum.source_type.value in wanted_fields:
-            field = GitHubFileFieldEnum.source_type.value
-            lines.append(f"{TAB}<{field}>GitHub Repository</{field}>")
-        if GitHubFileFieldEnum.github_url.value in wanted_fields:
-            field = GitHubFileFieldEnum.github_url.value
-            lines.append(f"{TAB}<{field}>{self.github_url}</{field}>")
-        if GitHubFileFieldEnum.account.value in wanted_fields:
-            field = GitHubFileFieldEnum.account.value
-            lines.append(f"{TAB}<{field}>{self.account}</{field}>")
-        if GitHubFileFieldEnum.repo.value in wanted_fields:
-            field = GitHubFileFieldEnum.repo.value
-            lines.append(f"{TAB}<{field}>{self.repo}</{field}>")
-        if GitHubFileFieldEnum.branch.value in wanted_fields:
-            field = GitHubFileFieldEnum.branch.value
-            lines.append(f"{TAB}<{field}>{self.branch}</{field}>")
-        if GitHubFileFieldEnum.path.value in wanted_fields:
-            field = GitHubFileFieldEnum.path.value
-            lines.append(f"{TAB}<{field}>{self.path}</{field}>")
-        if self.title:
-            if GitHubFileFieldEnum.title.value in wanted_fields:
-                field = GitHubFileFieldEnum.title.value
-                lines.append(f"{TAB}<{field}>{self.title}</{field}>")
-        if self.description:
-            if GitHubFileFieldEnum.description.value in wanted_fields:
-                field = GitHubFileFieldEnum.description.value
-                lines.append(f"{TAB}<{field}>")
-                lines.append(self.description)
-                lines.append(f"{TAB}</{field}>")
-        if GitHubFileFieldEnum.content.value in wanted_fields:
-            field = GitHubFileFieldEnum.content.value
-            lines.append(f"{TAB}<{field}>")
-            lines.append(self.content)
-            lines.append(f"{TAB}</{field}>")
-        lines.append("</document>")
-        return "\n".join(lines)
-
     @property
     def uri_hash(self) -> str:
         """
@@ -168,8 +319,13 @@ class GitHubFile(BaseModel):
 
         :returns: A 7-character hash string derived from the file's URI
         """
-        hash_key = f"{self.domain}/{self.account}/{self.repo}/{self.branch}/{self.path}"
-        return hashlib.sha256(hash_key.encode("utf-8")).hexdigest()[:7]
+        return get_uri_hash(
+            domain=self.domain,
+            account=self.account,
+            repo=self.repo,
+            branch=self.branch,
+            path=self.path,
+        )
 
     @property
     def breadcrumb_path(self) -> str:
@@ -184,29 +340,92 @@ class GitHubFile(BaseModel):
         """
         return "~".join(self.path_parts)
 
-    def export_to_file(
-        self,
-        dir_out: Path,
-        wanted_fields: list[str] | None = None,
-    ) -> Path:
-        """
-        Export the file data as an XML document to the specified directory.
 
-        Creates an XML file in the specified directory with a filename that
-        combines the breadcrumb path and URI hash to ensure uniqueness.
+class GitHubFileRecord(GitHubFileMixin):
+    """
+    A lightweight, ``__slots__`` based version of :class:`GitHubFile` used by
+    :class:`GitHubPipeline` in its hot loop.
 
-        :param dir_out: The directory where the XML file should be saved
+    There is no validation, and ``path``, ``breadcrumb_path``, ``uri_hash`` and
+    ``github_url`` are computed once in the constructor instead of on every
+    access. Use :meth:`to_github_file` to get the public pydantic model.
+    """
 
-        :returns: The path to the created XML file
+    __slots__ = (
+        "domain",
+        "account",
+        "repo",
+        "branch",
+        "path_parts",
+        "title",
+        "description",
+        "content",
+        "path",
+        "breadcrumb_path",
+        "uri_hash",
+        "github_url",
+    )
+
+    def __init__(
+        self,
+        domain: str,
+        account: str,
+        repo: str,
+        branch: str,
+        path_parts: tuple[str, ...],
+        content: str,
+        title: str = "",
+        description: str = "",
+    ):
+        self.domain = domain
+        self.account = account
+        self.repo = repo
+        self.branch = branch
+        self.path_parts = path_parts
+        self.title = title
+        self.description = description
+        self.content = content
+        self.path = "/".join(path_parts)
+        self.breadcrumb_path = "~".join(path_parts)
+        self.uri_hash = get_uri_hash(
+            domain=domain,
+            account=account,
+            repo=repo,
+            branch=branch,
+            path=self.path,
+        )
+        self.github_url = get_github_url(
+            domain=domain,
+            account=account,
+            repo=repo,
+            branch=branch,
+            path_parts=path_parts,
+        )
+
+    def to_github_file(self) -> GitHubFile:
         """
-        path_out = dir_out.joinpath(f"{self.breadcrumb_path}~{self.uri_hash}.xml")
-        content = self.to_xml(wanted_fields=wanted_fields)
-        try:
-            path_out.write_text(content, encoding="utf-8")
-        except FileNotFoundError as e:
-            path_out.parent.mkdir(parents=True)
-            path_out.write_text(content, encoding="utf-8")
-        return path_out
+        Convert to a :class:`GitHubFile`, without validation.
+        """
+        return GitHubFile.model_construct(
+            domain=self.domain,
+            account=self.account,
+            repo=self.repo,
+            branch=self.branch,
+            github_url=self.github_url,
+            path_parts=self.path_parts,
+            title=self.title,
+            description=self.description,
+            content=self.content,
+        )
+
+
+def decode_blob(blob: bytes) -> str:
+    """
+    Decode the raw content of a git blob the same way as
+    ``Path.read_text(encoding="utf-8")`` reads a file, including the
+    universal newlines translation (``\\r\\n`` and ``\\r`` become ``\\n``).
+    """
+    return blob.decode("utf-8").replace("\r\n", "\n").replace("\r", "\n")
 
 
 def sort_github_files(
@@ -227,6 +446,110 @@ def sort_github_files(
     return list(sorted(github_file_list, key=lambda x: x.path))
 
 
+def new_github_file(
+    domain: str,
+    account: str,
+    repo: str,
+    branch: str,
+    path_parts: tuple[str, ...],
+    content: str,
+) -> GitHubFile:
+    """
+    Create a :class:`GitHubFile` for a file in the repository.
+    """
+    github_url = get_github_url(
+        domain=domain,
+        account=account,
+        repo=repo,
+        branch=branch,
+        path_parts=path_parts,
+    )
+    # all values are built by us, no need to validate them
+    return GitHubFile.model_construct(
+        domain=domain,
+        account=account,
+        repo=repo,
+        branch=branch,
+        github_url=github_url,
+        path_parts=path_parts,
+        title="",
+        description="",
+        content=content,
+    )
+
+
+def list_matching_github_paths(
+    dir_repo: Path,
+    include: list[str],
+    exclude: list[str],
+    source: str = GitHubFileSourceEnum.filesystem.value,
+    ref: str | None = None,
+) -> list[tuple[str, str | None]]:
+    """
+    List the files that match the include/exclude patterns without reading them.
+
+    :param dir_repo: Path to the root of the cloned repository
+    :param include: List of glob patterns specifying which files to include
+    :param exclude: List of glob patterns specifying which files to exclude
+    :param source: Where to list the candidate files from, see
+        :class:`~docpack.constants.GitHubFileSourceEnum`.
+    :param ref: The branch, tag or commit to list in ``"git_object"`` mode.
+
+    :returns: List of ``(relative path, blob sha)`` tuples sorted by relative path,
+        the blob sha is ``None`` unless ``source`` is ``"git_object"``.
+    """
+    if source == GitHubFileSourceEnum.git_object.value:
+        return find_matching_blobs_in_git_tree(
+            dir_repo=dir_repo,
+            ref=ref,
+            include=include,
+            exclude=exclude,
+        )
+    if source == GitHubFileSourceEnum.filesystem.value:
+        path_list = find_matching_files(
+            dir_root=dir_repo,
+            include=include,
+            exclude=exclude,
+        )
+    elif source == GitHubFileSourceEnum.git_index.value:
+        path_list = find_matching_files_in_git_index(
+            dir_repo=dir_repo,
+            include=include,
+            exclude=exclude,
+        )
+    else:  # pragma: no cover
+        raise ValueError(f"Invalid source: {source!r}")
+    relpath_list = ["/".join(path.relative_to(dir_repo).parts) for path in path_list]
+    return [(relpath, None) for relpath in sorted(relpath_list)]
+
+
+@contextlib.contextmanager
+def open_content_reader(
+    dir_repo: Path,
+    source: str = GitHubFileSourceEnum.filesystem.value,
+) -> T.Iterator[T.Callable[[str, str | None], str]]:
+    """
+    Context manager that gives a ``read_content(relpath, blob_sha)`` function
+    to read the files listed by :func:`list_matching_github_paths`.
+
+    In ``"git_object"`` mode, all files are read through one persistent
+    :class:`~docpack.git_utils.GitCatFile` process.
+    """
+    if source == GitHubFileSourceEnum.git_object.value:
+        with GitCatFile(dir_repo=dir_repo) as git_cat_file:
+
+            def read_content(relpath: str, blob_sha: str | None) -> str:
+                return decode_blob(git_cat_file.read(blob_sha))
+
+            yield read_content
+    else:
+
+        def read_content(relpath: str, blob_sha: str | None) -> str:
+            return dir_repo.joinpath(relpath).read_text(encoding="utf-8")
+
+        yield read_content
+
+
 def find_matching_github_files_from_cloned_folder(
     domain: str,
     account: str,
@@ -235,6 +558,8 @@ def find_matching_github_files_from_cloned_folder(
     dir_repo: Path,
     include: list[str],
     exclude: list[str],
+    source: str = GitHubFileSourceEnum.filesystem.value,
+    ref: str | None = None,
 ) -> list[GitHubFile]:
     """
     Find and process files from a local clone of a GitHub repository.
@@ -253,6 +578,12 @@ def find_matching_github_files_from_cloned_folder(
             (e.g., ["*.py", "docs/**/*.md"])
     :param exclude: List of glob patterns specifying which files to exclude
             (e.g., ["**/__pycache__/**", "**/.git/**"])
+    :param source: Where to list the candidate files from, see
+        :class:`~docpack.constants.GitHubFileSourceEnum`. ``"git_index"`` only
+        considers files tracked by git, without walking the working tree.
+        ``"git_object"`` reads the files of ``ref`` from the git object database.
+    :param ref: The branch, tag or commit to read in ``"git_object"`` mode,
+        default to ``branch``.
 
     :returns: A sorted list of :class:`GitHubFile` objects representing the
         matching files from the repository
@@ -264,35 +595,59 @@ def find_matching_github_files_from_cloned_folder(
         from git_web_url.api to generate the GitHub URL for each file based on
         its local path.
     """
-    domain = extract_domain(domain)
-    github_file_list = list()
-    for path in find_matching_files(
-        dir_root=dir_repo,
-        include=include,
-        exclude=exclude,
-    ):
-        path_parts = path.relative_to(dir_repo).parts
-        github_url = get_github_url(
-            domain=domain,
-            account=account,
-            repo=repo,
-            branch=branch,
-            path_parts=path_parts,
-        )
-        github_file = GitHubFile(
+    return list(
+        iter_matching_github_files_from_cloned_folder(
             domain=domain,
             account=account,
             repo=repo,
             branch=branch,
-            github_url=github_url,
-            path_parts=path_parts,
-            title="",
-            description="",
-            content=path.read_text(encoding="utf-8"),
+            dir_repo=dir_repo,
+            include=include,
+            exclude=exclude,
+            source=source,
+            ref=ref,
         )
-        github_file_list.append(github_file)
+    )
 
-    return sort_github_files(github_file_list)
+
+def iter_matching_github_files_from_cloned_folder(
+    domain: str,
+    account: str,
+    repo: str,
+    branch: str,
+    dir_repo: Path,
+    include: list[str],
+    exclude: list[str],
+    source: str = GitHubFileSourceEnum.filesystem.value,
+    ref: str | None = None,
+) -> T.Iterator[GitHubFile]:
+    """
+    Streaming version of :func:`find_matching_github_files_from_cloned_folder`.
+
+    The matching paths are listed and sorted first, then each file is read only
+    when the next :class:`GitHubFile` is requested, so only one file content
+    is held in memory at a time, no matter how big the repository is.
+
+    :returns: An iterator of :class:`GitHubFile` objects, in path order
+    """
+    domain = extract_domain(domain)
+    path_list = list_matching_github_paths(
+        dir_repo=dir_repo,
+        include=include,
+        exclude=exclude,
+        source=source,
+        ref=branch if ref is None else ref,
+    )
+    with open_content_reader(dir_repo=dir_repo, source=source) as read_content:
+        for relpath, blob_sha in path_list:
+            yield new_github_file(
+                domain=domain,
+                account=account,
+                repo=repo,
+                branch=branch,
+                path_parts=tuple(relpath.split("/")),
+                content=read_content(relpath, blob_sha),
+            )
 
 
 class GitHubPipeline(BaseModel):
@@ -314,6 +669,47 @@ class GitHubPipeline(BaseModel):
     :param exclude: List of glob patterns specifying which files to exclude
             (e.g., ["**/__pycache__/**", "**/.git/**"])
     :param dir_out: The directory where the XML files should be exported.
+    :param source: Where to list the candidate files from, see
+        :class:`~docpack.constants.GitHubFileSourceEnum`.
+    :param ref: The branch, tag or commit to read when ``source="git_object"``,
+        default to ``branch``. Because the working tree is not touched, multiple
+        pipelines can pack different branches of the same clone at the same time.
+    :param incremental: If True, keep a manifest in ``dir_out`` and only export
+        the files that changed since the last run, see :meth:`fetch_incremental`.
+        To export the files changed between two known commits, see :meth:`fetch_delta`.
+    :param max_workers: If set, a full export reads and exports the files in a
+        thread pool of this size, see :meth:`fetch`.
+    :param path_bundle: If set, a full export also streams all documents,
+        in path order, into this single all-in-one file and writes an offset
+        index next to it, see :class:`~docpack.bundle.BundleWriter`.
+    :param export_documents: If False, no per document XML file is written to
+        ``dir_out``, this is useful when only the bundle is needed.
+    :param max_bundle_bytes: If set, split the bundle into numbered shards of
+        at most this many bytes, a document is never split across shards.
+    :param max_bundle_tokens: If set, split the bundle into numbered shards of
+        at most this many estimated tokens.
+    :param compression: If set, compress the per document XML files and the
+        bundle on the fly, see :class:`~docpack.constants.CompressionEnum`.
+        The compression suffix (e.g. ``.gz``) is appended to the file names.
+    :param compression_level: The compression level, default to 6 for gzip
+        and 3 for zstd.
+    :param content_store: If set, a file whose content was already seen by
+        this store (in this run, or in another pipeline sharing the store) is
+        exported with a reference to the first file instead of its content,
+        see :mod:`docpack.dedup`. Only supported by a full export.
+    :param minhash_lsh: If set, a file whose content is a near duplicate of
+        a file already exported (in this run, or in another pipeline sharing
+        it) is not exported, see :mod:`docpack.near_dedup`. Requires NumPy.
+        Only supported by a full export.
+    :param token_counter: The :class:`~docpack.tokens.TokenCounter` used to
+        count the tokens of the documents, default to the built-in heuristic.
+    :param token_budget: If set, only export the files that fit under this
+        total number of tokens, the most important ones first, see :meth:`fetch`.
+        Only supported by a full export.
+    :param include_weights: The weight of the files matched by each pattern
+        (e.g. ``{"README.rst": 10, "docs/**/*.rst": 5}``), used with
+        ``token_budget``. Files matched by several patterns get the highest
+        weight, files matched by none get 0.
     """
 
     domain: str = Field()
@@ -325,6 +721,21 @@ class GitHubPipeline(BaseModel):
     exclude: list[str] = Field()
     dir_out: Path = Field()
     wanted_fields: list[str] | None = Field(default=None)
+    source: str = Field(default=GitHubFileSourceEnum.filesystem.value)
+    ref: str | None = Field(default=None)
+    incremental: bool = Field(default=False)
+    max_workers: int | None = Field(default=None)
+    path_bundle: Path | None = Field(default=None)
+    export_documents: bool = Field(default=True)
+    max_bundle_bytes: int | None = Field(default=None)
+    max_bundle_tokens: int | None = Field(default=None)
+    compression: str | None = Field(default=None)
+    compression_level: int | None = Field(default=None)
+    content_store: ContentStore | None = Field(default=None)
+    minhash_lsh: MinHashLSH | None = Field(default=None)
+    token_counter: TokenCounter | None = Field(default=None)
+    token_budget: int | None = Field(default=None)
+    include_weights: dict[str, float] | None = Field(default=None)
 
     def model_post_init(self, __context: T.Any) -> None:
         self.domain = extract_domain(self.domain)
@@ -335,7 +746,344 @@ class GitHubPipeline(BaseModel):
     def post_process_path_out(self, github_file: GitHubFile, path_out: Path):
         pass
 
-    def fetch(self):
+    def _has_hooks(self) -> bool:
+        klass = type(self)
+        return (
+            klass.post_process_github_file
+            is not GitHubPipeline.post_process_github_file
+            or klass.post_process_path_out is not GitHubPipeline.post_process_path_out
+        )
+
+    def _new_github_file(
+        self,
+        relpath: str,
+        content: str,
+    ) -> T.Union[GitHubFile, GitHubFileRecord]:
+        """
+        Create the document of a matched file and call ``post_process_github_file``.
+
+        The hooks are part of the public API and take a :class:`GitHubFile`,
+        so a lightweight :class:`GitHubFileRecord` is only used when neither
+        of them is overridden.
+        """
+        github_file = GitHubFileRecord(
+            domain=self.domain,
+            account=self.account,
+            repo=self.repo,
+            branch=self.branch,
+            path_parts=tuple(relpath.split("/")),
+            content=content,
+        )
+        if self._has_hooks():
+            return self.post_process_github_file(github_file.to_github_file())
+        return github_file
+
+    def _is_near_duplicate(
+        self,
+        github_file: T.Union[GitHubFile, GitHubFileRecord],
+        sync_summary: SyncSummary,
+    ) -> bool:
+        """
+        Check the file against ``minhash_lsh`` and record it in the summary if
+        it is a near duplicate. It must be called in path order, the first
+        file of a cluster is the one that is exported.
+        """
+        if self.minhash_lsh is None:
+            return False
+        original = self.minhash_lsh.add(
+            key=github_file.github_url,
+            text=github_file.content,
+        )
+        if original is None:
+            return False
+        sync_summary.near_duplicated.append(github_file.path)
+        return True
+
+    def _deduplicate(
+        self,
+        github_file: T.Union[GitHubFile, GitHubFileRecord],
+    ) -> T.Union[GitHubFile, GitHubFileRecord, DuplicateDocument]:
+        """
+        Wrap the file in a :class:`~docpack.dedup.DuplicateDocument` if
+        ``content_store`` already has its content. It must be called in
+        path order, the first file with a given content is the original.
+        """
+        if self.content_store is None:
+            return github_file
+        original = self.content_store.add(
+            key=github_file.path,
+            url=github_file.github_url,
+            body=github_file.content,
+        )
+        if original is None:
+            return github_file
+        return DuplicateDocument(document=github_file, original=original)
+
+    def _list_matching_paths(self) -> list[tuple[str, str | None]]:
+        return list_matching_github_paths(
+            dir_repo=self.dir_repo,
+            include=self.include,
+            exclude=self.exclude,
+            source=self.source,
+            ref=self.branch if self.ref is None else self.ref,
+        )
+
+    def _pack_by_budget(
+        self,
+        path_list: list[tuple[str, str | None]],
+        n_tokens_list: list[int],
+    ) -> list[int]:
+        include, _ = process_include_exclude(self.include, [])
+        include_matcher_list = [
+            PathMatcher.new(include=[pattern], exclude=[]) for pattern in include
+        ]
+        weight_matcher_list = [
+            (PathMatcher.new(include=[pattern], exclude=[]), weight)
+            for pattern, weight in (self.include_weights or {}).items()
+        ]
+        weight_list, priority_list = list(), list()
+        for relpath, _ in path_list:
+            weight_list.append(
+                max(
+                    (w for m, w in weight_matcher_list if m.is_match(relpath)),
+                    default=0.0,
+                )
+            )
+            priority_list.append(
+                next(
+                    (
+                        i
+                        for i, m in enumerate(include_matcher_list)
+                        if m.is_match(relpath)
+                    ),
+                    len(include_matcher_list),
+                )
+            )
+        return pack_by_budget(
+            n_tokens_list=n_tokens_list,
+            token_budget=self.token_budget,
+            weight_list=weight_list,
+            priority_list=priority_list,
+        )
+
+    def _pack(
+        self,
+        path_list: list[tuple[str, str | None]],
+        sync_summary: SyncSummary,
+    ) -> tuple[list[tuple[str, str | None]], dict[str, str]]:
+        """
+        Select the files that fit under ``token_budget`` with
+        :func:`~docpack.tokens.pack_by_budget`. The files are considered by
+        descending ``include_weights``, then by the first ``include`` pattern
+        that matches them, then in path order. The others are reported in
+        ``over_budget`` of the summary.
+
+        :returns: The selected files, in path order, and the content of the
+            selected files by path, the files are read and decoded once to
+            count their tokens, the export reuses the content.
+        """
+        if self.token_budget is None:
+            return path_list, dict()
+        n_tokens_list, content_list = list(), list()
+        with open_content_reader(
+            dir_repo=self.dir_repo, source=self.source
+        ) as read_content:
+            for relpath, blob_sha in path_list:
+                github_file = GitHubFileRecord(
+                    domain=self.domain,
+                    account=self.account,
+                    repo=self.repo,
+                    branch=self.branch,
+                    path_parts=tuple(relpath.split("/")),
+                    content=read_content(relpath, blob_sha),
+                )
+                content_list.append(github_file.content)
+                n_tokens_list.append(
+                    github_file.estimate_tokens(
+                        wanted_fields=self.wanted_fields,
+                        token_counter=self.token_counter,
+                    )
+                )
+        selected = self._pack_by_budget(path_list, n_tokens_list)
+        selected_set = set(selected)
+        sync_summary.over_budget.extend(
+            relpath for i, (relpath, _) in enumerate(path_list) if i not in selected_set
+        )
+        sync_summary.n_tokens_by_source = {
+            path_list[i][0]: n_tokens_list[i] for i in selected
+        }
+        sync_summary.n_tokens = sum(sync_summary.n_tokens_by_source.values())
+        return (
+            [path_list[i] for i in selected],
+            {path_list[i][0]: content_list[i] for i in selected},
+        )
+
+    def plan(self) -> Plan:
+        """
+        Dry run of :meth:`fetch`, see :mod:`docpack.plan`: list the matched
+        files and estimate the output from the file sizes, no file is read.
+
+        The size of a file is its size on disk, or its blob size in
+        ``"git_object"`` mode (one ``git cat-file --batch-check`` call). The
+        XML size is the exact size of the metadata plus the file size, and the
+        number of tokens is estimated from it with the built-in heuristic,
+        also to apply ``token_budget``. The files come from the local clone,
+        so no API call is needed. The plan is the one of a full export, even
+        if ``incremental`` is set.
+        """
+        path_list = self._list_matching_paths()
+        if self.source == GitHubFileSourceEnum.git_object.value:
+            size_list = read_object_sizes(
+                self.dir_repo, [blob_sha for _, blob_sha in path_list]
+            )
+        else:
+            size_list = [
+                os.stat(self.dir_repo.joinpath(relpath)).st_size
+                for relpath, _ in path_list
+            ]
+        serializer = get_github_file_xml_serializer(self.wanted_fields)
+        has_content = (
+            self.wanted_fields is None
+            or GitHubFileFieldEnum.content.value in self.wanted_fields
+        )
+        item_list = list()
+        for (relpath, _), size in zip(path_list, size_list):
+            github_file = GitHubFileRecord(
+                domain=self.domain,
+                account=self.account,
+                repo=self.repo,
+                branch=self.branch,
+                path_parts=tuple(relpath.split("/")),
+                content="",
+            )
+            # the content is written as is, only the metadata is serialized
+            xml = serializer.to_xml(github_file)
+            n_chars, n_bytes = len(xml), len(xml.encode("utf-8"))
+            if has_content:
+                n_chars, n_bytes = n_chars + size, n_bytes + size
+            item_list.append(
+                PlanItem(
+                    key=relpath,
+                    url=github_file.github_url,
+                    size=size,
+                    n_bytes=n_bytes,
+                    n_tokens=estimate_tokens_by_size(n_chars),
+                )
+            )
+
+        plan = Plan()
+        if self.token_budget is not None:
+            selected = self._pack_by_budget(
+                path_list, [item.n_tokens for item in item_list]
+            )
+            selected_set = set(selected)
+            plan.over_budget = [
+                item.key for i, item in enumerate(item_list) if i not in selected_set
+            ]
+            item_list = [item_list[i] for i in selected]
+        plan.items = item_list
+        # every matched file is read once, to count its tokens if there is a
+        # budget, the export reuses the content
+        plan.n_body_download = len(path_list)
+        if self.export_documents:
+            plan.n_file_to_write += len(item_list)
+        if self.path_bundle is not None:
+            plan.n_file_to_write += 1 + count_bundle_shards(
+                item_list,
+                max_bytes=self.max_bundle_bytes,
+                max_tokens=self.max_bundle_tokens,
+            )
+        return plan
+
+    def _open_bundle_writer(self) -> T.ContextManager[BundleWriter | None]:
+        if self.path_bundle is None:
+            return contextlib.nullcontext()
+        return BundleWriter(
+            path_bundle=self.path_bundle,
+            max_bytes=self.max_bundle_bytes,
+            max_tokens=self.max_bundle_tokens,
+            count_tokens=(
+                estimate_tokens if self.token_counter is None else self.token_counter
+            ),
+            compression=self.compression,
+            compression_level=self.compression_level,
+        )
+
+    def _export_github_file(
+        self,
+        github_file: T.Union[GitHubFile, GitHubFileRecord, DuplicateDocument],
+    ) -> Path | None:
+        if self.export_documents is False:
+            return None
+        if isinstance(github_file, DuplicateDocument):
+            path_out = github_file.get_path_out(
+                dir_out=self.dir_out,
+                compression=self.compression,
+            )
+            get_github_file_xml_serializer(
+                self.wanted_fields, duplicate=True
+            ).write_file(
+                github_file,
+                path_out,
+                compression=self.compression,
+                compression_level=self.compression_level,
+            )
+            return path_out
+        return github_file.export_to_file(
+            dir_out=self.dir_out,
+            wanted_fields=self.wanted_fields,
+            compression=self.compression,
+            compression_level=self.compression_level,
+        )
+
+    def _after_export(
+        self,
+        github_file: T.Union[GitHubFile, GitHubFileRecord, DuplicateDocument],
+        path_out: Path | None,
+        bundle_writer: BundleWriter | None,
+        sync_summary: SyncSummary,
+    ):
+        """
+        Add the document to the bundle, call ``post_process_path_out`` and
+        record it in the summary, always from the calling thread, in path order.
+        """
+        is_duplicate = isinstance(github_file, DuplicateDocument)
+        if bundle_writer is not None:
+            bundle_writer.add_document(
+                obj=github_file,
+                serializer=get_github_file_xml_serializer(
+                    self.wanted_fields, duplicate=is_duplicate
+                ),
+                key=github_file.path,
+                url=github_file.github_url,
+                uri_hash=github_file.uri_hash,
+            )
+        sync_summary.added.append(github_file.path)
+        if is_duplicate:
+            sync_summary.duplicated.append(github_file.path)
+            sync_summary.n_bytes_saved += github_file.original.size
+            github_file = github_file.document
+        if path_out is not None:
+            self.post_process_path_out(github_file=github_file, path_out=path_out)
+
+    def _ensure_document_output_only(self, method: str):
+        # these modes update the per document files in place, they can not
+        # rebuild a bundle without reading every document again, nor know
+        # which unchanged document holds the content of a duplicate
+        if (
+            self.path_bundle is not None
+            or self.export_documents is False
+            or self.content_store is not None
+            or self.minhash_lsh is not None
+            or self.token_budget is not None
+        ):
+            raise ValueError(
+                f"path_bundle, export_documents=False, content_store, minhash_lsh "
+                f"and token_budget are only supported by a full export, "
+                f"not by {method}"
+            )
+
+    def fetch(self) -> SyncSummary:
         """
         Execute the pipeline to extract and export GitHub files to the target directory.
 
@@ -344,20 +1092,298 @@ class GitHubPipeline(BaseModel):
         1. Finds all files in the local repository that match the include/exclude patterns
         2. Converts each file to a GitHubFile object with metadata
         3. Exports each file as an XML document to the specified output directory
+
+        The files are read one by one in path order (see
+        :func:`iter_matching_github_files_from_cloned_folder`), so the memory
+        usage does not grow with the size of the repository.
+
+        If ``incremental`` is True, see :meth:`fetch_incremental`. Otherwise,
+        every matched file is exported and reported as added in the summary.
+
+        If ``max_workers`` is set, reading and exporting run in a bounded thread
+        pool. The ``post_process_github_file`` and ``post_process_path_out``
+        hooks are still called from the calling thread, each of them in path
+        order, and the output is the same as in serial mode.
+
+        If ``path_bundle`` is set, every document is also written to the bundle,
+        in path order. ``post_process_path_out`` is only called when
+        ``export_documents`` is True.
+
+        If ``token_budget`` is set, the matched files are read once to count
+        their tokens (before ``post_process_github_file``), only the selected
+        ones are exported, in path order, from the content read for counting,
+        the others are reported in ``over_budget``. ``n_tokens_by_source`` of
+        the summary is the number of tokens of every selected file and
+        ``n_tokens`` their total. The duplicate and near duplicate
+        detections run after the selection.
+
+        If ``minhash_lsh`` is set, the near duplicate files are not exported and
+        are reported in ``near_duplicated`` of the summary. If ``content_store``
+        is set, the files whose content was already seen are reported in
+        ``duplicated`` and ``n_bytes_saved`` of the summary.
         """
-        github_file_list = find_matching_github_files_from_cloned_folder(
+        if self.incremental:
+            return self.fetch_incremental()
+        if self.max_workers is not None:
+            return self._fetch_in_parallel()
+
+        sync_summary = SyncSummary()
+        path_list, content_mapping = self._pack(
+            self._list_matching_paths(), sync_summary
+        )
+        with (
+            open_content_reader(
+                dir_repo=self.dir_repo, source=self.source
+            ) as read_content,
+            self._open_bundle_writer() as bundle_writer,
+        ):
+            for relpath, blob_sha in path_list:
+                if relpath in content_mapping:
+                    content = content_mapping.pop(relpath)
+                else:
+                    content = read_content(relpath, blob_sha)
+                github_file = self._new_github_file(
+                    relpath=relpath,
+                    content=content,
+                )
+                if self._is_near_duplicate(github_file, sync_summary):
+                    continue
+                github_file = self._deduplicate(github_file)
+                path_out = self._export_github_file(github_file)
+                self._after_export(
+                    github_file=github_file,
+                    path_out=path_out,
+                    bundle_writer=bundle_writer,
+                    sync_summary=sync_summary,
+                )
+        return sync_summary
+
+    def _fetch_in_parallel(self) -> SyncSummary:
+        sync_summary = SyncSummary()
+        path_list, content_mapping = self._pack(
+            self._list_matching_paths(), sync_summary
+        )
+        with contextlib.ExitStack() as stack:
+            read_content = stack.enter_context(
+                open_content_reader(dir_repo=self.dir_repo, source=self.source)
+            )
+            bundle_writer = stack.enter_context(self._open_bundle_writer())
+            executor = stack.enter_context(
+                ThreadPoolExecutor(max_workers=self.max_workers)
+            )
+            window = 2 * self.max_workers
+
+            def read(item: tuple[str, str | None]) -> tuple[str, str]:
+                relpath, blob_sha = item
+                if relpath in content_mapping:
+                    return relpath, content_mapping.pop(relpath)
+                return relpath, read_content(relpath, blob_sha)
+
+            def export_github_file(
+                github_file: T.Union[GitHubFile, GitHubFileRecord, DuplicateDocument],
+            ) -> tuple[
+                T.Union[GitHubFile, GitHubFileRecord, DuplicateDocument],
+                Path | None,
+            ]:
+                return github_file, self._export_github_file(github_file)
+
+            def iter_github_file() -> (
+                T.Iterator[T.Union[GitHubFile, GitHubFileRecord, DuplicateDocument]]
+            ):
+                # the hooks and the dedup run in this thread while the queues
+                # are filled / drained
+                for relpath, content in imap_ordered(read, path_list, executor, window):
+                    github_file = self._new_github_file(
+                        relpath=relpath, content=content
+                    )
+                    if self._is_near_duplicate(github_file, sync_summary):
+                        continue
+                    yield self._deduplicate(github_file)
+
+            for github_file, path_out in imap_ordered(
+                export_github_file, iter_github_file(), executor, window
+            ):
+                self._after_export(
+                    github_file=github_file,
+                    path_out=path_out,
+                    bundle_writer=bundle_writer,
+                    sync_summary=sync_summary,
+                )
+        return sync_summary
+
+    def fetch_incremental(self) -> SyncSummary:
+        """
+        Export only the files that changed since the last run.
+
+        A :class:`~docpack.manifest.Manifest` in ``dir_out`` records the size,
+        mtime and content hash of every source file (the blob sha in
+        ``"git_object"`` mode) and the output file written for it:
+
+        - a file whose size and mtime (or blob sha) did not change is not read
+        - a file that was touched but whose content hash did not change is not exported
+        - the outputs of files that no longer match are deleted
+
+        The ``post_process_github_file`` and ``post_process_path_out`` hooks are
+        only called for exported files. If an output file was modified or removed
+        by someone else, it is exported again. Changing ``domain``, ``account``,
+        ``repo``, ``branch``, ``wanted_fields``, ``compression`` or
+        ``compression_level`` exports everything again.
+        """
+        self._ensure_document_output_only("fetch_incremental")
+        fingerprint = get_fingerprint(
             domain=self.domain,
             account=self.account,
             repo=self.repo,
             branch=self.branch,
+            wanted_fields=self.wanted_fields,
+            compression=self.compression,
+            compression_level=self.compression_level,
+        )
+        manifest = Manifest.read(dir_out=self.dir_out, fingerprint=fingerprint)
+        old_entries = manifest.entries
+        manifest.entries = dict()
+
+        path_list = self._list_matching_paths()
+        sync_summary = SyncSummary()
+        with open_content_reader(
+            dir_repo=self.dir_repo, source=self.source
+        ) as read_content:
+            for relpath, blob_sha in path_list:
+                entry = old_entries.pop(relpath, None)
+                if entry is not None and entry.is_output_intact(self.dir_out) is False:
+                    entry.content_hash = ""
+
+                size, mtime_ns = None, None
+                if blob_sha is None:
+                    stat = os.stat(self.dir_repo.joinpath(relpath))
+                    size, mtime_ns = stat.st_size, stat.st_mtime_ns
+                    is_unchanged = (
+                        entry is not None
+                        and entry.content_hash != ""
+                        and (entry.size, entry.mtime_ns) == (size, mtime_ns)
+                    )
+                else:
+                    is_unchanged = entry is not None and entry.content_hash == blob_sha
+                if is_unchanged:
+                    manifest.entries[relpath] = entry
+                    sync_summary.unchanged.append(relpath)
+                    continue
+
+                content = read_content(relpath, blob_sha)
+                content_hash = sha256_of_text(content) if blob_sha is None else blob_sha
+                if entry is not None and entry.content_hash == content_hash:
+                    entry.size, entry.mtime_ns = size, mtime_ns
+                    manifest.entries[relpath] = entry
+                    sync_summary.unchanged.append(relpath)
+                    continue
+
+                github_file = self._new_github_file(relpath=relpath, content=content)
+                path_out = github_file.export_to_file(
+                    dir_out=self.dir_out,
+                    wanted_fields=self.wanted_fields,
+                    compression=self.compression,
+                    compression_level=self.compression_level,
+                )
+                self.post_process_path_out(github_file=github_file, path_out=path_out)
+                if entry is not None and entry.output != path_out.name:
+                    self.dir_out.joinpath(entry.output).unlink(missing_ok=True)
+                manifest.new_entry(
+                    key=relpath,
+                    content_hash=content_hash,
+                    path_out=path_out,
+                    size=size,
+                    mtime_ns=mtime_ns,
+                )
+                if entry is None:
+                    sync_summary.added.append(relpath)
+                else:
+                    sync_summary.modified.append(relpath)
+
+        for relpath, entry in old_entries.items():
+            self.dir_out.joinpath(entry.output).unlink(missing_ok=True)
+            sync_summary.deleted.append(relpath)
+        manifest.write(self.dir_out)
+        return sync_summary
+
+    def fetch_delta(
+        self,
+        old_ref: str,
+        new_ref: str,
+    ) -> SyncSummary:
+        """
+        Update ``dir_out`` from ``old_ref`` to ``new_ref`` by exporting only
+        the files that changed between the two commits.
+
+        ``dir_out`` is expected to hold the output of ``old_ref`` (e.g. from the
+        previous CI run). The changed files are listed with
+        :func:`~docpack.git_utils.diff_blobs`, the include/exclude patterns are
+        applied to those paths only, and the new content is read from the git
+        object database, so the working tree does not matter and a one file
+        push costs about as much as exporting one file:
+
+        - added and modified files are exported, the hooks are called for them
+        - the outputs of deleted files are removed
+        - a renamed file is handled as deleted plus added
+
+        ``source`` and ``ref`` are ignored. The manifest used by
+        :meth:`fetch_incremental` is not updated, if any.
+
+        :param old_ref: Branch name, tag name or commit sha of the previous export
+        :param new_ref: Branch name, tag name or commit sha to export
+        """
+        self._ensure_document_output_only("fetch_delta")
+        changed_list, deleted_list = diff_blobs(
             dir_repo=self.dir_repo,
+            old_ref=old_ref,
+            new_ref=new_ref,
+        )
+        status_mapping = {relpath: status for status, relpath, _ in changed_list}
+        blob_mapping = {relpath: blob_sha for _, relpath, blob_sha in changed_list}
+        changed_relpath_list = filter_matching_paths(
+            relpath_list=list(blob_mapping),
             include=self.include,
             exclude=self.exclude,
         )
-        for github_file in github_file_list:
-            github_file = self.post_process_github_file(github_file)
-            path_out = github_file.export_to_file(
-                dir_out=self.dir_out,
-                wanted_fields=self.wanted_fields,
+        deleted_relpath_list = filter_matching_paths(
+            relpath_list=deleted_list,
+            include=self.include,
+            exclude=self.exclude,
+        )
+
+        sync_summary = SyncSummary()
+        for relpath in deleted_relpath_list:
+            github_file = GitHubFileRecord(
+                domain=self.domain,
+                account=self.account,
+                repo=self.repo,
+                branch=self.branch,
+                path_parts=tuple(relpath.split("/")),
+                content="",
             )
-            self.post_process_path_out(github_file=github_file, path_out=path_out)
+            github_file.get_path_out(
+                dir_out=self.dir_out,
+                compression=self.compression,
+            ).unlink(missing_ok=True)
+            sync_summary.deleted.append(relpath)
+
+        with open_content_reader(
+            dir_repo=self.dir_repo,
+            source=GitHubFileSourceEnum.git_object.value,
+        ) as read_content:
+            for relpath in changed_relpath_list:
+                github_file = self._new_github_file(
+                    relpath=relpath,
+                    content=read_content(relpath, blob_mapping[relpath]),
+                )
+                path_out = github_file.export_to_file(
+                    dir_out=self.dir_out,
+                    wanted_fields=self.wanted_fields,
+                    compression=self.compression,
+                    compression_level=self.compression_level,
+                )
+                self.post_process_path_out(github_file=github_file, path_out=path_out)
+                if status_mapping[relpath] == "A":
+                    sync_summary.added.append(relpath)
+                else:
+                    sync_summary.modified.append(relpath)
+        return sync_summary
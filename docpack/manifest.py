@@ -0,0 +1,184 @@
+# -*- coding: utf-8 -*-
+
+"""
+Content manifest for incremental export.
+
+A pipeline running in incremental mode keeps a manifest file in its ``dir_out``.
+It records, for every source document, what was seen last time (size, mtime,
+content hash) and which output file was written for it, so the next run can
+skip unchanged documents and only touch the added, modified or deleted ones.
+"""
+
+import typing as T
+import json
+import hashlib
+from pathlib import Path
+
+from pydantic import BaseModel, Field
+
+from ._version import __version__
+
+MANIFEST_FILENAME = ".docpack_manifest.json"
+MANIFEST_VERSION = 1
+
+
+def sha256_of_text(text: str) -> str:
+    """
+    Return the sha256 hex digest of the UTF-8 encoded text.
+    """
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def get_fingerprint(**kwargs: T.Any) -> str:
+    """
+    Compute a fingerprint of the settings that change the output of every document
+    (e.g. ``wanted_fields``). The docpack version is always part of it, because
+    the output format may change between versions.
+    """
+    kwargs["docpack_version"] = __version__
+    return sha256_of_text(json.dumps(kwargs, sort_keys=True, default=str))
+
+
+class ManifestEntry(BaseModel):
+    """
+    What the manifest knows about one source document.
+
+    :param size: Size of the source file in bytes, ``None`` if unknown.
+    :param mtime_ns: Modification time of the source file, ``None`` if unknown.
+    :param content_hash: sha256 of the source content, or any other
+        content identifier such as the git blob sha.
+    :param output: File name of the exported document, relative to ``dir_out``.
+    :param output_size: Size of the exported document in bytes.
+    :param output_mtime_ns: Modification time of the exported document.
+    """
+
+    size: T.Optional[int] = Field(default=None)
+    mtime_ns: T.Optional[int] = Field(default=None)
+    content_hash: str = Field()
+    output: str = Field()
+    output_size: int = Field()
+    output_mtime_ns: int = Field()
+
+    def is_output_intact(self, dir_out: Path) -> bool:
+        """
+        Check whether the exported document is still the one we wrote.
+        """
+        try:
+            stat = dir_out.joinpath(self.output).stat()
+        except FileNotFoundError:
+            return False
+        return (
+            stat.st_size == self.output_size
+            and stat.st_mtime_ns == self.output_mtime_ns
+        )
+
+
+class Manifest(BaseModel):
+    """
+    The content of the manifest file, ``entries`` is keyed by the source
+    document identifier (e.g. the relative path of a GitHub file).
+    """
+
+    version: int = Field(default=MANIFEST_VERSION)
+    fingerprint: str = Field(default="")
+    entries: dict[str, ManifestEntry] = Field(default_factory=dict)
+
+    @classmethod
+    def read(cls, dir_out: Path, fingerprint: str) -> "Manifest":
+        """
+        Read the manifest from ``dir_out``. An empty manifest is returned if
+        the file does not exist, is invalid, or was written with a different
+        version or fingerprint, so everything will be exported again.
+        """
+        path = dir_out.joinpath(MANIFEST_FILENAME)
+        try:
+            manifest = cls.model_validate_json(path.read_text(encoding="utf-8"))
+        except (FileNotFoundError, ValueError):
+            return cls(fingerprint=fingerprint)
+        if manifest.version != MANIFEST_VERSION or manifest.fingerprint != fingerprint:
+            # keep the entries so the old outputs can still be cleaned up,
+            # but make sure none of them is considered unchanged
+            return cls(
+                fingerprint=fingerprint,
+                entries={
+                    key: entry.model_copy(update={"content_hash": ""})
+                    for key, entry in manifest.entries.items()
+                },
+            )
+        return manifest
+
+    def write(self, dir_out: Path):
+        """
+        Write the manifest to ``dir_out``.
+        """
+        path = dir_out.joinpath(MANIFEST_FILENAME)
+        content = self.model_dump_json(indent=1)
+        try:
+            path.write_text(content, encoding="utf-8")
+        except FileNotFoundError:
+            path.parent.mkdir(parents=True)
+            path.write_text(content, encoding="utf-8")
+
+    def new_entry(
+        self,
+        key: str,
+        content_hash: str,
+        path_out: Path,
+        size: T.Optional[int] = None,
+        mtime_ns: T.Optional[int] = None,
+    ) -> ManifestEntry:
+        """
+        Record a newly exported document.
+        """
+        stat = path_out.stat()
+        entry = ManifestEntry(
+            size=size,
+            mtime_ns=mtime_ns,
+            content_hash=content_hash,
+            output=path_out.name,
+            output_size=stat.st_size,
+            output_mtime_ns=stat.st_mtime_ns,
+        )
+        self.entries[key] = entry
+        return entry
+
+
+class SyncSummary(BaseModel):
+    """
+    Summary of what a pipeline run changed in ``dir_out``, each list contains
+    the source document identifiers (e.g. the relative path of a GitHub file).
+
+    :param added: Documents exported for the first time.
+    :param modified: Documents exported again because the source changed.
+    :param deleted: Documents whose output was removed because the source is gone.
+    :param unchanged: Documents skipped because nothing changed.
+    :param duplicated: Documents exported with a reference instead of their
+        body, because another document has the same body, see
+        :class:`~docpack.dedup.ContentStore`.
+    :param n_bytes_saved: Total size in bytes of the bodies of the duplicated
+        documents, which were not written again.
+    :param near_duplicated: Documents not exported because they are near
+        duplicates of an exported document, see
+        :class:`~docpack.near_dedup.MinHashLSH`.
+    :param over_budget: Documents not exported because they do not fit under
+        the token budget, see :func:`~docpack.tokens.pack_by_budget`.
+    :param n_tokens: Total number of tokens of the documents selected under
+        the token budget, 0 if there is no budget.
+    :param n_tokens_by_source: Number of tokens of every document selected
+        under the token budget, by path or page id, empty if there is no budget.
+    """
+
+    added: list[str] = Field(default_factory=list)
+    modified: list[str] = Field(default_factory=list)
+    deleted: list[str] = Field(default_factory=list)
+    unchanged: list[str] = Field(default_factory=list)
+    duplicated: list[str] = Field(default_factory=list)
+    n_bytes_saved: int = Field(default=0)
+    near_duplicated: list[str] = Field(default_factory=list)
+    over_budget: list[str] = Field(default_factory=list)
+    n_tokens: int = Field(default=0)
+    n_tokens_by_source: dict[str, int] = Field(default_factory=dict)
+
+    @property
+    def n_changed(self) -> int:
+        return len(self.added) + len(self.modified) + len(self.deleted)
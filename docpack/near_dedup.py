@@ -0,0 +1,240 @@
+# -*- coding: utf-8 -*-
+
+"""
+Near duplicate detection with MinHash and LSH.
+
+Pages copied from a template and lightly edited are not byte identical, so
+:class:`~docpack.dedup.ContentStore` does not catch them. :class:`MinHashLSH`
+estimates the Jaccard similarity of the word shingles of two documents:
+
+1. the text is split into lower case words, each distinct word is hashed
+   once per :class:`MinHashLSH` (crc32, cached), and the hashes of
+   ``shingle_size`` consecutive words are combined into one 64 bit shingle
+   hash, with NumPy, for all shingles at once
+2. the MinHash signature is the minimum of ``num_perm`` hash functions
+   ``(a * x + b) >> 32`` (multiply shift) over the shingle hashes, computed
+   as one ``num_perm x n_shingle`` NumPy operation per chunk of shingles
+3. the signature is cut into bands, a document is only compared with the
+   documents that share at least one band bucket (Locality Sensitive Hashing),
+   so there is no pairwise comparison
+
+The documents are processed one by one, in pipeline order: a document whose
+estimated similarity with a kept document is at least ``threshold`` is
+reported as a near duplicate of it, otherwise it is kept and indexed. So the
+first document of each cluster is its representative, and the memory usage is
+one signature (``4 * num_perm`` bytes) per kept document.
+
+Requires NumPy: ``pip install "docpack[near_dedup]"``.
+"""
+
+import typing as T
+import re
+import zlib
+
+from pydantic import BaseModel, Field, PrivateAttr
+
+if T.TYPE_CHECKING:  # pragma: no cover
+    import numpy as np
+
+_word_pattern = re.compile(r"\w+")
+
+# the odd multiplier used to combine the word hashes of a shingle
+_SHINGLE_MULTIPLIER = 0x100000001B3
+# number of shingles hashed at once, bounds the memory usage to
+# num_perm * _CHUNK_SIZE * 8 bytes
+_CHUNK_SIZE = 4096
+
+
+def _import_numpy():
+    try:
+        import numpy
+    except ImportError as e:  # pragma: no cover
+        raise ImportError(
+            'near duplicate detection requires numpy, run: pip install "docpack[near_dedup]"'
+        ) from e
+    return numpy
+
+
+def get_optimal_bands(
+    threshold: float,
+    num_perm: int,
+    false_positive_weight: float = 0.2,
+    n_step: int = 100,
+) -> tuple[int, int]:
+    """
+    Choose the number of bands and the number of rows per band, so that the
+    probability for two documents to share a bucket, ``1 - (1 - s^r)^b``,
+    is close to a step function at ``threshold``: it minimizes the sum of the
+    false positive area (below ``threshold``) and the false negative area
+    (above ``threshold``), weighted by ``false_positive_weight``. A false
+    positive only costs one signature comparison, because every candidate is
+    checked, so false negatives weigh more by default.
+
+    :returns: A tuple of ``(number of bands, number of rows per band)``
+    """
+
+    def probability(s: float, b: int, r: int) -> float:
+        return 1 - (1 - s**r) ** b
+
+    best, min_error = (num_perm, 1), float("inf")
+    for b in range(1, num_perm + 1):
+        r = num_perm // b
+        step = 1 / n_step
+        fp = sum(
+            probability((i + 0.5) * step * threshold, b, r) * step * threshold
+            for i in range(n_step)
+        )
+        fn = sum(
+            (1 - probability(threshold + (i + 0.5) * step * (1 - threshold), b, r))
+            * step
+            * (1 - threshold)
+            for i in range(n_step)
+        )
+        error = false_positive_weight * fp + (1 - false_positive_weight) * fn
+        if error < min_error:
+            best, min_error = (b, r), error
+    return best
+
+
+class MinHashLSH(BaseModel):
+    """
+    Find near duplicate documents in a stream, see the module docstring.
+    Pass the same instance to several pipelines to detect near duplicates
+    across all of them.
+
+    Example:
+
+    .. code-block:: python
+
+        lsh = MinHashLSH(threshold=0.8)
+        for key, text in documents:
+            original = lsh.add(key, text)
+            if original is None:
+                ...  # export the document
+            else:
+                ...  # skip, it is a near duplicate of ``original``
+
+    :param threshold: The minimal estimated Jaccard similarity of the word
+        shingles of two near duplicates.
+    :param num_perm: Number of hash functions, more is more accurate and slower.
+    :param shingle_size: Number of consecutive words of a shingle.
+    :param seed: Seed of the hash functions, documents are only comparable
+        with the same ``num_perm`` and ``seed``.
+    """
+
+    threshold: float = Field(default=0.8)
+    num_perm: int = Field(default=128)
+    shingle_size: int = Field(default=5)
+    seed: int = Field(default=1)
+
+    _a: "np.ndarray" = PrivateAttr()
+    _b: "np.ndarray" = PrivateAttr()
+    _n_band: int = PrivateAttr()
+    _n_row: int = PrivateAttr()
+    _buckets: list[dict[bytes, list[int]]] = PrivateAttr()
+    _keys: list[str] = PrivateAttr()
+    _signatures: list["np.ndarray"] = PrivateAttr()
+    _word_hashes: dict[str, int] = PrivateAttr()
+
+    def model_post_init(self, __context: T.Any) -> None:
+        np = _import_numpy()
+        rng = np.random.default_rng(self.seed)
+        max_uint64 = np.iinfo(np.uint64).max
+        # multiply shift hashing needs odd multipliers
+        self._a = rng.integers(1, max_uint64, size=self.num_perm, dtype=np.uint64) | 1
+        self._b = rng.integers(0, max_uint64, size=self.num_perm, dtype=np.uint64)
+        self._n_band, self._n_row = get_optimal_bands(self.threshold, self.num_perm)
+        self._buckets = [dict() for _ in range(self._n_band)]
+        self._keys = list()
+        self._signatures = list()
+        self._word_hashes = dict()
+
+    def __len__(self) -> int:
+        """
+        Number of kept (indexed) documents.
+        """
+        return len(self._keys)
+
+    def get_shingle_hashes(self, text: str) -> "np.ndarray":
+        """
+        Get the unique 64 bit hashes of the word shingles of the text,
+        empty if the text has no word.
+        """
+        np = _import_numpy()
+        words = _word_pattern.findall(text.lower())
+        cache = self._word_hashes
+        for word in set(words).difference(cache):
+            cache[word] = zlib.crc32(word.encode("utf-8"))
+        word_hashes = np.fromiter(
+            map(cache.__getitem__, words), dtype=np.uint64, count=len(words)
+        )
+        k = min(self.shingle_size, len(words))
+        if k == 0:
+            return word_hashes
+        n = len(words) - k + 1
+        shingle_hashes = np.zeros(n, dtype=np.uint64)
+        multiplier = np.uint64(_SHINGLE_MULTIPLIER)
+        for j in range(k):
+            # uint64 arithmetic wraps around, which is what a hash wants
+            shingle_hashes = shingle_hashes * multiplier + word_hashes[j : j + n]
+        return np.unique(shingle_hashes)
+
+    def get_signature(self, text: str) -> T.Optional["np.ndarray"]:
+        """
+        Get the MinHash signature (``num_perm`` uint32) of the text,
+        ``None`` if the text has no word.
+        """
+        np = _import_numpy()
+        shingle_hashes = self.get_shingle_hashes(text)
+        if len(shingle_hashes) == 0:
+            return None
+        a = self._a[:, None]
+        b = self._b[:, None]
+        shift = np.uint64(32)
+        signature = np.full(self.num_perm, np.iinfo(np.uint64).max, dtype=np.uint64)
+        for start in range(0, len(shingle_hashes), _CHUNK_SIZE):
+            chunk = shingle_hashes[None, start : start + _CHUNK_SIZE]
+            # in place, only one num_perm x chunk size array is allocated
+            hashes = np.multiply(chunk, a)
+            hashes += b
+            hashes >>= shift
+            np.minimum(signature, hashes.min(axis=1), out=signature)
+        return signature.astype(np.uint32)
+
+    def _iter_band_keys(self, signature: "np.ndarray") -> T.Iterator[bytes]:
+        r = self._n_row
+        for i in range(self._n_band):
+            yield signature[i * r : (i + 1) * r].tobytes()
+
+    def add(self, key: str, text: str) -> T.Optional[str]:
+        """
+        Check the document against the kept documents.
+
+        :returns: The key of the most similar kept document if the document
+            is a near duplicate of it, otherwise ``None``, and the document
+            is kept and indexed. A document without any word is always kept
+            and never indexed.
+        """
+        signature = self.get_signature(text)
+        if signature is None:
+            return None
+        band_keys = list(self._iter_band_keys(signature))
+        candidates = set()
+        for buckets, band_key in zip(self._buckets, band_keys):
+            candidates.update(buckets.get(band_key, ()))
+        best, best_similarity = None, 0.0
+        for nth in sorted(candidates):
+            similarity = float((self._signatures[nth] == signature).mean())
+            if similarity >= self.threshold and similarity > best_similarity:
+                best, best_similarity = nth, similarity
+                if similarity == 1.0:
+                    break
+        if best is not None:
+            return self._keys[best]
+
+        nth = len(self._keys)
+        self._keys.append(key)
+        self._signatures.append(signature)
+        for buckets, band_key in zip(self._buckets, band_keys):
+            buckets.setdefault(band_key, []).append(nth)
+        return None
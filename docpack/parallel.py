@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+
+"""
+Helpers to run I/O bound steps of a pipeline in a thread pool while keeping
+the results in input order.
+"""
+
+import typing as T
+import collections
+from concurrent.futures import Executor
+
+IT = T.TypeVar("IT")
+OT = T.TypeVar("OT")
+
+
+def imap_ordered(
+    func: T.Callable[[IT], OT],
+    iterable: T.Iterable[IT],
+    executor: Executor,
+    window: int,
+) -> T.Iterator[OT]:
+    """
+    Like :meth:`concurrent.futures.Executor.map`, but the input is consumed
+    lazily, at most ``window`` tasks are submitted and not yet yielded at any
+    time, so the memory usage does not grow with the size of the input.
+
+    The results are yielded in input order. The input iterable is consumed in
+    the calling thread, so anything it does (e.g. calling hooks) happens in
+    input order too.
+
+    :param func: The function to call for each item, in a worker thread
+    :param iterable: The input items
+    :param executor: The executor to submit the tasks to, several stages can
+        share one executor
+    :param window: Maximum number of pending tasks, usually a small multiple
+        of the number of workers
+
+    :raises: The exception of the first failed task, in input order
+    """
+    queue = collections.deque()
+    for item in iterable:
+        queue.append(executor.submit(func, item))
+        if len(queue) >= window:
+            yield queue.popleft().result()
+    while queue:
+        yield queue.popleft().result()
@@ -0,0 +1,140 @@
+# -*- coding: utf-8 -*-
+
+"""
+Dry run planning of a pipeline run.
+
+``GitHubPipeline.plan`` and ``ConfluencePipeline.plan`` list the matched
+documents and estimate what a ``fetch`` would cost, from the file sizes /
+the cached page hierarchy only: no file content is read and no Atlas Doc
+Format body is converted to markdown. This is fast enough to tune the
+include / exclude patterns and the token budget before a full run.
+"""
+
+import typing as T
+
+from pydantic import BaseModel, Field
+
+from .bundle import DOCUMENT_SEPARATOR
+
+
+class PlanItem(BaseModel):
+    """
+    A document that a ``fetch`` would export.
+
+    :param key: The source document identifier (e.g. the relative path of a
+        GitHub file, or a Confluence page id).
+    :param url: The url of the document.
+    :param size: Size in bytes of the source body, ``None`` if unknown.
+    :param n_bytes: Estimated size in bytes of the (uncompressed) XML document,
+        ``None`` if unknown (e.g. the body of a Confluence page is not cached).
+    :param n_tokens: Estimated number of tokens of the XML document, with the
+        built-in heuristic, ``None`` if unknown.
+    """
+
+    key: str = Field()
+    url: str = Field()
+    size: T.Optional[int] = Field(default=None)
+    n_bytes: T.Optional[int] = Field(default=None)
+    n_tokens: T.Optional[int] = Field(default=None)
+
+
+class Plan(BaseModel):
+    """
+    The result of a dry run, see the module docstring.
+
+    The duplicate and near duplicate detections need the document bodies,
+    so they are not part of the plan, and the hooks are not called.
+
+    :param items: The documents that would be exported, in export order.
+    :param over_budget: The documents that would not be exported because they
+        do not fit under the token budget, estimated with the built-in heuristic.
+    :param n_api_call: Number of API requests a ``fetch`` needs.
+    :param n_body_download: Number of document bodies to read or download.
+    :param n_file_to_write: Number of files to write: the per document files,
+        the bundle shards and the bundle index.
+    """
+
+    items: list[PlanItem] = Field(default_factory=list)
+    over_budget: list[str] = Field(default_factory=list)
+    n_api_call: int = Field(default=0)
+    n_body_download: int = Field(default=0)
+    n_file_to_write: int = Field(default=0)
+
+    @property
+    def n_document(self) -> int:
+        return len(self.items)
+
+    @property
+    def n_unknown(self) -> int:
+        """
+        Number of documents whose size is unknown, they are not part of
+        :attr:`n_bytes` and :attr:`n_tokens`.
+        """
+        return sum(1 for item in self.items if item.n_tokens is None)
+
+    @property
+    def n_bytes(self) -> int:
+        """
+        Estimated total size in bytes of the XML documents of known size.
+        """
+        return sum(item.n_bytes for item in self.items if item.n_bytes is not None)
+
+    @property
+    def n_tokens(self) -> int:
+        """
+        Estimated total number of tokens of the XML documents of known size.
+        """
+        return sum(item.n_tokens for item in self.items if item.n_tokens is not None)
+
+    def to_text(self) -> str:
+        """
+        A one line human readable summary.
+        """
+        return (
+            f"{self.n_document} documents, "
+            f"~{self.n_bytes} bytes, "
+            f"~{self.n_tokens} tokens, "
+            f"{self.n_unknown} of unknown size, "
+            f"{len(self.over_budget)} over budget, "
+            f"{self.n_api_call} API calls, "
+            f"{self.n_body_download} bodies to read, "
+            f"{self.n_file_to_write} files to write"
+        )
+
+
+def count_bundle_shards(
+    items: list[PlanItem],
+    max_bytes: int | None = None,
+    max_tokens: int | None = None,
+) -> int:
+    """
+    Count the files a :class:`~docpack.bundle.BundleWriter` would write for
+    the documents, with the same rule: a new shard is started when the next
+    document does not fit. With compression, the byte limit applies to the
+    compressed size, so this is an upper bound. The documents of unknown
+    size are counted as empty, so it is a lower bound if there are any.
+
+    :returns: Number of bundle files, the index not included
+    """
+    if max_bytes is None and max_tokens is None:
+        return 1
+    n_shard = 0
+    offset, n_tokens, n_document = 0, 0, 0
+    for item in items:
+        is_full = n_shard == 0
+        if n_document:
+            if max_bytes is not None:
+                if offset + len(DOCUMENT_SEPARATOR) + (item.n_bytes or 0) > max_bytes:
+                    is_full = True
+            if max_tokens is not None:
+                if n_tokens + (item.n_tokens or 0) > max_tokens:
+                    is_full = True
+        if is_full:
+            n_shard += 1
+            offset, n_tokens, n_document = 0, 0, 0
+        if n_document:
+            offset += len(DOCUMENT_SEPARATOR)
+        offset += item.n_bytes or 0
+        n_tokens += item.n_tokens or 0
+        n_document += 1
+    return n_shard
@@ -0,0 +1,190 @@
+# -*- coding: utf-8 -*-
+
+"""
+A local stand-in of the Confluence Cloud REST API v2, to test the Confluence
+pipeline without a real site. Only what docpack uses is implemented:
+
+- ``GET /wiki/api/v2/spaces`` with ``keys``
+- ``GET /wiki/api/v2/pages`` with ``space-id``, ``id``, ``body-format``,
+  ``limit`` and ``cursor``, the body is only returned with ``body-format``
+
+Example:
+
+.. code-block:: python
+
+    with ConfluenceServer(pages=[new_page_data("1", "Home")]) as server:
+        confluence = server.new_confluence()
+        ...
+        assert len(server.requests) == 2
+"""
+
+import typing as T
+import json
+import threading
+import urllib.parse
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import pyatlassian.api as pyatlassian
+
+SPACE_ID = 1
+SPACE_KEY = "UT"
+DEFAULT_LIMIT = 25
+
+
+def new_page_data(
+    id: str,
+    title: str,
+    parent_id: T.Optional[str] = None,
+    position: int = 0,
+    text: str = "",
+    version: int = 1,
+    space_id: int = SPACE_ID,
+) -> dict[str, T.Any]:
+    """
+    Create the data of a page, as returned by the get pages API with
+    ``body-format=atlas_doc_format``, the body is one paragraph of ``text``.
+    """
+    atlas_doc = {
+        "type": "doc",
+        "version": 1,
+        "content": [{"type": "paragraph", "content": [{"type": "text", "text": text}]}],
+    }
+    return {
+        "id": id,
+        "status": "current",
+        "title": title,
+        "spaceId": str(space_id),
+        "parentId": parent_id,
+        "parentType": None if parent_id is None else "page",
+        "position": position,
+        "version": {"number": version},
+        "body": {
+            "atlas_doc_format": {
+                "value": json.dumps(atlas_doc),
+                "representation": "atlas_doc_format",
+            }
+        },
+        "_links": {
+            "webui": f"/spaces/{SPACE_KEY}/pages/{id}/{urllib.parse.quote_plus(title)}"
+        },
+    }
+
+
+class ConfluenceServer:
+    """
+    Serve the given pages on ``127.0.0.1`` in a background thread.
+
+    :param pages: The page data, see :func:`new_page_data`, in API order.
+
+    :attr requests: The ``(path, query)`` of every request, thread safe.
+    """
+
+    def __init__(self, pages: list[dict[str, T.Any]]):
+        self.pages = pages
+        self.requests: list[tuple[str, dict[str, list[str]]]] = list()
+        self.lock = threading.Lock()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def do_GET(self):
+                url = urllib.parse.urlparse(self.path)
+                query = urllib.parse.parse_qs(url.query)
+                with server.lock:
+                    server.requests.append((url.path, query))
+                if url.path == "/wiki/api/v2/pages":
+                    response = server.get_pages(query)
+                elif url.path == "/wiki/api/v2/spaces":
+                    response = server.get_spaces(query)
+                else:
+                    self.send_error(404)
+                    return
+                data = json.dumps(response).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def new_confluence(self) -> pyatlassian.confluence.Confluence:
+        return pyatlassian.confluence.Confluence(
+            url=self.url,
+            username="user",
+            password="password",
+        )
+
+    @staticmethod
+    def _get_list(query: dict[str, list[str]], key: str) -> list[str]:
+        # the next link repeats the query parameters, both
+        # ``id=1,2`` and ``id=1&id=2`` are supported
+        values = list()
+        for value in query.get(key, []):
+            values.extend(value.split(","))
+        return list(dict.fromkeys(values))
+
+    def get_pages(self, query: dict[str, list[str]]) -> dict[str, T.Any]:
+        page_list = self.pages
+        space_id_list = self._get_list(query, "space-id")
+        if space_id_list:
+            page_list = [page for page in page_list if page["spaceId"] in space_id_list]
+        id_list = self._get_list(query, "id")
+        if id_list:
+            id_set = set(id_list)
+            page_list = [page for page in page_list if page["id"] in id_set]
+        limit = int(query.get("limit", [DEFAULT_LIMIT])[-1])
+        cursor = int(query.get("cursor", [0])[-1])
+        results = list()
+        for page in page_list[cursor : cursor + limit]:
+            page = dict(page)
+            if "body-format" not in query:
+                page["body"] = {}
+            results.append(page)
+        response = {"results": results, "_links": {}}
+        if cursor + limit < len(page_list):
+            params = {k: ",".join(self._get_list(query, k)) for k in query}
+            params["cursor"] = str(cursor + limit)
+            response["_links"][
+                "next"
+            ] = f"/wiki/api/v2/pages?{urllib.parse.urlencode(params)}"
+        return response
+
+    def get_spaces(self, query: dict[str, list[str]]) -> dict[str, T.Any]:
+        keys = self._get_list(query, "keys")
+        results = [{"id": str(SPACE_ID), "key": SPACE_KEY}]
+        if keys:
+            results = [space for space in results if space["key"] in keys]
+        return {"results": results, "_links": {}}
+
+    def get_body_requests(self) -> list[dict[str, list[str]]]:
+        """
+        The queries of the get pages requests that downloaded bodies.
+        """
+        return [
+            query
+            for path, query in self.requests
+            if path == "/wiki/api/v2/pages" and "body-format" in query
+        ]
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self) -> "ConfluenceServer":
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
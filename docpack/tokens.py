@@ -0,0 +1,155 @@
+# -*- coding: utf-8 -*-
+
+"""
+Token counting and token budget packing.
+
+:class:`TokenCounter` counts the tokens of a document with the built-in
+heuristic (:func:`estimate_tokens`) or any tokenizer, e.g. tiktoken, and
+caches the result by content hash, in memory and optionally on disk, so a
+document is only tokenized once across runs.
+
+:func:`pack_by_budget` selects the documents that fit under a total token
+budget, the most important ones first, see the ``token_budget`` and
+``include_weights`` parameters of the pipelines.
+"""
+
+import typing as T
+import math
+import hashlib
+from functools import cached_property
+
+from diskcache import Cache
+from pydantic import BaseModel, Field, PrivateAttr
+
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    A rough token count, about 4 characters per token for English text and code.
+    """
+    return estimate_tokens_by_size(len(text))
+
+
+def estimate_tokens_by_size(n_chars: int) -> int:
+    """
+    Same as :func:`estimate_tokens`, when only the size of the text is known.
+    """
+    return math.ceil(n_chars / CHARS_PER_TOKEN)
+
+
+class TokenCounter(BaseModel):
+    """
+    Count tokens, cached by the sha256 of the text.
+
+    Example:
+
+    .. code-block:: python
+
+        token_counter = TokenCounter() # heuristic
+        token_counter = TokenCounter.from_tiktoken("o200k_base", cache_path=".cache")
+        n_tokens = token_counter.count(text)
+
+    :param name: Name of the tokenizer, part of the cache key, so counts of
+        different tokenizers never mix in a shared cache.
+    :param count_tokens: The function that counts the tokens of a text,
+        default to :func:`estimate_tokens`.
+    :param cache_path: If set, the counts are also cached in a
+        :class:`diskcache.Cache` at this path, and reused by the next runs.
+    """
+
+    name: str = Field(default="heuristic")
+    count_tokens: T.Callable[[str], int] = Field(default=estimate_tokens)
+    cache_path: T.Optional[str] = Field(default=None)
+
+    _memory: dict[str, int] = PrivateAttr(default_factory=dict)
+
+    @classmethod
+    def from_tiktoken(
+        cls,
+        encoding_name: str = "cl100k_base",
+        cache_path: T.Optional[str] = None,
+    ) -> "TokenCounter":
+        """
+        Create a counter that uses a tiktoken encoding,
+        requires ``pip install "docpack[tiktoken]"``.
+        """
+        try:
+            import tiktoken
+        except ImportError as e:  # pragma: no cover
+            raise ImportError(
+                'tiktoken token counting requires tiktoken, run: pip install "docpack[tiktoken]"'
+            ) from e
+
+        encoding = tiktoken.get_encoding(encoding_name)
+
+        def count_tokens(text: str) -> int:
+            return len(encoding.encode(text, disallowed_special=()))
+
+        return cls(
+            name=f"tiktoken-{encoding_name}",
+            count_tokens=count_tokens,
+            cache_path=cache_path,
+        )
+
+    @cached_property
+    def cache(self) -> T.Optional[Cache]:
+        if self.cache_path is None:
+            return None
+        return Cache(self.cache_path)
+
+    def count(self, text: str) -> int:
+        """
+        Count the tokens of the text.
+        """
+        key = f"{self.name}:{hashlib.sha256(text.encode('utf-8')).hexdigest()}"
+        n_tokens = self._memory.get(key)
+        if n_tokens is not None:
+            return n_tokens
+        cache = self.cache
+        if cache is not None:
+            n_tokens = cache.get(key)
+        if n_tokens is None:
+            n_tokens = self.count_tokens(text)
+            if cache is not None:
+                cache.set(key, n_tokens)
+        self._memory[key] = n_tokens
+        return n_tokens
+
+    def __call__(self, text: str) -> int:
+        return self.count(text)
+
+
+def pack_by_budget(
+    n_tokens_list: list[int],
+    token_budget: int,
+    weight_list: T.Optional[list[float]] = None,
+    priority_list: T.Optional[list[int]] = None,
+) -> list[int]:
+    """
+    Select documents under a total token budget, greedily: the documents are
+    considered by descending weight, then ascending priority, then in their
+    original order, and a document is selected if it still fits. A document
+    that does not fit is skipped, smaller ones after it may still fit.
+
+    :param n_tokens_list: Number of tokens of each document
+    :param token_budget: Maximum total number of tokens of the selected documents
+    :param weight_list: Weight of each document, higher is more important
+    :param priority_list: Priority of each document, lower is more important,
+        e.g. the position of the first include pattern that matches it
+
+    :returns: The positions of the selected documents, in their original order
+    """
+    n = len(n_tokens_list)
+    weight_list = [0.0] * n if weight_list is None else weight_list
+    priority_list = [0] * n if priority_list is None else priority_list
+    order = sorted(range(n), key=lambda i: (-weight_list[i], priority_list[i], i))
+    selected = list()
+    n_tokens_total = 0
+    for i in order:
+        n_tokens = n_tokens_list[i]
+        if n_tokens_total + n_tokens <= token_budget:
+            selected.append(i)
+            n_tokens_total += n_tokens
+    selected.sort()
+    return selected
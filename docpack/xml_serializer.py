@@ -0,0 +1,181 @@
+# -*- coding: utf-8 -*-
+
+"""
+Template based XML serializer for documents.
+
+The ``to_xml`` methods of :class:`~docpack.github_fetcher.GitHubFile` and
+:class:`~docpack.confluence_fetcher.ConfluencePage` have to decide, for every
+document, which fields are wanted. :class:`XmlSerializer` makes that decision
+once for a given ``wanted_fields``: the fields are compiled into a few
+segments, each one is a format string plus the attribute getters to fill it,
+so serializing a document is a single formatting pass.
+
+The output is the same as joining one line per field with ``\\n``::
+
+    <document>
+      <field>value</field>
+      <block_field>
+    value
+      </block_field>
+    </document>
+"""
+
+import typing as T
+import dataclasses
+from operator import attrgetter
+from pathlib import Path
+
+from .constants import TAB
+from .compression import open_text_writer
+
+
+@dataclasses.dataclass(frozen=True)
+class XmlElement:
+    """
+    The definition of one ``<field>`` in the document.
+
+    :param field: The tag name.
+    :param attr: The attribute of the document that holds the value,
+        ignored if ``constant`` is set.
+    :param constant: A constant value, e.g. the source type.
+    :param block: If True, the value is put on its own lines between the tags,
+        used for multi line values such as the content.
+    :param optional: If True, the element is skipped when the value is empty.
+    """
+
+    field: str
+    attr: T.Optional[str] = None
+    constant: T.Optional[str] = None
+    block: bool = False
+    optional: bool = False
+
+
+@dataclasses.dataclass(frozen=True)
+class XmlSegment:
+    """
+    A compiled part of the document, ``literals`` are the texts around the
+    values returned by ``getters`` (one more literal than getters), and
+    ``template`` is the same thing as a format string.
+    """
+
+    literals: tuple[str, ...]
+    getters: tuple[T.Callable[[T.Any], str], ...]
+    template: str
+    condition: T.Optional[T.Callable[[T.Any], str]] = None
+
+
+def _escape_braces(text: str) -> str:
+    return text.replace("{", "{{").replace("}", "}}")
+
+
+@dataclasses.dataclass(frozen=True)
+class XmlSerializer:
+    """
+    Serialize documents to XML with a precompiled template.
+    Use :meth:`new` to compile one for a list of elements.
+    """
+
+    segments: tuple[XmlSegment, ...]
+
+    @classmethod
+    def new(cls, elements: T.Iterable[XmlElement]) -> "XmlSerializer":
+        """
+        Compile the elements into segments. Consecutive non-optional elements
+        are merged into one segment.
+        """
+        segments = list()
+        literals: list[str] = ["<document>"]
+        getters: list[T.Callable[[T.Any], str]] = list()
+
+        def flush():
+            segments.append(
+                XmlSegment(
+                    literals=tuple(literals),
+                    getters=tuple(getters),
+                    template="{}".join(_escape_braces(text) for text in literals),
+                )
+            )
+            literals.clear()
+            literals.append("")
+            getters.clear()
+
+        for element in elements:
+            if element.block:
+                opening = f"\n{TAB}<{element.field}>\n"
+                closing = f"\n{TAB}</{element.field}>"
+            else:
+                opening = f"\n{TAB}<{element.field}>"
+                closing = f"</{element.field}>"
+            if element.constant is not None:
+                literals[-1] += f"{opening}{element.constant}{closing}"
+                continue
+            getter = attrgetter(element.attr)
+            if element.optional:
+                flush()
+                segments.append(
+                    XmlSegment(
+                        literals=(opening, closing),
+                        getters=(getter,),
+                        template="{}".join(
+                            [_escape_braces(opening), _escape_braces(closing)]
+                        ),
+                        condition=getter,
+                    )
+                )
+                continue
+            literals[-1] += opening
+            getters.append(getter)
+            literals.append(closing)
+        literals[-1] += "\n</document>"
+        flush()
+        return cls(segments=tuple(segment for segment in segments if segment.template))
+
+    def to_xml(self, obj: T.Any) -> str:
+        """
+        Serialize the document to an XML string.
+        """
+        parts = list()
+        for segment in self.segments:
+            if segment.condition is not None and not segment.condition(obj):
+                continue
+            parts.append(segment.template.format(*[g(obj) for g in segment.getters]))
+        return "".join(parts)
+
+    def write_xml(self, obj: T.Any, fileobj: T.TextIO):
+        """
+        Write the XML of the document directly to an open text file, the values
+        are written as is, so a large content is never copied into a second
+        string.
+        """
+        for segment in self.segments:
+            if segment.condition is not None and not segment.condition(obj):
+                continue
+            literals = segment.literals
+            for literal, getter in zip(literals, segment.getters):
+                fileobj.write(literal)
+                fileobj.write(getter(obj))
+            fileobj.write(literals[-1])
+
+    def write_file(
+        self,
+        obj: T.Any,
+        path_out: Path,
+        compression: T.Optional[str] = None,
+        compression_level: T.Optional[int] = None,
+    ):
+        """
+        Write the XML of the document to a file (UTF-8), the parent directory
+        is created if needed.
+
+        :param compression: If set, the XML is compressed on the fly, see
+            :class:`~docpack.constants.CompressionEnum`.
+        :param compression_level: The compression level, see
+            :func:`~docpack.compression.get_level`.
+        """
+        try:
+            f = open_text_writer(path_out, compression, compression_level)
+        except FileNotFoundError:
+            path_out.parent.mkdir(parents=True, exist_ok=True)
+            f = open_text_writer(path_out, compression, compression_level)
+        with f:
+            self.write_xml(obj, f)
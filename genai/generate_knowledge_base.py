@@ -64,12 +64,8 @@ gh_pipeline = GitHubPipeline(
         ".coverage",
     ],
     dir_out=dir_tmp_docs,
+    # stream all documents into one file, no need to write one file per document
+    path_bundle=dir_tmp / "all_in_one_knowledge_base.txt",
+    export_documents=False,
 )
 gh_pipeline.fetch()
-
-filename = "all_in_one_knowledge_base.txt"
-lines = [
-    path.read_text()
-    for path in dir_tmp_docs.glob("*.xml")
-]
-dir_tmp.joinpath(filename).write_text("\n".join(lines), encoding="utf-8")
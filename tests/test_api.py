@@ -7,11 +7,17 @@ def test():
     _ = api
     _ = api.GitHubFileFieldEnum
     _ = api.ConfluencePageFieldEnum
+    _ = api.GitHubFileSourceEnum
+    _ = api.CompressionEnum
     _ = api.find_matching_files
     _ = api.GitHubFile
     _ = api.GitHubPipeline
     _ = api.ConfluencePage
     _ = api.ConfluencePipeline
+    _ = api.BundleReader
+    _ = api.ContentStore
+    _ = api.MinHashLSH
+    _ = api.TokenCounter
 
 
 if __name__ == "__main__":
@@ -0,0 +1,304 @@
+# -*- coding: utf-8 -*-
+
+import json
+import shutil
+
+import pytest
+import pyatlassian.api as pyatlassian
+
+from docpack.paths import dir_project_root, dir_tmp, PACKAGE_NAME
+from docpack.bundle import (
+    get_path_index,
+    get_path_shard,
+    estimate_tokens,
+    BundleIndex,
+    BundleWriter,
+    BundleReader,
+)
+from docpack.github_fetcher import (
+    GitHubFileRecord,
+    get_github_file_xml_serializer,
+    GitHubPipeline,
+)
+from docpack.confluence_fetcher import ConfluencePage, ConfluencePipeline
+
+dir_root = dir_tmp.joinpath("bundle")
+
+
+def test_bundle_writer():
+    path_bundle = dir_root.joinpath("writer", "knowledge_base.txt")
+    shutil.rmtree(dir_root, ignore_errors=True)
+    serializer = get_github_file_xml_serializer()
+    github_file_list = [
+        GitHubFileRecord(
+            domain="github.com",
+            account="MacHu-GWU",
+            repo="docpack-project",
+            branch="main",
+            path_parts=("docs", name),
+            content=f"# {name} 中文",
+        )
+        for name in ["a.md", "b.md", "c.md"]
+    ]
+    with BundleWriter(path_bundle=path_bundle, buffer_size=16) as bundle_writer:
+        for github_file in github_file_list:
+            bundle_writer.add_document(
+                obj=github_file,
+                serializer=serializer,
+                key=github_file.path,
+                url=github_file.github_url,
+                uri_hash=github_file.uri_hash,
+            )
+
+    data = path_bundle.read_bytes()
+    assert data.decode("utf-8") == "\n".join(
+        github_file.to_xml() for github_file in github_file_list
+    )
+    assert get_path_index(path_bundle).name == "knowledge_base.txt.index.json"
+    bundle_index = BundleIndex.read(path_bundle)
+    assert bundle_index.bundle == "knowledge_base.txt"
+    for github_file, entry in zip(github_file_list, bundle_index.documents):
+        assert entry.key == github_file.path
+        assert entry.uri_hash == github_file.uri_hash
+        document = data[entry.offset : entry.offset + entry.length]
+        assert document.decode("utf-8") == github_file.to_xml()
+
+    with BundleReader(path_bundle) as bundle_reader:
+        assert len(bundle_reader) == 3
+        for github_file in github_file_list:
+            xml = github_file.to_xml()
+            assert bundle_reader.get(github_file.github_url) == xml
+            assert bundle_reader.get(github_file.path) == xml
+            assert bundle_reader.get(github_file.uri_hash) == xml
+        assert [xml for _, xml in bundle_reader] == [
+            github_file.to_xml() for github_file in github_file_list
+        ]
+        with pytest.raises(KeyError):
+            bundle_reader.get("docs/not-exists.md")
+
+    # a failed run leaves neither a partial bundle nor the previous index
+    with pytest.raises(ValueError):
+        with BundleWriter(path_bundle=path_bundle) as bundle_writer:
+            bundle_writer.add_document(
+                obj=github_file_list[0],
+                serializer=serializer,
+                key=github_file_list[0].path,
+                url=github_file_list[0].github_url,
+            )
+            raise ValueError("failed")
+    assert path_bundle.exists() is False
+    assert get_path_index(path_bundle).exists() is False
+
+
+def test_bundle_writer_sharded():
+    path_bundle = dir_root.joinpath("sharded", "knowledge_base.txt")
+    shutil.rmtree(dir_root, ignore_errors=True)
+    serializer = get_github_file_xml_serializer()
+    github_file_list = [
+        GitHubFileRecord(
+            domain="github.com",
+            account="MacHu-GWU",
+            repo="docpack-project",
+            branch="main",
+            path_parts=("docs", f"{i}.md"),
+            content="x" * (5000 if i == 3 else 100),
+        )
+        for i in range(10)
+    ]
+    xml_list = [github_file.to_xml() for github_file in github_file_list]
+    max_bytes = 1000
+
+    def write(**kwargs) -> BundleIndex:
+        with BundleWriter(path_bundle=path_bundle, **kwargs) as bundle_writer:
+            for github_file in github_file_list:
+                bundle_writer.add_document(
+                    obj=github_file,
+                    serializer=serializer,
+                    key=github_file.path,
+                    url=github_file.github_url,
+                )
+        return BundleIndex.read(path_bundle)
+
+    bundle_index = write(max_bytes=max_bytes)
+    assert path_bundle.exists() is False
+    assert bundle_index.shards[0] == "knowledge_base-001.txt"
+    assert get_path_shard(path_bundle, 12).name == "knowledge_base-012.txt"
+    n_shard = len(bundle_index.shards)
+    assert n_shard > 2
+    # documents are never split, in order, and shards respect the limit
+    text_list = list()
+    for nth, name in enumerate(bundle_index.shards):
+        data = path_bundle.with_name(name).read_bytes()
+        entry_list = [e for e in bundle_index.documents if e.shard == nth]
+        if len(entry_list) > 1:
+            assert len(data) <= max_bytes
+        for entry in entry_list:
+            text_list.append(
+                data[entry.offset : entry.offset + entry.length].decode("utf-8")
+            )
+        assert data.decode("utf-8") == "\n".join(text_list[-len(entry_list) :])
+    assert text_list == xml_list
+    with BundleReader(path_bundle) as bundle_reader:
+        for github_file, xml in zip(github_file_list, xml_list):
+            assert bundle_reader.get(github_file.path) == xml
+    # the big document has a shard on its own
+    entry = bundle_index.documents[3]
+    assert [e.shard for e in bundle_index.documents].count(entry.shard) == 1
+
+    # token limit
+    max_tokens = 600
+    bundle_index = write(max_tokens=max_tokens)
+    n_tokens_by_shard = dict()
+    for entry, xml in zip(bundle_index.documents, xml_list):
+        n_tokens_by_shard.setdefault(entry.shard, []).append(estimate_tokens(xml))
+    for n_tokens_list in n_tokens_by_shard.values():
+        if len(n_tokens_list) > 1:
+            assert sum(n_tokens_list) <= max_tokens
+
+    # shards of the previous run are cleaned up
+    write(max_bytes=max_bytes)
+    bundle_index = write(max_bytes=max_bytes * 100)
+    assert bundle_index.shards == ["knowledge_base-001.txt"]
+    assert sorted(path.name for path in path_bundle.parent.iterdir()) == [
+        "knowledge_base-001.txt",
+        "knowledge_base.txt.index.json",
+    ]
+
+    # a failed sharded run removes every shard and the index
+    write(max_bytes=max_bytes)
+    with pytest.raises(ValueError):
+        with BundleWriter(path_bundle=path_bundle, max_bytes=max_bytes) as writer:
+            writer.add_document(
+                obj=github_file_list[0],
+                serializer=serializer,
+                key=github_file_list[0].path,
+                url=github_file_list[0].github_url,
+            )
+            raise ValueError("failed")
+    assert list(path_bundle.parent.iterdir()) == []
+
+
+def test_github_pipeline():
+    shutil.rmtree(dir_root, ignore_errors=True)
+    output_list = list()
+    for max_workers in [None, 4]:
+        dir_out = dir_root.joinpath(f"github-{max_workers}")
+        gh_pipeline = GitHubPipeline(
+            domain="github.com",
+            account="MacHu-GWU",
+            repo="docpack-project",
+            branch="main",
+            dir_repo=dir_project_root,
+            include=[f"{PACKAGE_NAME}/**/*.py"],
+            exclude=[f"{PACKAGE_NAME}/vendor/**"],
+            dir_out=dir_out.joinpath("docs"),
+            max_workers=max_workers,
+            path_bundle=dir_out.joinpath("knowledge_base.txt"),
+        )
+        sync_summary = gh_pipeline.fetch()
+        path_list = [
+            dir_out.joinpath(
+                "docs", f"{entry.key.replace('/', '~')}~{entry.uri_hash}.xml"
+            )
+            for entry in BundleIndex.read(gh_pipeline.path_bundle).documents
+        ]
+        assert len(path_list) == len(sync_summary.added)
+        bundle = gh_pipeline.path_bundle.read_text(encoding="utf-8")
+        assert bundle == "\n".join(
+            path.read_text(encoding="utf-8") for path in path_list
+        )
+        output_list.append(bundle)
+    assert output_list[0] == output_list[1]
+
+    # bundle only
+    gh_pipeline.export_documents = False
+    gh_pipeline.dir_out = dir_root.joinpath("github-bundle-only")
+    gh_pipeline.path_bundle = gh_pipeline.dir_out.joinpath("knowledge_base.txt")
+    gh_pipeline.fetch()
+    assert sorted(path.name for path in gh_pipeline.dir_out.iterdir()) == [
+        "knowledge_base.txt",
+        "knowledge_base.txt.index.json",
+    ]
+    assert gh_pipeline.path_bundle.read_text(encoding="utf-8") == output_list[0]
+
+    # sharded bundle, in path order
+    gh_pipeline.dir_out = dir_root.joinpath("github-sharded")
+    gh_pipeline.path_bundle = gh_pipeline.dir_out.joinpath("knowledge_base.txt")
+    gh_pipeline.max_bundle_bytes = 20_000
+    gh_pipeline.fetch()
+    bundle_index = BundleIndex.read(gh_pipeline.path_bundle)
+    assert len(bundle_index.shards) > 1
+    shard_list = [
+        gh_pipeline.dir_out.joinpath(name).read_text(encoding="utf-8")
+        for name in bundle_index.shards
+    ]
+    assert "\n".join(shard_list) == output_list[0]
+
+
+def test_confluence_pipeline():
+    shutil.rmtree(dir_root, ignore_errors=True)
+    atlas_doc = {
+        "type": "doc",
+        "version": 1,
+        "content": [
+            {"type": "paragraph", "content": [{"type": "text", "text": "Hello"}]}
+        ],
+    }
+    page_list = [
+        ConfluencePage(
+            page_data={
+                "id": page_id,
+                "title": f"Page {page_id}",
+                "body": {"atlas_doc_format": {"value": json.dumps(atlas_doc)}},
+                "_links": {"webui": f"/spaces/UT/pages/{page_id}"},
+            },
+            site_url="https://example.atlassian.net",
+            id_path=f"/{page_id}",
+            position_path=f"/{i}",
+            breadcrumb_path=f"|| Page {page_id}",
+        )
+        for i, page_id in enumerate(["3", "1", "2"])
+    ]
+    confluence_pipeline = ConfluencePipeline(
+        confluence=pyatlassian.confluence.Confluence(
+            url="https://example.atlassian.net",
+            username="user",
+            password="password",
+        ),
+        space_id=1,
+        include=[],
+        exclude=[],
+        dir_out=dir_root.joinpath("confluence", "docs"),
+        cache_key="test",
+        path_bundle=dir_root.joinpath("confluence", "knowledge_base.txt"),
+    )
+    confluence_pipeline.export_pages(page_list)
+    bundle_index = BundleIndex.read(confluence_pipeline.path_bundle)
+    assert [entry.key for entry in bundle_index.documents] == ["3", "1", "2"]
+    assert (
+        bundle_index.documents[0].url
+        == "https://example.atlassian.net/wiki/spaces/UT/pages/3"
+    )
+    with BundleReader(confluence_pipeline.path_bundle) as bundle_reader:
+        assert bundle_reader.get("1").startswith("<document>")
+        assert "Page 1" in bundle_reader.get("1")
+        assert (
+            bundle_reader.get("https://example.atlassian.net/wiki/spaces/UT/pages/2")
+            == page_list[2].to_xml()
+        )
+    assert confluence_pipeline.path_bundle.read_text(encoding="utf-8") == "\n".join(
+        confluence_pipeline.dir_out.joinpath(f"Page {page.id}.xml").read_text(
+            encoding="utf-8"
+        )
+        for page in page_list
+    )
+
+
+if __name__ == "__main__":
+    from docpack.tests import run_cov_test
+
+    run_cov_test(
+        __file__,
+        "docpack.bundle",
+        preview=False,
+    )
@@ -0,0 +1,148 @@
+# -*- coding: utf-8 -*-
+
+import gzip
+import shutil
+import importlib.util
+
+import pytest
+
+from docpack.paths import dir_project_root, dir_tmp, PACKAGE_NAME
+from docpack.constants import CompressionEnum
+from docpack.compression import (
+    get_suffix,
+    get_level,
+    detect_compression,
+    compress,
+    decompress,
+    open_text_writer,
+    read_text,
+)
+from docpack.github_fetcher import GitHubPipeline
+from docpack.bundle import BundleIndex, BundleReader
+
+dir_root = dir_tmp.joinpath("compression")
+
+compression_list = [CompressionEnum.gzip.value]
+if importlib.util.find_spec("zstandard") is not None:  # pragma: no cover
+    compression_list.append(CompressionEnum.zstd.value)
+
+
+def test_get_suffix():
+    assert get_suffix(None) == ""
+    assert get_suffix("gzip") == ".gz"
+    assert get_suffix(CompressionEnum.zstd) == ".zst"
+    assert get_level("gzip") == 6
+    assert get_level("gzip", 9) == 9
+    with pytest.raises(ValueError):
+        get_suffix("bz2")
+
+
+@pytest.mark.parametrize("compression", compression_list)
+def test_compress(compression: str):
+    data = "<document>中文</document>\n".encode("utf-8") * 100
+    compressed = compress(data, compression)
+    assert len(compressed) < len(data)
+    assert detect_compression(compressed) == compression
+    assert decompress(compressed) == data
+    # deterministic, and members / frames can be concatenated
+    assert compress(data, compression) == compressed
+    assert decompress(compressed + compress(b"!", compression, 1)) == data + b"!"
+    assert decompress(data) == data
+
+
+@pytest.mark.parametrize("compression", compression_list)
+def test_open_text_writer(compression: str):
+    shutil.rmtree(dir_root, ignore_errors=True)
+    dir_root.mkdir(parents=True)
+    path = dir_root.joinpath(f"test.txt{get_suffix(compression)}")
+    with open_text_writer(path, compression, 1) as f:
+        for _ in range(1000):
+            f.write("hello 中文\n")
+    assert read_text(path) == "hello 中文\n" * 1000
+    if compression == CompressionEnum.gzip.value:
+        assert gzip.decompress(path.read_bytes()).decode("utf-8") == read_text(path)
+    path = dir_root.joinpath("plain.txt")
+    with open_text_writer(path) as f:
+        f.write("hello")
+    assert read_text(path) == "hello"
+
+
+@pytest.mark.parametrize("compression", compression_list)
+def test_github_pipeline(compression: str):
+    shutil.rmtree(dir_root, ignore_errors=True)
+    kwargs = dict(
+        domain="github.com",
+        account="MacHu-GWU",
+        repo="docpack-project",
+        branch="main",
+        dir_repo=dir_project_root,
+        include=[f"{PACKAGE_NAME}/**/*.py"],
+        exclude=[f"{PACKAGE_NAME}/vendor/**"],
+    )
+    dir_plain = dir_root.joinpath("plain")
+    GitHubPipeline(
+        dir_out=dir_plain.joinpath("docs"),
+        path_bundle=dir_plain.joinpath("knowledge_base.txt"),
+        **kwargs,
+    ).fetch()
+    dir_compressed = dir_root.joinpath(compression)
+    gh_pipeline = GitHubPipeline(
+        dir_out=dir_compressed.joinpath("docs"),
+        path_bundle=dir_compressed.joinpath("knowledge_base.txt"),
+        compression=compression,
+        **kwargs,
+    )
+    gh_pipeline.fetch()
+
+    suffix = get_suffix(compression)
+    path_list = sorted(dir_plain.joinpath("docs").iterdir())
+    assert sorted(path.name for path in dir_compressed.joinpath("docs").iterdir()) == [
+        path.name + suffix for path in path_list
+    ]
+    for path in path_list:
+        path_compressed = dir_compressed.joinpath("docs", path.name + suffix)
+        assert read_text(path_compressed) == path.read_text(encoding="utf-8")
+
+    # the whole compressed bundle decompresses to the plain bundle
+    text = dir_plain.joinpath("knowledge_base.txt").read_text(encoding="utf-8")
+    path_bundle = dir_compressed.joinpath("knowledge_base.txt" + suffix)
+    assert read_text(path_bundle) == text
+    bundle_index = BundleIndex.read(gh_pipeline.path_bundle)
+    assert bundle_index.compression == compression
+    assert bundle_index.shards == [path_bundle.name]
+    with (
+        BundleReader(dir_plain.joinpath("knowledge_base.txt")) as plain_reader,
+        BundleReader(gh_pipeline.path_bundle) as bundle_reader,
+    ):
+        assert len(bundle_reader) == len(path_list)
+        for (entry, xml), (_, plain_xml) in zip(bundle_reader, plain_reader):
+            assert xml == plain_xml
+            assert bundle_reader.get(entry.key) == plain_xml
+
+    # sharded, the limit applies to the compressed size
+    gh_pipeline.max_bundle_bytes = 4000
+    gh_pipeline.fetch()
+    bundle_index = BundleIndex.read(gh_pipeline.path_bundle)
+    assert len(bundle_index.shards) > 1
+    assert bundle_index.shards[0] == f"knowledge_base-001.txt{suffix}"
+    shard_text_list = list()
+    for nth, name in enumerate(bundle_index.shards):
+        path_shard = dir_compressed.joinpath(name)
+        if bundle_index.shard_ids.count(nth) > 1:
+            assert path_shard.stat().st_size <= gh_pipeline.max_bundle_bytes
+        shard_text_list.append(read_text(path_shard))
+    assert "\n".join(shard_text_list) == text
+    # the unsharded bundle of the previous run is cleaned up
+    assert path_bundle.exists() is False
+    with BundleReader(gh_pipeline.path_bundle) as bundle_reader:
+        assert "\n".join(xml for _, xml in bundle_reader) == text
+
+
+if __name__ == "__main__":
+    from docpack.tests import run_cov_test
+
+    run_cov_test(
+        __file__,
+        "docpack.compression",
+        preview=False,
+    )
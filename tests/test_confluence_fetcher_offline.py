@@ -0,0 +1,510 @@
+# -*- coding: utf-8 -*-
+
+"""
+Test the Confluence pipeline against a local stand-in of the Confluence API,
+see :mod:`docpack.tests.confluence_server`.
+"""
+
+import json
+import random
+import shutil
+
+import pytest
+from diskcache import Cache
+
+from docpack.paths import dir_tmp
+from docpack.tests.confluence_server import new_page_data, ConfluenceServer
+from docpack.confluence_fetcher import (
+    GET_PAGES_LIMIT,
+    fetch_raw_pages_from_space,
+    fetch_page_bodies,
+    enrich_pages_with_hierarchy_data,
+    ConfluencePage,
+    is_matching,
+    find_matching_pages,
+    PageHierarchy,
+    get_markdown_cache_key,
+    load_markdown,
+    ConfluencePipeline,
+)
+from docpack.bundle import BundleReader
+
+dir_root = dir_tmp.joinpath("confluence_fetcher_offline")
+
+
+def new_space(n_child: int = 150) -> list[dict]:
+    """
+    Two topics with ``n_child`` child pages each, and a small third topic.
+    """
+    page_list = [
+        new_page_data("1", "Topic 1", position=0, text="topic 1"),
+        new_page_data("2", "Topic 2", position=1, text="topic 2"),
+        new_page_data("3", "Topic 3", position=2, text="topic 3"),
+        new_page_data("31", "Topic 3 Child", parent_id="3", text="topic 3 child"),
+    ]
+    for parent_id in ["1", "2"]:
+        for i in range(n_child):
+            page_list.append(
+                new_page_data(
+                    id=f"{parent_id}-{i}",
+                    title=f"Topic {parent_id} Page {i}",
+                    parent_id=parent_id,
+                    position=i,
+                    text=f"content of topic {parent_id} page {i}",
+                )
+            )
+    return page_list
+
+
+def new_raw_pages(page_data_list: list[dict]) -> list[ConfluencePage]:
+    return [
+        ConfluencePage(
+            page_data=page_data,
+            site_url="https://example.atlassian.net",
+            id_path=None,
+            position_path=None,
+            breadcrumb_path=None,
+        )
+        for page_data in page_data_list
+    ]
+
+
+def test_enrich_pages_with_hierarchy_data():
+    # a 30 levels deep chain, children listed before their parents
+    page_data_list = [
+        new_page_data(f"d{i}", f"Deep {i}", parent_id=f"d{i - 1}" if i else None)
+        for i in range(30)
+    ][::-1]
+    # siblings are ordered by position, as numbers
+    page_data_list.extend(
+        new_page_data(f"s{i}", f"Sibling {i}", parent_id="d0", position=i)
+        for i in [10, 2, 1]
+    )
+    # under a folder that is not a page
+    page_data_list.append(new_page_data("f1", "In Folder", parent_id="folder"))
+    page_data_list.append(new_page_data("f2", "In Folder Child", parent_id="f1"))
+    page_data_list.append(new_page_data("r", "Root", position=1))
+    sorted_pages = enrich_pages_with_hierarchy_data(new_raw_pages(page_data_list))
+    assert [page.id for page in sorted_pages] == (
+        ["d0", "d1"] + [f"d{i}" for i in range(2, 30)] + ["s1", "s2", "s10", "r"]
+    )
+    page = sorted_pages[29]
+    assert page.id == "d29"
+    assert page.id_path == "/" + "/".join(f"d{i}" for i in range(30))
+    assert page.position_path == "/0" * 30
+    assert page.breadcrumb_path.startswith("|| Deep 0 || Deep 1 || ")
+    assert page.breadcrumb_path.endswith(" || Deep 29")
+    assert sorted_pages[-2].id_path == "/d0/s10"
+    assert sorted_pages[-2].position_path == "/0/10"
+
+    # a cycle, with a child page
+    page_data_list.append(new_page_data("c1", "Cycle 1", parent_id="c3"))
+    page_data_list.append(new_page_data("c2", "Cycle 2", parent_id="c1"))
+    page_data_list.append(new_page_data("c3", "Cycle 3", parent_id="c2"))
+    page_data_list.append(new_page_data("c4", "Cycle 4", parent_id="c3"))
+    with pytest.raises(ValueError, match="cycle"):
+        enrich_pages_with_hierarchy_data(new_raw_pages(page_data_list))
+    with pytest.raises(ValueError, match="cycle"):
+        enrich_pages_with_hierarchy_data(
+            new_raw_pages([new_page_data("x", "Self", parent_id="x")])
+        )
+
+
+def test_page_hierarchy():
+    # 1 -> 12 is not a descendant of 1 -> 1, even if its id starts the same
+    page_data_list = new_space(n_child=20)
+    page_data_list.append(new_page_data("12", "Topic 12", position=3))
+    page_data_list.append(new_page_data("12-0", "Topic 12 Page 0", parent_id="12"))
+    page_data_list.append(new_page_data("1-0-0", "Deep", parent_id="1-0"))
+    sorted_pages = enrich_pages_with_hierarchy_data(new_raw_pages(page_data_list))
+    hierarchy = PageHierarchy(sorted_pages)
+    assert len(hierarchy) == len(page_data_list)
+
+    assert [page.id for page in hierarchy.descendants("3")] == ["31"]
+    assert hierarchy.descendants("31") == []
+    descendants = hierarchy.descendants("1")
+    assert [page.id for page in descendants[:3]] == ["1-0", "1-0-0", "1-1"]
+    assert len(descendants) == 21
+    start, end = hierarchy.get_interval("1")
+    assert hierarchy.pages[start].id == "1"
+    assert hierarchy.pages[start + 1 : end] == descendants
+    with pytest.raises(KeyError):
+        hierarchy.descendants("unknown")
+
+    # same result as is_matching, for random patterns
+    page_mapping = {page.id: page for page in sorted_pages}
+    id_list = [page.id for page in sorted_pages] + ["unknown"]
+    rng = random.Random(1)
+    for _ in range(100):
+        include = [
+            rng.choice(id_list) + rng.choice(["", "/*"])
+            for _ in range(rng.randint(0, 5))
+        ]
+        exclude = [
+            rng.choice(id_list) + rng.choice(["", "/*"])
+            for _ in range(rng.randint(0, 5))
+        ]
+        expected = [
+            page
+            for page in sorted_pages
+            if is_matching(page_mapping, page, include, exclude)
+        ]
+        assert hierarchy.find_matching_pages(include, exclude) == expected
+        assert find_matching_pages(sorted_pages, include, exclude) == expected
+    assert [page.id for page in hierarchy.find_matching_pages(["1/*"], ["1-0/*"])] == [
+        "1"
+    ] + [f"1-{i}" for i in range(1, 20)]
+
+
+def test_load_markdown():
+    shutil.rmtree(dir_root, ignore_errors=True)
+    page_data = new_page_data("1", "Home", text="hello", version=3)
+    page = new_raw_pages([page_data])[0]
+    assert page.version == "3"
+    # converted once per page object, until the body or the title changes
+    assert page.markdown == "# Home\n\nhello"
+    assert page.markdown is page.markdown
+    page.page_data["body"] = new_page_data("1", "Home", text="hi")["body"]
+    assert page.markdown == "# Home\n\nhi"
+    page.page_data["title"] = "Index"
+    assert page.markdown == "# Index\n\nhi"
+
+    with Cache(str(dir_root.joinpath("markdown")), size_limit=1_000_000) as cache:
+        page = new_raw_pages([page_data])[0]
+        no_version_page = new_raw_pages([new_page_data("2", "No Version")])[0]
+        del no_version_page.page_data["version"]
+        assert load_markdown(page, cache=cache) == "# Home\n\nhello"
+        assert load_markdown(no_version_page, cache=cache) == "# No Version\n\n"
+        assert list(cache) == [get_markdown_cache_key(page)]
+
+        # the next run reads it from the cache
+        cache.set(get_markdown_cache_key(page), "cached")
+        page = new_raw_pages([page_data])[0]
+        assert load_markdown(page, cache=cache) == "cached"
+        assert page.markdown == "cached"
+
+        # a new version is converted again
+        page = new_raw_pages([new_page_data("1", "Home", text="new", version=4)])[0]
+        assert load_markdown(page, cache=cache) == "# Home\n\nnew"
+        assert len(cache) == 2
+
+
+def test_markdown_cache_shared_by_sites():
+    # two sites with the same page id and version, and one cache directory
+    shutil.rmtree(dir_root, ignore_errors=True)
+    with (
+        ConfluenceServer(pages=[new_page_data("1", "Home", text="site a")]) as a,
+        ConfluenceServer(pages=[new_page_data("1", "Home", text="site b")]) as b,
+    ):
+        assert a.url != b.url
+        for server, site in [(a, "a"), (b, "b")]:
+            confluence_pipeline = ConfluencePipeline(
+                confluence=server.new_confluence(),
+                space_id="UT",
+                include=["1"],
+                exclude=[],
+                dir_out=dir_root.joinpath(f"site-{site}"),
+                cache_key="test",
+                cache_path=str(dir_root.joinpath("cache")),
+            )
+            confluence_pipeline.fetch()
+            path_out = confluence_pipeline.dir_out.joinpath("Home.xml")
+            assert f"site {site}" in path_out.read_text(encoding="utf-8")
+        assert len(confluence_pipeline.markdown_cache) == 2
+
+
+class EditingConfluencePipeline(ConfluencePipeline):
+    def post_process_confluence_page(
+        self,
+        confluence_page: ConfluencePage,
+    ) -> ConfluencePage:
+        atlas_doc = confluence_page.atlas_doc
+        atlas_doc["content"][0]["content"][0]["text"] += " (edited)"
+        confluence_page.page_data["body"]["atlas_doc_format"]["value"] = json.dumps(
+            atlas_doc
+        )
+        return confluence_page
+
+
+def test_markdown_cache_with_hook():
+    shutil.rmtree(dir_root, ignore_errors=True)
+    with ConfluenceServer(pages=new_space(n_child=5)) as server:
+        kwargs = dict(
+            confluence=server.new_confluence(),
+            space_id="UT",
+            include=["1/*"],
+            exclude=[],
+            dir_out=dir_root.joinpath("hook"),
+            cache_key="test",
+            cache_path=str(dir_root.joinpath("cache")),
+            # the markdown is converted before the hook to count the tokens
+            token_budget=1_000_000,
+        )
+        confluence_pipeline = EditingConfluencePipeline(**kwargs)
+        for _ in range(2):
+            sync_summary = confluence_pipeline.fetch()
+            assert len(sync_summary.added) == 6
+            path_out = confluence_pipeline.dir_out.joinpath(
+                "Topic 1 ~ Topic 1 Page 3.xml"
+            )
+            text = path_out.read_text(encoding="utf-8")
+            assert "content of topic 1 page 3 (edited)" in text
+            # the edited markdown is not cached under the page version
+            assert len(confluence_pipeline.markdown_cache) == 0
+
+        # without the hook, the markdown is cached
+        confluence_pipeline = ConfluencePipeline(**kwargs)
+        confluence_pipeline.fetch()
+        assert "(edited)" not in path_out.read_text(encoding="utf-8")
+        assert len(confluence_pipeline.markdown_cache) == 6
+
+
+def test_markdown_cache_without_markdown_field(monkeypatch):
+    shutil.rmtree(dir_root, ignore_errors=True)
+    n_convert = 0
+    convert_markdown = ConfluencePage.convert_markdown
+
+    def count_convert_markdown(self):
+        nonlocal n_convert
+        n_convert += 1
+        return convert_markdown(self)
+
+    monkeypatch.setattr(ConfluencePage, "convert_markdown", count_convert_markdown)
+    with ConfluenceServer(pages=new_space(n_child=5)) as server:
+        confluence_pipeline = ConfluencePipeline(
+            confluence=server.new_confluence(),
+            space_id="UT",
+            include=["1/*"],
+            exclude=[],
+            dir_out=dir_root.joinpath("no_markdown"),
+            cache_key="test",
+            cache_path=str(dir_root.joinpath("cache")),
+            wanted_fields=["confluence_url", "title"],
+        )
+        sync_summary = confluence_pipeline.fetch()
+        assert len(sync_summary.added) == 6
+        assert n_convert == 0
+        assert len(confluence_pipeline.markdown_cache) == 0
+
+        confluence_pipeline.wanted_fields = None
+        confluence_pipeline.fetch()
+        assert n_convert == 6
+        assert len(confluence_pipeline.markdown_cache) == 6
+        # the next run reads the cache
+        confluence_pipeline.fetch()
+        assert n_convert == 6
+
+
+def test_fetch_raw_pages_from_space():
+    with ConfluenceServer(pages=new_space()) as server:
+        confluence = server.new_confluence()
+        raw_pages = fetch_raw_pages_from_space(confluence=confluence, space_id=1)
+        assert len(raw_pages) == 304
+        assert not any(page.has_body for page in raw_pages)
+        assert len(server.requests) == 2
+        assert server.get_body_requests() == []
+
+        sorted_pages = enrich_pages_with_hierarchy_data(raw_pages)
+        pages = [page for page in sorted_pages if page.id_path.startswith("/3")]
+        assert [page.id for page in pages] == ["3", "31"]
+        assert fetch_page_bodies(confluence=confluence, pages=pages) == pages
+        assert pages[1].markdown == "# Topic 3 Child\n\ntopic 3 child"
+        assert len(server.get_body_requests()) == 1
+        # already downloaded
+        fetch_page_bodies(confluence=confluence, pages=pages)
+        assert len(server.get_body_requests()) == 1
+
+        # a page deleted since the listing is left out
+        raw_pages = fetch_raw_pages_from_space(confluence=confluence, space_id=1)
+        server.pages = [page for page in server.pages if page["id"] != "1-3"]
+        pages = fetch_page_bodies(
+            confluence=confluence,
+            pages=raw_pages,
+            batch_size=GET_PAGES_LIMIT,
+        )
+        assert len(pages) == 303
+        assert "1-3" not in {page.id for page in pages}
+
+        # the old single phase behavior
+        raw_pages = fetch_raw_pages_from_space(
+            confluence=confluence,
+            space_id=1,
+            body_format="atlas_doc_format",
+        )
+        assert all(page.has_body for page in raw_pages)
+
+
+def test_fetch():
+    shutil.rmtree(dir_root, ignore_errors=True)
+    with ConfluenceServer(pages=new_space()) as server:
+        confluence_pipeline = ConfluencePipeline(
+            confluence=server.new_confluence(),
+            space_id="UT",
+            include=["1/*", "31"],
+            exclude=["1-0"],
+            dir_out=dir_root.joinpath("docs"),
+            cache_key="test",
+            cache_path=str(dir_root.joinpath("cache")),
+            body_batch_size=20,
+            max_workers=4,
+        )
+        plan = confluence_pipeline.plan()
+        n_request = len(server.requests)
+        sync_summary = confluence_pipeline.fetch()
+
+        # 1 space lookup, 2 metadata listings, then the bodies of the
+        # 1 + 149 + 1 matched pages in batches of 20
+        assert n_request == 3
+        assert len(sync_summary.added) == 151
+        assert sync_summary.added[:2] == ["1", "1-1"]
+        assert sync_summary.added[-1] == "31"
+        body_requests = server.get_body_requests()
+        assert len(body_requests) == 8
+        assert plan.n_api_call == 2 + 8
+        assert plan.n_body_download == 151
+        downloaded = [
+            id
+            for query in body_requests
+            for value in query["id"]
+            for id in value.split(",")
+        ]
+        assert sorted(downloaded) == sorted(sync_summary.added)
+        assert len(list(confluence_pipeline.dir_out.iterdir())) == 151
+        path_out = confluence_pipeline.dir_out.joinpath("Topic 1 ~ Topic 1 Page 9.xml")
+        assert "content of topic 1 page 9" in path_out.read_text(encoding="utf-8")
+        assert len(confluence_pipeline.markdown_cache) == 151
+
+        # the hierarchy and the bodies are cached, no request at all
+        n_request = len(server.requests)
+        confluence_pipeline.fetch()
+        assert len(server.requests) == n_request
+        plan = confluence_pipeline.plan()
+        assert plan.n_api_call == 0
+        assert plan.n_body_download == 0
+        assert plan.n_unknown == 0
+
+        # a new listing, only the body of the edited page is downloaded
+        for i, page_data in enumerate(server.pages):
+            if page_data["id"] == "1-9":
+                server.pages[i] = new_page_data(
+                    id="1-9",
+                    title="Topic 1 Page 9",
+                    parent_id="1",
+                    position=9,
+                    text="new content",
+                    version=2,
+                )
+        confluence_pipeline.cache_key = "test-2"
+        n_body_request = len(server.get_body_requests())
+        confluence_pipeline.fetch()
+        body_requests = server.get_body_requests()[n_body_request:]
+        assert [query["id"] for query in body_requests] == [["1-9"]]
+        assert "new content" in path_out.read_text(encoding="utf-8")
+
+
+def test_fetch_sibling_order():
+    # the siblings are exported in the numeric order of their position, the
+    # old string order of position_path put "/10" and "/11" before "/2"
+    shutil.rmtree(dir_root, ignore_errors=True)
+    page_data_list = [new_page_data("p", "Parent", text="parent")]
+    page_data_list.extend(
+        new_page_data(f"p-{i}", f"Child {i}", parent_id="p", position=i, text=f"{i}")
+        for i in [11, 2, 10, 0, 1]
+    )
+    with ConfluenceServer(pages=page_data_list) as server:
+        confluence_pipeline = ConfluencePipeline(
+            confluence=server.new_confluence(),
+            space_id="UT",
+            include=["p", "p/*"],
+            exclude=[],
+            dir_out=dir_root.joinpath("docs"),
+            cache_key="test",
+            cache_path=str(dir_root.joinpath("cache")),
+            path_bundle=dir_root.joinpath("knowledge_base.txt"),
+        )
+        sync_summary = confluence_pipeline.fetch()
+    expected = ["p", "p-0", "p-1", "p-2", "p-10", "p-11"]
+    assert sync_summary.added == expected
+    with BundleReader(confluence_pipeline.path_bundle) as bundle_reader:
+        assert bundle_reader.index.keys == expected
+
+
+def test_fetch_incremental():
+    shutil.rmtree(dir_root, ignore_errors=True)
+    with ConfluenceServer(pages=new_space()) as server:
+        confluence_pipeline = ConfluencePipeline(
+            confluence=server.new_confluence(),
+            space_id="UT",
+            include=["1/*", "31"],
+            exclude=["1-0"],
+            dir_out=dir_root.joinpath("incremental"),
+            cache_key="test",
+            cache_path=str(dir_root.joinpath("cache")),
+            body_batch_size=20,
+            incremental=True,
+        )
+        sync_summary = confluence_pipeline.fetch()
+        assert len(sync_summary.added) == 151
+        assert len(server.get_body_requests()) == 8
+        dir_out = confluence_pipeline.dir_out
+        # the manifest and the pages
+        assert len(list(dir_out.iterdir())) == 1 + 151
+        path_out = dir_out.joinpath("Topic 1 ~ Topic 1 Page 9.xml")
+        mtime_ns = path_out.stat().st_mtime_ns
+
+        # nothing changed, only the metadata is listed
+        n_request = len(server.requests)
+        sync_summary = confluence_pipeline.fetch()
+        assert len(sync_summary.unchanged) == 151
+        assert sync_summary.n_changed == 0
+        assert len(server.requests) - n_request == 2
+        assert len(server.get_body_requests()) == 8
+        assert path_out.stat().st_mtime_ns == mtime_ns
+
+        # edit, add, delete and rename pages
+        page_mapping = {page["id"]: page for page in server.pages}
+        page_mapping["1-9"] = new_page_data(
+            "1-9", "Topic 1 Page 9", parent_id="1", position=9, text="new", version=2
+        )
+        page_mapping["3"] = new_page_data("3", "Topic 3 New", position=2, version=2)
+        page_mapping["2-0"]["version"] = {"number": 2}  # not matched
+        del page_mapping["1-7"]
+        page_mapping["1-new"] = new_page_data("1-new", "New", parent_id="1")
+        server.pages = list(page_mapping.values())
+        dir_out.joinpath("Topic 1 ~ Topic 1 Page 8.xml").write_text("x")
+
+        sync_summary = confluence_pipeline.fetch()
+        assert sync_summary.added == ["1-new"]
+        assert sync_summary.modified == ["1-8", "1-9", "31"]
+        assert sync_summary.deleted == ["1-7"]
+        assert len(sync_summary.unchanged) == 147
+        body_requests = server.get_body_requests()
+        assert len(body_requests) == 9
+        # 1-8 and 31 did not change, their bodies are cached
+        assert sorted(body_requests[-1]["id"][0].split(",")) == ["1-9", "1-new"]
+        assert "new" in path_out.read_text(encoding="utf-8")
+        assert dir_out.joinpath("Topic 3 New ~ Topic 3 Child.xml").exists()
+        assert not dir_out.joinpath("Topic 3 ~ Topic 3 Child.xml").exists()
+        assert not dir_out.joinpath("Topic 1 ~ Topic 1 Page 7.xml").exists()
+        assert len(list(dir_out.iterdir())) == 1 + 151
+
+        # the pages that no longer match are deleted
+        confluence_pipeline.include = ["31"]
+        sync_summary = confluence_pipeline.fetch()
+        assert sync_summary.unchanged == ["31"]
+        assert len(sync_summary.deleted) == 150
+        assert len(list(dir_out.iterdir())) == 1 + 1
+
+        confluence_pipeline.token_budget = 1000
+        with pytest.raises(ValueError):
+            confluence_pipeline.fetch()
+
+
+if __name__ == "__main__":
+    from docpack.tests import run_cov_test
+
+    run_cov_test(
+        __file__,
+        "docpack.confluence_fetcher",
+        preview=False,
+    )
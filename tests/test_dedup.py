@@ -0,0 +1,183 @@
+# -*- coding: utf-8 -*-
+
+import json
+import shutil
+
+import pytest
+
+import pyatlassian.api as pyatlassian
+
+from docpack.paths import dir_project_root, dir_tmp, PACKAGE_NAME
+from docpack.dedup import ContentStore, DuplicateDocument
+from docpack.github_fetcher import (
+    GitHubFileRecord,
+    get_github_file_xml_serializer,
+    GitHubPipeline,
+)
+from docpack.confluence_fetcher import ConfluencePage, ConfluencePipeline
+from docpack.bundle import BundleReader
+
+dir_root = dir_tmp.joinpath("dedup")
+
+
+def test_content_store():
+    content_store = ContentStore(min_size=10)
+    assert content_store.add(key="a", url="url-a", body="x" * 100) is None
+    assert content_store.add(key="b", url="url-b", body="y" * 100) is None
+    # too small to be worth a reference
+    assert content_store.add(key="c", url="url-c", body="x") is None
+    assert content_store.add(key="d", url="url-d", body="x") is None
+    entry = content_store.add(key="e", url="url-e", body="x" * 100)
+    assert entry.key == "a"
+    assert entry.url == "url-a"
+    assert content_store.n_duplicate == 1
+    assert content_store.n_bytes_saved == 100
+    assert len(content_store.entries) == 2
+
+
+def test_duplicate_document():
+    github_file_list = [
+        GitHubFileRecord(
+            domain="github.com",
+            account="MacHu-GWU",
+            repo=repo,
+            branch="main",
+            path_parts=("LICENSE.txt",),
+            content="MIT License " * 10,
+        )
+        for repo in ["docpack-project", "docpack-fork"]
+    ]
+    content_store = ContentStore()
+    original = None
+    for github_file in github_file_list:
+        original = content_store.add(
+            key=github_file.path,
+            url=github_file.github_url,
+            body=github_file.content,
+        )
+    document = DuplicateDocument(document=github_file_list[1], original=original)
+    assert document.path == "LICENSE.txt"
+    assert document.duplicate_of == github_file_list[0].github_url
+    xml = get_github_file_xml_serializer(duplicate=True).to_xml(document)
+    assert xml == get_github_file_xml_serializer().to_xml(github_file_list[1]).replace(
+        f"  <content>\n{github_file_list[1].content}\n  </content>",
+        f"  <duplicate_of>{github_file_list[0].github_url}</duplicate_of>",
+    )
+    # no content, nothing to replace
+    wanted_fields = ["github_url", "path"]
+    assert get_github_file_xml_serializer(wanted_fields, duplicate=True).to_xml(
+        document
+    ) == github_file_list[1].to_xml(wanted_fields)
+
+
+def test_github_pipeline():
+    shutil.rmtree(dir_root, ignore_errors=True)
+    for max_workers in [None, 4]:
+        content_store = ContentStore()
+        summary_list = list()
+        for branch in ["main", "dev"]:
+            dir_out = dir_root.joinpath(f"github-{max_workers}", branch)
+            gh_pipeline = GitHubPipeline(
+                domain="github.com",
+                account="MacHu-GWU",
+                repo="docpack-project",
+                branch=branch,
+                dir_repo=dir_project_root,
+                include=[f"{PACKAGE_NAME}/**/*.py"],
+                exclude=[f"{PACKAGE_NAME}/vendor/**"],
+                dir_out=dir_out.joinpath("docs"),
+                path_bundle=dir_out.joinpath("knowledge_base.txt"),
+                max_workers=max_workers,
+                content_store=content_store,
+            )
+            summary_list.append(gh_pipeline.fetch())
+
+        # every file big enough is a duplicate of the same file on main
+        main_summary, dev_summary = summary_list
+        assert len(main_summary.duplicated) < len(main_summary.added)
+        assert len(dev_summary.duplicated) > len(main_summary.duplicated)
+        assert dev_summary.n_bytes_saved > 0
+        assert (
+            main_summary.n_bytes_saved + dev_summary.n_bytes_saved
+            == content_store.n_bytes_saved
+        )
+        with BundleReader(gh_pipeline.path_bundle) as bundle_reader:
+            path = f"{PACKAGE_NAME}/github_fetcher.py"
+            xml = bundle_reader.get(path)
+            assert "<content>" not in xml
+            assert (
+                f"<duplicate_of>https://github.com/MacHu-GWU/docpack-project/blob/main/{path}</duplicate_of>"
+                in xml
+            )
+            path_out = next(dir_out.joinpath("docs").glob("*github_fetcher.py~*"))
+            assert path_out.read_text(encoding="utf-8") == xml
+
+    with pytest.raises(ValueError):
+        gh_pipeline.fetch_incremental()
+
+
+def test_confluence_pipeline():
+    shutil.rmtree(dir_root, ignore_errors=True)
+    atlas_doc = {
+        "type": "doc",
+        "version": 1,
+        "content": [
+            {
+                "type": "paragraph",
+                "content": [{"type": "text", "text": "Meeting notes template " * 5}],
+            }
+        ],
+    }
+    page_list = [
+        ConfluencePage(
+            page_data={
+                "id": page_id,
+                "title": "Meeting notes",
+                "body": {"atlas_doc_format": {"value": json.dumps(atlas_doc)}},
+                "_links": {"webui": f"/spaces/UT/pages/{page_id}"},
+            },
+            site_url="https://example.atlassian.net",
+            id_path=f"/{page_id}",
+            position_path=f"/{i}",
+            breadcrumb_path=f"|| Page {page_id}",
+        )
+        for i, page_id in enumerate(["1", "2", "3"])
+    ]
+    confluence_pipeline = ConfluencePipeline(
+        confluence=pyatlassian.confluence.Confluence(
+            url="https://example.atlassian.net",
+            username="user",
+            password="password",
+        ),
+        space_id=1,
+        include=[],
+        exclude=[],
+        dir_out=dir_root.joinpath("confluence", "docs"),
+        cache_key="test",
+        path_bundle=dir_root.joinpath("confluence", "knowledge_base.txt"),
+        content_store=ContentStore(),
+    )
+    sync_summary = confluence_pipeline.export_pages(page_list)
+    assert sync_summary.added == ["1", "2", "3"]
+    assert sync_summary.duplicated == ["2", "3"]
+    assert sync_summary.n_bytes_saved == 2 * len(page_list[0].markdown.encode("utf-8"))
+    path_out = confluence_pipeline.dir_out.joinpath("Page 3.xml")
+    xml = path_out.read_text(encoding="utf-8")
+    assert "<markdown_content>" not in xml
+    assert (
+        "<duplicate_of>https://example.atlassian.net/wiki/spaces/UT/pages/1</duplicate_of>"
+        in xml
+    )
+    with BundleReader(confluence_pipeline.path_bundle) as bundle_reader:
+        assert bundle_reader.get("1") == page_list[0].to_xml()
+        assert bundle_reader.get("3") == xml
+
+
+if __name__ == "__main__":
+    from docpack.tests import run_cov_test
+
+    run_cov_test(
+        __file__,
+        "docpack.dedup",
+        preview=False,
+    )
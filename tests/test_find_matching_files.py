@@ -1,11 +1,22 @@
 # -*- coding: utf-8 -*-
 
-from docpack.paths import dir_project_root
+import shutil
+
+from pathpick.api import PathPick
+
+from docpack.paths import dir_project_root, dir_tmp
 from docpack.find_matching_files import (
     remove_dupes,
     process_include_exclude,
+    CompiledPatterns,
+    PathMatcher,
+    compile_prune_patterns,
+    is_pruned,
+    plan_walk_roots,
     find_matching_files,
+    find_matching_files_in_git_index,
 )
+from docpack.git_utils import list_tracked_files
 
 
 def _test_remove_dupes(in_list: list, out_list: list):
@@ -129,6 +140,246 @@ def test_find_matching_files_case_1():
         print(path.relative_to(dir_project_root))
 
 
+def test_compiled_patterns():
+    compiled_patterns = CompiledPatterns.new(
+        [
+            "/README.rst",
+            "docs/source/conf.py",
+            "Makefile",
+            "**/__pycache__",
+            "*.py",
+            "**/*.tar.gz",
+            "tests/**/all.py",
+            "**/tests/conftest.py",
+            "**/a/*.py",
+        ]
+    )
+    assert compiled_patterns.literal_set == {"README.rst", "docs/source/conf.py"}
+    assert compiled_patterns.name_set == {"Makefile", "__pycache__"}
+    assert compiled_patterns.ext_set == {".py", ".tar.gz"}
+    assert compiled_patterns.regex is not None
+    assert compiled_patterns.path_spec is None
+
+    assert CompiledPatterns.new(["*.py", "!test_*.py"]).path_spec is not None
+
+
+path_matcher_pattern_list = [
+    "*.py",
+    "**/*.py",
+    "*.tar.gz",
+    "*.*",
+    "**/*.*",
+    "**",
+    "README.rst",
+    "/README.rst",
+    "Makefile",
+    "**/__pycache__/**",
+    "a/b",
+    "/a/b",
+    "a/b/",
+    "a/*",
+    "/*.py",
+    "a?b",
+    "[ab]",
+    "docs/**",
+    "docs/source/**/index.rst",
+    "tests/**/all.py",
+    ".venv/**/*.*",
+    "**/x/y.py",
+    "**/a/b",
+    "**/tests/conftest.py",
+    "**/a/*.py",
+    "!x.py",
+    "!a/b",
+]
+
+path_matcher_path_list = [
+    "x.py",
+    "a/x.py",
+    "a/b",
+    "a/b/x.py",
+    "a/x.py/c",
+    "a.b",
+    "a-b",
+    "y.tar.gz",
+    "a/y.tar.gz",
+    ".py",
+    "README.rst",
+    "a/README.rst",
+    "Makefile",
+    "a/Makefile",
+    "__pycache__/x.pyc",
+    "a/__pycache__/x.pyc",
+    "docs/index.rst",
+    "docs/source/a/b/index.rst",
+    "tests/all.py",
+    "tests/a/all.py",
+    ".venv/lib/site.py",
+    "/a/b/x.py",
+    "./a/x.py",
+    "x/y.py",
+    "a/x/y.py",
+    "z/a/b/c.py",
+    "q/tests/conftest.py",
+]
+
+
+def test_path_matcher_parity():
+    pattern_list = path_matcher_pattern_list
+    path_list = path_matcher_path_list
+    cases = [([], [])]
+    for pattern in pattern_list:
+        cases.append(([pattern], []))
+        cases.append(([], [pattern]))
+    for ith in range(len(pattern_list)):
+        cases.append(
+            (
+                pattern_list[ith : ith + 4],
+                pattern_list[ith + 2 : ith + 5],
+            )
+        )
+    for include, exclude in cases:
+        path_pick = PathPick.new(include=include, exclude=exclude)
+        path_matcher = PathMatcher.new(include=include, exclude=exclude)
+        expected = [path for path in path_list if path_pick.is_match(path)]
+        assert [path for path in path_list if path_matcher.is_match(path)] == expected
+        assert path_matcher.filter(path_list) == expected
+
+
+def test_is_pruned():
+    prune_pattern_list = compile_prune_patterns(
+        [
+            ".venv/**/*.*",
+            "build/**",
+            "**/__pycache__",
+            "htmlcov/*",
+            "docs/*.*",
+        ]
+    )
+    for relpath in [
+        ".venv",
+        ".venv/lib",
+        "build",
+        "__pycache__",
+        "docpack/__pycache__",
+        "htmlcov",
+    ]:
+        assert is_pruned(prune_pattern_list, relpath) is True
+    for relpath in [
+        "docpack",
+        "docs",
+        "docs/source",
+        "build_tool",
+        ".venv2",
+    ]:
+        assert is_pruned(prune_pattern_list, relpath) is False
+
+    # negation may re-include files inside an excluded folder
+    assert compile_prune_patterns([".venv/**", "!.venv/a.py"]) == []
+
+
+def test_plan_walk_roots():
+    cases = [
+        ([], [""]),
+        (["**/*.py"], [""]),
+        # unanchored pattern also matches bin/README.rst
+        (["docpack/**/*.py", "README.rst"], [""]),
+        (["*/**/*.py"], [""]),
+        (["/README.rst", "/Makefile"], ["Makefile", "README.rst"]),
+        (
+            [
+                "docpack/**/*.py",
+                "docs/source/*/**/index.rst",
+                "docs/source/01-What-is-docpack/index.rst",
+                ".github/workflows/*.yml",
+                "docpack/api.py",
+                "!docpack/tests/**",
+            ],
+            [".github/workflows", "docpack", "docs/source"],
+        ),
+    ]
+    for include, expected in cases:
+        assert plan_walk_roots(include) == expected
+
+
+def _find_matching_files_by_glob(
+    dir_root,
+    include: list[str],
+    exclude: list[str],
+):
+    path_pick = PathPick.new(include=include, exclude=exclude)
+    for path in dir_root.glob("**/*.*"):
+        if path_pick.is_match(str(path.relative_to(dir_root))):
+            yield path
+
+
+def test_find_matching_files_parity():
+    dir_root = dir_tmp.joinpath("find_matching_files")
+    shutil.rmtree(dir_root, ignore_errors=True)
+    for relpath in [
+        "README.rst",
+        "Makefile",
+        "src/app.py",
+        "src/__pycache__/app.cpython-311.pyc",
+        "src/lib.d/conf.py",
+        "src/lib.d/sub/Makefile",
+        "tests/all.py",
+        "tests/test_app.py",
+        ".venv/lib/site.py",
+        ".venv/bin/python",
+        "build/lib/src/app.py",
+    ]:
+        path = dir_root.joinpath(relpath)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text("hello")
+
+    cases = [
+        ([], []),
+        (["**/*.py"], [".venv/**/*.*", "build/**", "**/__pycache__/**"]),
+        (["**/*.*"], [".venv/**", "src/*.d", "tests/**/all.py"]),
+        (["src/**", "README.rst"], ["src/lib.d/**", "!src/lib.d/conf.py"]),
+        (["src/**/*.py", "/Makefile", "tests/all.py", "build/lib/src"], []),
+        (["src/lib.d/**", "/README.rst", "/LICENSE.txt"], ["src/lib.d/sub/**"]),
+    ]
+    for include, exclude in cases:
+        expected = list(_find_matching_files_by_glob(dir_root, include, exclude))
+        result = list(find_matching_files(dir_root, include, exclude))
+        assert sorted(result) == sorted(expected)
+        result = list(find_matching_files(dir_root, include, exclude, workers=4))
+        assert result == sorted(
+            expected,
+            key=lambda path: path.relative_to(dir_root).as_posix(),
+        )
+
+    shutil.rmtree(dir_root, ignore_errors=True)
+
+
+def test_find_matching_files_in_git_index():
+    include = ["docpack/**/*.py", "tests/**/*.py", "README.rst", "Makefile"]
+    exclude = ["docpack/vendor/**"]
+    path_list = list(
+        find_matching_files_in_git_index(
+            dir_repo=dir_project_root,
+            include=include,
+            exclude=exclude,
+        )
+    )
+    relpath_list = [path.relative_to(dir_project_root).as_posix() for path in path_list]
+    assert relpath_list == sorted(relpath_list)
+    assert "docpack/api.py" in relpath_list
+    assert "README.rst" in relpath_list
+    # same candidate rule as find_matching_files, file name must have a dot
+    assert "Makefile" not in relpath_list
+
+    tracked_set = set(list_tracked_files(dir_project_root))
+    expected = sorted(
+        path.relative_to(dir_project_root).as_posix()
+        for path in find_matching_files(dir_project_root, include, exclude)
+        if path.relative_to(dir_project_root).as_posix() in tracked_set
+    )
+    assert relpath_list == expected
+
+
 if __name__ == "__main__":
     from docpack.tests import run_cov_test
 
@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+
+import shutil
+import subprocess
+
+from docpack.paths import dir_project_root, dir_tmp
+import pytest
+
+from docpack.git_utils import (
+    run_git,
+    list_tracked_files,
+    list_tree_blobs,
+    diff_blobs,
+    read_object_sizes,
+    GitCatFile,
+)
+
+
+def test_list_tracked_files():
+    path_list = list_tracked_files(dir_project_root)
+    assert "docpack/api.py" in path_list
+    assert "pyproject.toml" in path_list
+    assert len(path_list) == len(set(path_list))
+    assert not any(path.startswith(".git/") for path in path_list)
+
+    path_list = list_tracked_files(dir_project_root.joinpath("docpack"))
+    assert "api.py" in path_list
+
+
+def test_list_tree_blobs_and_git_cat_file():
+    blob_list = list_tree_blobs(dir_project_root, "HEAD")
+    blob_mapping = dict(blob_list)
+    assert "docpack/api.py" in blob_mapping
+    assert [path for path, _ in blob_list] == sorted(blob_mapping)
+
+    with GitCatFile(dir_repo=dir_project_root) as git_cat_file:
+        content_by_sha = git_cat_file.read(blob_mapping["pyproject.toml"])
+        content_by_path = git_cat_file.read("HEAD:pyproject.toml")
+        assert content_by_sha == content_by_path
+        assert b"[project]" in content_by_sha
+        with pytest.raises(KeyError):
+            git_cat_file.read("HEAD:this-file-does-not-exist.txt")
+        # the process is still usable after a missing object
+        assert git_cat_file.read(blob_mapping["docpack/api.py"]).startswith(b"#")
+    assert git_cat_file.process.poll() is not None
+
+    assert (
+        read_object_sizes(
+            dir_project_root, [blob_mapping["pyproject.toml"], "HEAD:pyproject.toml"]
+        )
+        == [len(content_by_sha)] * 2
+    )
+    assert read_object_sizes(dir_project_root, []) == []
+    with pytest.raises(KeyError):
+        read_object_sizes(dir_project_root, ["HEAD:this-file-does-not-exist.txt"])
+
+
+def git_commit(dir_repo, message: str) -> str:
+    subprocess.run(["git", "add", "-A"], cwd=dir_repo, check=True)
+    subprocess.run(
+        ["git", "-c", "user.name=test", "-c", "user.email=test@example.com"]
+        + ["commit", "-q", "--allow-empty", "-m", message],
+        cwd=dir_repo,
+        check=True,
+    )
+    return run_git(dir_repo, ["rev-parse", "HEAD"]).decode("ascii").strip()
+
+
+def test_diff_blobs():
+    dir_repo = dir_tmp.joinpath("diff_blobs")
+    shutil.rmtree(dir_repo, ignore_errors=True)
+    dir_repo.joinpath("docs").mkdir(parents=True)
+    subprocess.run(["git", "init", "-q"], cwd=dir_repo, check=True)
+    for name in ["a.md", "b.md", "c.md", "d.md"]:
+        dir_repo.joinpath("docs", name).write_text(f"# {name}\n" * 10)
+    old_ref = git_commit(dir_repo, "v1")
+
+    dir_repo.joinpath("docs", "b.md").write_text("# b.md v2")
+    dir_repo.joinpath("docs", "c.md").unlink()
+    dir_repo.joinpath("docs", "a.md").rename(dir_repo.joinpath("docs", "z.md"))
+    dir_repo.joinpath("docs", "e.md").write_text("# e.md")
+    dir_repo.joinpath("docs", "d.md").unlink()
+    dir_repo.joinpath("docs", "d.md").symlink_to("e.md")
+    new_ref = git_commit(dir_repo, "v2")
+
+    changed_list, deleted_list = diff_blobs(dir_repo, old_ref, new_ref)
+    blob_mapping = dict(list_tree_blobs(dir_repo, new_ref))
+    assert changed_list == [
+        ("M", "docs/b.md", blob_mapping["docs/b.md"]),
+        ("A", "docs/e.md", blob_mapping["docs/e.md"]),
+        ("A", "docs/z.md", blob_mapping["docs/z.md"]),
+    ]
+    assert deleted_list == ["docs/a.md", "docs/c.md", "docs/d.md"]
+
+    # reversed, the symlink replaced by a regular file is added
+    changed_list, deleted_list = diff_blobs(dir_repo, new_ref, old_ref)
+    assert [(status, relpath) for status, relpath, _ in changed_list] == [
+        ("A", "docs/a.md"),
+        ("M", "docs/b.md"),
+        ("A", "docs/c.md"),
+        ("A", "docs/d.md"),
+    ]
+    assert deleted_list == ["docs/e.md", "docs/z.md"]
+
+    # relative to a sub directory
+    changed_list, deleted_list = diff_blobs(dir_repo.joinpath("docs"), old_ref, new_ref)
+    assert deleted_list == ["a.md", "c.md", "d.md"]
+
+    assert diff_blobs(dir_repo, new_ref, new_ref) == ([], [])
+    shutil.rmtree(dir_repo, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    from docpack.tests import run_cov_test
+
+    run_cov_test(
+        __file__,
+        "docpack.git_utils",
+        preview=False,
+    )
@@ -2,15 +2,21 @@
 
 from docpack.github_fetcher import (
     extract_domain,
+    new_github_file,
+    GitHubFileRecord,
+    find_matching_github_files_from_cloned_folder,
+    iter_matching_github_files_from_cloned_folder,
     GitHubPipeline,
 )
+import os
 import shutil
+import subprocess
 from docpack.paths import (
     dir_project_root,
     dir_tmp,
     PACKAGE_NAME,
 )
-from docpack.constants import GitHubFileFieldEnum
+from docpack.constants import GitHubFileFieldEnum, GitHubFileSourceEnum
 
 
 def test_extract_domain():
@@ -40,6 +46,47 @@ def test_extract_domain():
         assert extract_domain(url) == expected_domain
 
 
+def test_github_file_record():
+    kwargs = dict(
+        domain="github.com",
+        account="MacHu-GWU",
+        repo="docpack-project",
+        branch="main",
+        path_parts=("docs", "source", "index.rst"),
+        content="hello",
+    )
+    github_file = new_github_file(**kwargs)
+    github_file_record = GitHubFileRecord(**kwargs)
+    for attr in ["path", "breadcrumb_path", "uri_hash", "github_url"]:
+        assert getattr(github_file_record, attr) == getattr(github_file, attr)
+    assert github_file_record.to_xml() == github_file.to_xml()
+    wanted_fields = [GitHubFileFieldEnum.path.value, GitHubFileFieldEnum.content.value]
+    assert github_file_record.to_xml(wanted_fields) == github_file.to_xml(wanted_fields)
+    assert github_file_record.get_path_out(dir_tmp) == github_file.get_path_out(dir_tmp)
+    assert github_file_record.to_github_file() == github_file
+    assert not hasattr(github_file_record, "__dict__")
+
+
+def test_iter_matching_github_files_from_cloned_folder():
+    kwargs = dict(
+        domain="github.com",
+        account="MacHu-GWU",
+        repo="docpack-project",
+        branch="main",
+        dir_repo=dir_project_root,
+        include=[f"{PACKAGE_NAME}/**/*.py"],
+        exclude=[f"{PACKAGE_NAME}/vendor/**"],
+    )
+    github_file_iterator = iter_matching_github_files_from_cloned_folder(**kwargs)
+    github_file = next(github_file_iterator)
+    assert github_file.path == f"{PACKAGE_NAME}/__init__.py"
+    github_file_list = [github_file, *github_file_iterator]
+    assert [github_file.path for github_file in github_file_list] == sorted(
+        github_file.path for github_file in github_file_list
+    )
+    assert github_file_list == find_matching_github_files_from_cloned_folder(**kwargs)
+
+
 class TestGitHubPipeline:
     def test_fetch(self):
         shutil.rmtree(dir_tmp, ignore_errors=True)
@@ -68,6 +115,218 @@ class TestGitHubPipeline:
         )
         assert gh_pipeline.domain == "github.com"
         gh_pipeline.fetch()
+        path_set_from_filesystem = set(dir_tmp.glob("*.xml"))
+
+        # untracked files are not exported in git_index mode
+        shutil.rmtree(dir_tmp, ignore_errors=True)
+        gh_pipeline.source = GitHubFileSourceEnum.git_index.value
+        gh_pipeline.fetch()
+        path_set_from_git_index = set(dir_tmp.glob("*.xml"))
+        assert len(path_set_from_git_index)
+        assert path_set_from_git_index.issubset(path_set_from_filesystem)
+
+        # read the committed version straight from the git object database
+        shutil.rmtree(dir_tmp, ignore_errors=True)
+        gh_pipeline.source = GitHubFileSourceEnum.git_object.value
+        gh_pipeline.ref = "HEAD"
+        gh_pipeline.fetch()
+        path_set_from_git_object = set(dir_tmp.glob("*.xml"))
+        assert len(path_set_from_git_object)
+        assert path_set_from_git_object.issubset(path_set_from_filesystem)
+
+    def test_fetch_in_parallel(self):
+        class MyGitHubPipeline(GitHubPipeline):
+            hook_calls: list[tuple[str, str]] = []
+
+            def post_process_github_file(self, github_file):
+                self.hook_calls.append(("github_file", github_file.path))
+                github_file.title = github_file.path_parts[-1]
+                return github_file
+
+            def post_process_path_out(self, github_file, path_out):
+                self.hook_calls.append(("path_out", github_file.path))
+
+        dir_root = dir_tmp.joinpath("fetch_in_parallel")
+        shutil.rmtree(dir_root, ignore_errors=True)
+        for source in [
+            GitHubFileSourceEnum.filesystem.value,
+            GitHubFileSourceEnum.git_object.value,
+        ]:
+            output_list = list()
+            for max_workers in [None, 4]:
+                dir_out = dir_root.joinpath(f"{source}-{max_workers}")
+                gh_pipeline = MyGitHubPipeline(
+                    domain="github.com",
+                    account="MacHu-GWU",
+                    repo="docpack-project",
+                    branch="main",
+                    dir_repo=dir_project_root,
+                    include=[f"{PACKAGE_NAME}/**/*.py", "tests/**/*.py"],
+                    exclude=[f"{PACKAGE_NAME}/vendor/**"],
+                    dir_out=dir_out,
+                    source=source,
+                    ref="HEAD",
+                    max_workers=max_workers,
+                    hook_calls=[],
+                )
+                sync_summary = gh_pipeline.fetch()
+                assert len(sync_summary.added) > 10
+                assert sync_summary.added == sorted(sync_summary.added)
+                for hook in ["github_file", "path_out"]:
+                    path_list = [
+                        path for name, path in gh_pipeline.hook_calls if name == hook
+                    ]
+                    assert path_list == sync_summary.added
+                output = {
+                    path.name: path.read_bytes() for path in dir_out.glob("*.xml")
+                }
+                assert len(output) == len(sync_summary.added)
+                output_list.append(output)
+            assert output_list[0] == output_list[1]
+        shutil.rmtree(dir_root, ignore_errors=True)
+
+    def test_fetch_incremental(self):
+        dir_root = dir_tmp.joinpath("fetch_incremental")
+        dir_repo = dir_root.joinpath("repo")
+        dir_out = dir_root.joinpath("out")
+        shutil.rmtree(dir_root, ignore_errors=True)
+        dir_repo.joinpath("docs").mkdir(parents=True)
+        for name in ["a.md", "b.md", "c.md", "d.md"]:
+            dir_repo.joinpath("docs", name).write_text(f"# {name}")
+
+        gh_pipeline = GitHubPipeline(
+            domain="github.com",
+            account="MacHu-GWU",
+            repo="docpack-project",
+            branch="main",
+            dir_repo=dir_repo,
+            include=["docs/**/*.md"],
+            exclude=[],
+            dir_out=dir_out,
+            incremental=True,
+        )
+        sync_summary = gh_pipeline.fetch()
+        assert sync_summary.added == [
+            f"docs/{name}" for name in ["a.md", "b.md", "c.md", "d.md"]
+        ]
+        assert sync_summary.n_changed == 4
+
+        sync_summary = gh_pipeline.fetch()
+        assert sync_summary.n_changed == 0
+        assert len(sync_summary.unchanged) == 4
+
+        # b.md is modified, c.md is touched only, d.md is deleted, e.md is added
+        dir_repo.joinpath("docs", "b.md").write_text("# b.md v2")
+        stat = dir_repo.joinpath("docs", "c.md").stat()
+        os.utime(
+            dir_repo.joinpath("docs", "c.md"),
+            ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000),
+        )
+        dir_repo.joinpath("docs", "d.md").unlink()
+        dir_repo.joinpath("docs", "e.md").write_text("# e.md")
+        sync_summary = gh_pipeline.fetch()
+        assert sync_summary.added == ["docs/e.md"]
+        assert sync_summary.modified == ["docs/b.md"]
+        assert sync_summary.deleted == ["docs/d.md"]
+        assert sync_summary.unchanged == ["docs/a.md", "docs/c.md"]
+        incremental_output = {
+            path.name: path.read_bytes() for path in dir_out.glob("*.xml")
+        }
+
+        # the result is the same as a full export
+        for path in dir_out.glob("*.xml"):
+            path.unlink()
+        gh_pipeline.incremental = False
+        sync_summary = gh_pipeline.fetch()
+        assert len(sync_summary.added) == 4
+        full_output = {path.name: path.read_bytes() for path in dir_out.glob("*.xml")}
+        assert incremental_output == full_output
+
+        # output files written by someone else are exported again
+        gh_pipeline.incremental = True
+        sync_summary = gh_pipeline.fetch()
+        assert len(sync_summary.modified) == 4
+
+        # wanted_fields change the output of every file
+        gh_pipeline.wanted_fields = [GitHubFileFieldEnum.content.value]
+        sync_summary = gh_pipeline.fetch()
+        assert len(sync_summary.modified) == 4
+
+        shutil.rmtree(dir_root, ignore_errors=True)
+
+    def test_fetch_delta(self):
+        dir_root = dir_tmp.joinpath("fetch_delta")
+        dir_repo = dir_root.joinpath("repo")
+        dir_out = dir_root.joinpath("out")
+        dir_out_full = dir_root.joinpath("out_full")
+        shutil.rmtree(dir_root, ignore_errors=True)
+        dir_repo.joinpath("docs").mkdir(parents=True)
+        subprocess.run(["git", "init", "-q"], cwd=dir_repo, check=True)
+
+        def git_commit() -> str:
+            subprocess.run(["git", "add", "-A"], cwd=dir_repo, check=True)
+            subprocess.run(
+                ["git", "-c", "user.name=test", "-c", "user.email=test@example.com"]
+                + ["commit", "-q", "-m", "commit"],
+                cwd=dir_repo,
+                check=True,
+            )
+            res = subprocess.run(
+                ["git", "rev-parse", "HEAD"],
+                cwd=dir_repo,
+                capture_output=True,
+                check=True,
+            )
+            return res.stdout.decode("ascii").strip()
+
+        for name in ["a.md", "b.md", "c.md", "d.md", "x.txt"]:
+            dir_repo.joinpath("docs", name).write_text(f"# {name}\n" * 10)
+        old_ref = git_commit()
+
+        kwargs = dict(
+            domain="github.com",
+            account="MacHu-GWU",
+            repo="docpack-project",
+            branch="main",
+            dir_repo=dir_repo,
+            include=["docs/**/*.md"],
+            exclude=["docs/d.md"],
+            source=GitHubFileSourceEnum.git_object.value,
+        )
+        gh_pipeline = GitHubPipeline(dir_out=dir_out, ref=old_ref, **kwargs)
+        gh_pipeline.fetch()
+        assert len(list(dir_out.glob("*.xml"))) == 3
+
+        # b.md is modified, c.md is deleted, a.md is renamed to z.md,
+        # e.md is added, the changes of d.md and x.txt are excluded
+        dir_repo.joinpath("docs", "b.md").write_text("# b.md v2")
+        dir_repo.joinpath("docs", "c.md").unlink()
+        dir_repo.joinpath("docs", "a.md").rename(dir_repo.joinpath("docs", "z.md"))
+        dir_repo.joinpath("docs", "e.md").write_text("# e.md")
+        dir_repo.joinpath("docs", "d.md").write_text("# d.md v2")
+        dir_repo.joinpath("docs", "x.txt").write_text("# x.txt v2")
+        new_ref = git_commit()
+        # uncommitted changes in the working tree do not matter
+        dir_repo.joinpath("docs", "e.md").write_text("# e.md uncommitted")
+
+        sync_summary = gh_pipeline.fetch_delta(old_ref=old_ref, new_ref=new_ref)
+        assert sync_summary.added == ["docs/e.md", "docs/z.md"]
+        assert sync_summary.modified == ["docs/b.md"]
+        assert sync_summary.deleted == ["docs/a.md", "docs/c.md"]
+        delta_output = {path.name: path.read_bytes() for path in dir_out.glob("*.xml")}
+
+        # the result is the same as a full export of the new commit
+        gh_pipeline = GitHubPipeline(dir_out=dir_out_full, ref=new_ref, **kwargs)
+        gh_pipeline.fetch()
+        full_output = {
+            path.name: path.read_bytes() for path in dir_out_full.glob("*.xml")
+        }
+        assert delta_output == full_output
+
+        sync_summary = gh_pipeline.fetch_delta(old_ref=new_ref, new_ref=new_ref)
+        assert sync_summary.n_changed == 0
+
+        shutil.rmtree(dir_root, ignore_errors=True)
 
 
 if __name__ == "__main__":
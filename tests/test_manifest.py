@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+
+import shutil
+
+from docpack.paths import dir_tmp
+from docpack.manifest import (
+    MANIFEST_FILENAME,
+    get_fingerprint,
+    Manifest,
+)
+
+
+def test_manifest():
+    dir_out = dir_tmp.joinpath("manifest")
+    shutil.rmtree(dir_out, ignore_errors=True)
+    fingerprint = get_fingerprint(wanted_fields=None)
+    assert fingerprint != get_fingerprint(wanted_fields=["content"])
+
+    # no manifest yet
+    manifest = Manifest.read(dir_out=dir_out, fingerprint=fingerprint)
+    assert manifest.entries == {}
+
+    dir_out.mkdir(parents=True)
+    path_out = dir_out.joinpath("a.xml")
+    path_out.write_text("hello")
+    manifest.new_entry(key="a.md", content_hash="abc", path_out=path_out, size=1)
+    manifest.write(dir_out)
+
+    manifest = Manifest.read(dir_out=dir_out, fingerprint=fingerprint)
+    entry = manifest.entries["a.md"]
+    assert entry.content_hash == "abc"
+    assert entry.output == "a.xml"
+    assert entry.is_output_intact(dir_out) is True
+    path_out.write_text("hello world")
+    assert entry.is_output_intact(dir_out) is False
+
+    # a different fingerprint keeps the outputs, but invalidates the content hash
+    manifest = Manifest.read(dir_out=dir_out, fingerprint="other")
+    assert manifest.entries["a.md"].output == "a.xml"
+    assert manifest.entries["a.md"].content_hash == ""
+
+    # a broken manifest is ignored
+    dir_out.joinpath(MANIFEST_FILENAME).write_text("not json")
+    assert Manifest.read(dir_out=dir_out, fingerprint=fingerprint).entries == {}
+
+    shutil.rmtree(dir_out, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    from docpack.tests import run_cov_test
+
+    run_cov_test(
+        __file__,
+        "docpack.manifest",
+        preview=False,
+    )
@@ -0,0 +1,179 @@
+# -*- coding: utf-8 -*-
+
+import json
+import random
+import shutil
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+import pyatlassian.api as pyatlassian
+
+from docpack.paths import dir_tmp
+from docpack.near_dedup import get_optimal_bands, MinHashLSH
+from docpack.github_fetcher import GitHubPipeline
+from docpack.confluence_fetcher import ConfluencePage, ConfluencePipeline
+
+dir_root = dir_tmp.joinpath("near_dedup")
+
+random.seed(1)
+vocab = [f"word{i}" for i in range(2000)]
+
+
+def new_text(n_word: int = 300) -> str:
+    return " ".join(random.choices(vocab, k=n_word))
+
+
+def edit_text(text: str, n_edit: int) -> str:
+    words = text.split()
+    for _ in range(n_edit):
+        words[random.randrange(len(words))] = random.choice(vocab)
+    return " ".join(words)
+
+
+def test_get_optimal_bands():
+    for threshold in [0.5, 0.8, 0.9]:
+        b, r = get_optimal_bands(threshold, 128)
+        assert b * r <= 128
+        # likely to be a candidate above the threshold, unlikely far below it
+        assert 1 - (1 - (threshold + 0.1) ** r) ** b > 0.9
+        assert 1 - (1 - (threshold - 0.3) ** r) ** b < 0.1
+    # a higher threshold needs more rows per band
+    assert get_optimal_bands(0.9, 128)[1] > get_optimal_bands(0.5, 128)[1]
+
+
+def test_get_signature():
+    lsh = MinHashLSH(shingle_size=3)
+    assert lsh.get_signature("") is None
+    assert lsh.get_signature("...") is None
+    assert len(lsh.get_shingle_hashes("a b")) == 1
+    assert len(lsh.get_shingle_hashes("a b c d")) == 2
+    # case and punctuation do not matter
+    assert np.array_equal(
+        lsh.get_signature("Hello, World! foo"),
+        lsh.get_signature("hello world foo"),
+    )
+    # the estimated similarity is close to the Jaccard similarity of the shingles
+    text1 = new_text()
+    text2 = edit_text(text1, 10)
+    set1 = set(lsh.get_shingle_hashes(text1).tolist())
+    set2 = set(lsh.get_shingle_hashes(text2).tolist())
+    jaccard = len(set1 & set2) / len(set1 | set2)
+    lsh = MinHashLSH(shingle_size=3, num_perm=1024)
+    signature1 = lsh.get_signature(text1)
+    signature2 = lsh.get_signature(text2)
+    assert abs(float((signature1 == signature2).mean()) - jaccard) < 0.05
+
+
+def test_add():
+    lsh = MinHashLSH(threshold=0.8)
+    base_list = [new_text() for _ in range(20)]
+    for i, text in enumerate(base_list):
+        assert lsh.add(f"base-{i}", text) is None
+    assert len(lsh) == 20
+    for i, text in enumerate(base_list):
+        assert lsh.add(f"copy-{i}", text) == f"base-{i}"
+        assert lsh.add(f"edit-{i}", edit_text(text, 2)) == f"base-{i}"
+        assert lsh.add(f"rewrite-{i}", edit_text(text, 150)) is None
+    assert len(lsh) == 40
+    # no word, always kept
+    assert lsh.add("empty-1", "") is None
+    assert lsh.add("empty-2", "") is None
+    assert len(lsh) == 40
+
+
+def test_github_pipeline():
+    shutil.rmtree(dir_root, ignore_errors=True)
+    dir_repo = dir_root.joinpath("repo")
+    template = new_text(1000)
+    for i in range(5):
+        path = dir_repo.joinpath("docs", f"meeting-{i}.md")
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(edit_text(template, 1), encoding="utf-8")
+    dir_repo.joinpath("docs", "design.md").write_text(new_text(), encoding="utf-8")
+    dir_repo.joinpath("docs", "empty.md").write_text("", encoding="utf-8")
+    for max_workers in [None, 2]:
+        gh_pipeline = GitHubPipeline(
+            domain="github.com",
+            account="MacHu-GWU",
+            repo="docpack-project",
+            branch="main",
+            dir_repo=dir_repo,
+            include=["docs/*.md"],
+            exclude=[],
+            dir_out=dir_root.joinpath(f"out-{max_workers}"),
+            max_workers=max_workers,
+            minhash_lsh=MinHashLSH(),
+        )
+        sync_summary = gh_pipeline.fetch()
+        assert sync_summary.added == [
+            "docs/design.md",
+            "docs/empty.md",
+            "docs/meeting-0.md",
+        ]
+        assert sync_summary.near_duplicated == [
+            f"docs/meeting-{i}.md" for i in range(1, 5)
+        ]
+        assert len(list(gh_pipeline.dir_out.iterdir())) == 3
+
+    with pytest.raises(ValueError):
+        gh_pipeline.fetch_incremental()
+
+
+def test_confluence_pipeline():
+    shutil.rmtree(dir_root, ignore_errors=True)
+    template = new_text(1000)
+    page_list = list()
+    for i, page_id in enumerate(["1", "2", "3", "4"]):
+        text = new_text() if page_id == "3" else edit_text(template, 1)
+        atlas_doc = {
+            "type": "doc",
+            "version": 1,
+            "content": [
+                {"type": "paragraph", "content": [{"type": "text", "text": text}]}
+            ],
+        }
+        page = ConfluencePage(
+            page_data={
+                "id": page_id,
+                "title": "Meeting notes",
+                "body": {"atlas_doc_format": {"value": json.dumps(atlas_doc)}},
+                "_links": {"webui": f"/spaces/UT/pages/{page_id}"},
+            },
+            site_url="https://example.atlassian.net",
+            id_path=f"/{page_id}",
+            position_path=f"/{i}",
+            breadcrumb_path=f"|| Page {page_id}",
+        )
+        page_list.append(page)
+    confluence_pipeline = ConfluencePipeline(
+        confluence=pyatlassian.confluence.Confluence(
+            url="https://example.atlassian.net",
+            username="user",
+            password="password",
+        ),
+        space_id=1,
+        include=[],
+        exclude=[],
+        dir_out=dir_root.joinpath("confluence"),
+        cache_key="test",
+        minhash_lsh=MinHashLSH(),
+    )
+    sync_summary = confluence_pipeline.export_pages(page_list)
+    assert sync_summary.added == ["1", "3"]
+    assert sync_summary.near_duplicated == ["2", "4"]
+    assert sorted(path.name for path in confluence_pipeline.dir_out.iterdir()) == [
+        "Page 1.xml",
+        "Page 3.xml",
+    ]
+
+
+if __name__ == "__main__":
+    from docpack.tests import run_cov_test
+
+    run_cov_test(
+        __file__,
+        "docpack.near_dedup",
+        preview=False,
+    )
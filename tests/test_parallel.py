@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+
+import time
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from docpack.parallel import imap_ordered
+
+
+def test_imap_ordered():
+    lock = threading.Lock()
+    state = {"pending": 0, "max_pending": 0}
+
+    def func(i: int) -> int:
+        time.sleep(random.random() / 1000)
+        return i * i
+
+    def iterable():
+        for i in range(100):
+            with lock:
+                state["pending"] += 1
+                state["max_pending"] = max(state["max_pending"], state["pending"])
+            yield i
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        result = list()
+        for value in imap_ordered(func, iterable(), executor, window=8):
+            with lock:
+                state["pending"] -= 1
+            result.append(value)
+    assert result == [i * i for i in range(100)]
+    assert state["max_pending"] <= 8
+
+    def fail(i: int) -> int:
+        if i == 3:
+            raise ValueError(i)
+        return i
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        result = list()
+        with pytest.raises(ValueError):
+            for value in imap_ordered(fail, range(10), executor, window=8):
+                result.append(value)
+    assert result == [0, 1, 2]
+
+
+if __name__ == "__main__":
+    from docpack.tests import run_cov_test
+
+    run_cov_test(
+        __file__,
+        "docpack.parallel",
+        preview=False,
+    )
@@ -0,0 +1,241 @@
+# -*- coding: utf-8 -*-
+
+import gzip
+import json
+import shutil
+
+import pyatlassian.api as pyatlassian
+from diskcache import Cache
+
+from docpack.paths import dir_project_root, dir_tmp, PACKAGE_NAME
+from docpack.constants import GitHubFileSourceEnum
+from docpack.plan import PlanItem, Plan, count_bundle_shards
+from docpack.github_fetcher import GitHubPipeline
+from docpack.confluence_fetcher import (
+    estimate_markdown_size,
+    get_page_hierarchy_cache_key,
+    ConfluencePage,
+    ConfluencePipeline,
+)
+from docpack.bundle import BundleReader
+
+dir_root = dir_tmp.joinpath("plan")
+
+
+def new_item(n_bytes: int, n_tokens: int) -> PlanItem:
+    return PlanItem(key="a", url="url", n_bytes=n_bytes, n_tokens=n_tokens)
+
+
+def test_count_bundle_shards():
+    item_list = [new_item(100, 25), new_item(100, 25), new_item(300, 75)]
+    assert count_bundle_shards(item_list) == 1
+    assert count_bundle_shards([]) == 1
+    assert count_bundle_shards([], max_bytes=100) == 0
+    assert count_bundle_shards(item_list, max_bytes=201) == 2
+    assert count_bundle_shards(item_list, max_bytes=200) == 3
+    # a document larger than the limit gets a shard of its own
+    assert count_bundle_shards(item_list, max_bytes=10) == 3
+    assert count_bundle_shards(item_list, max_tokens=50) == 2
+
+    plan = Plan(items=item_list, n_file_to_write=3)
+    assert plan.n_document == 3
+    assert plan.n_bytes == 500
+    assert plan.n_tokens == 125
+    assert "3 documents" in plan.to_text()
+
+    # the documents of unknown size count as empty
+    assert count_bundle_shards(item_list, max_tokens=100) == 2
+    item_list.append(PlanItem(key="b", url="url"))
+    assert count_bundle_shards(item_list, max_tokens=100) == 2
+    plan = Plan(items=item_list)
+    assert plan.n_unknown == 1
+    assert plan.n_bytes == 500
+    assert plan.n_tokens == 125
+    assert "1 of unknown size" in plan.to_text()
+
+
+def make_repo():
+    dir_repo = dir_root.joinpath("repo")
+    for relpath, size in [
+        ("README.rst", 400),
+        ("docs/a.rst", 800),
+        ("docs/b.rst", 800),
+        ("src/big.py", 4000),
+        ("src/small.py", 400),
+    ]:
+        path = dir_repo.joinpath(relpath)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text("x" * size, encoding="utf-8")
+    return dir_repo
+
+
+def test_github_pipeline():
+    shutil.rmtree(dir_root, ignore_errors=True)
+    dir_repo = make_repo()
+    gh_pipeline = GitHubPipeline(
+        domain="github.com",
+        account="MacHu-GWU",
+        repo="docpack-project",
+        branch="main",
+        dir_repo=dir_repo,
+        include=["src/**/*.py", "docs/**/*.rst", "README.rst"],
+        exclude=[],
+        dir_out=dir_root.joinpath("github", "docs"),
+        path_bundle=dir_root.joinpath("github", "knowledge_base.txt"),
+        max_bundle_tokens=300,
+        token_budget=700,
+        include_weights={"README.rst": 10, "docs/a.rst": 5},
+    )
+    plan = gh_pipeline.plan()
+    assert plan.n_api_call == 0
+    # the plan is the same as the fetch, without reading the files
+    sync_summary = gh_pipeline.fetch()
+    assert [item.key for item in plan.items] == sync_summary.added
+    assert plan.over_budget == sync_summary.over_budget
+    assert plan.n_tokens == sync_summary.n_tokens
+    # 5 files read to count the tokens, the 3 exported ones are not read again
+    assert plan.n_body_download == 5
+    for item in plan.items:
+        path_out = next(gh_pipeline.dir_out.glob(f"*{item.key.split('/')[-1]}*"))
+        assert item.n_bytes == path_out.stat().st_size
+        assert item.size == dir_repo.joinpath(item.key).stat().st_size
+    with BundleReader(gh_pipeline.path_bundle) as bundle_reader:
+        n_shard = len(bundle_reader.index.shards)
+    # 3 documents, the shards and the index
+    assert n_shard > 1
+    assert plan.n_file_to_write == 3 + n_shard + 1
+
+    gh_pipeline.wanted_fields = ["github_url", "path"]
+    gh_pipeline.export_documents = False
+    gh_pipeline.token_budget = None
+    plan = gh_pipeline.plan()
+    assert plan.n_document == 5
+    assert plan.n_body_download == 5
+    assert plan.n_file_to_write == 2
+    assert all(item.n_bytes < 200 for item in plan.items)
+
+
+def test_github_pipeline_git_object():
+    gh_pipeline = GitHubPipeline(
+        domain="github.com",
+        account="MacHu-GWU",
+        repo="docpack-project",
+        branch="main",
+        dir_repo=dir_project_root,
+        include=[f"{PACKAGE_NAME}/**/*.py"],
+        exclude=[f"{PACKAGE_NAME}/vendor/**"],
+        dir_out=dir_root.joinpath("git_object"),
+        source=GitHubFileSourceEnum.git_object.value,
+        ref="HEAD",
+    )
+    plan = gh_pipeline.plan()
+    assert plan.n_document > 10
+    assert plan.n_file_to_write == plan.n_document
+    item = next(item for item in plan.items if item.key == f"{PACKAGE_NAME}/api.py")
+    assert item.size > 0
+    assert item.n_bytes > item.size
+
+
+def make_page(page_id: str, i: int, text: str, id_path: str) -> ConfluencePage:
+    atlas_doc = {
+        "type": "doc",
+        "version": 1,
+        "content": [{"type": "paragraph", "content": [{"type": "text", "text": text}]}],
+    }
+    return ConfluencePage(
+        page_data={
+            "id": page_id,
+            "title": f"Page {page_id}",
+            "body": {"atlas_doc_format": {"value": json.dumps(atlas_doc)}},
+            "_links": {"webui": f"/spaces/UT/pages/{page_id}"},
+        },
+        site_url="https://example.atlassian.net",
+        id_path=id_path,
+        position_path=f"/{i}",
+        breadcrumb_path=f"|| Page {page_id}",
+    )
+
+
+def test_estimate_markdown_size():
+    page = make_page("1", 0, "hello world " * 100, "/1")
+    n_markdown = len(f"# {page.title}\n") + estimate_markdown_size(page.atlas_doc)
+    assert abs(n_markdown - len(page.markdown)) <= 5
+
+
+def test_confluence_pipeline():
+    shutil.rmtree(dir_root, ignore_errors=True)
+    page_list = [
+        make_page("1", 0, "x" * 400, "/1"),
+        make_page("2", 1, "x" * 400, "/1/2"),
+        make_page("3", 2, "x" * 2000, "/1/3"),
+        make_page("4", 3, "x" * 400, "/4"),
+    ]
+    confluence_pipeline = ConfluencePipeline(
+        confluence=pyatlassian.confluence.Confluence(
+            url="https://example.atlassian.net",
+            username="user",
+            password="password",
+        ),
+        space_id=1,
+        include=["4", "1/*"],
+        exclude=["3"],
+        dir_out=dir_root.joinpath("confluence", "docs"),
+        cache_key="test",
+        cache_path=str(dir_root.joinpath("cache")),
+        path_bundle=dir_root.joinpath("confluence", "knowledge_base.txt"),
+    )
+    # the hierarchy is already cached, no API call
+    with Cache(confluence_pipeline.cache_path) as cache:
+        real_cache_key = get_page_hierarchy_cache_key(
+            confluence=confluence_pipeline.confluence,
+            space_id=1,
+            cache_key="test",
+        )
+        data = [page.model_dump() for page in page_list]
+        cache.set(real_cache_key, gzip.compress(json.dumps(data).encode("utf-8")))
+
+    plan = confluence_pipeline.plan()
+    assert [item.key for item in plan.items] == ["1", "2", "4"]
+    assert plan.n_api_call == 0
+    assert plan.n_body_download == 0
+    assert plan.n_file_to_write == 3 + 2
+    for item, page in zip(plan.items, [page_list[0], page_list[1], page_list[3]]):
+        n_bytes = len(page.to_xml().encode("utf-8"))
+        assert abs(item.n_bytes - n_bytes) <= 5
+        assert item.size == len(page.page_data["body"]["atlas_doc_format"]["value"])
+
+    confluence_pipeline.token_budget = 400
+    confluence_pipeline.include_weights = {"2": 1}
+    plan = confluence_pipeline.plan()
+    assert [item.key for item in plan.items] == ["2", "4"]
+    assert plan.over_budget == ["1"]
+
+    # metadata only hierarchy, the bodies were not downloaded
+    with Cache(confluence_pipeline.cache_path) as cache:
+        data = [page.model_dump() for page in page_list]
+        for page_data in data:
+            page_data["page_data"].pop("body")
+        cache.set(real_cache_key, gzip.compress(json.dumps(data).encode("utf-8")))
+    plan = confluence_pipeline.plan()
+    # the budget can not be split without the sizes
+    assert [item.key for item in plan.items] == ["1", "2", "4"]
+    assert plan.over_budget == []
+    assert plan.n_unknown == 3
+    assert plan.n_tokens == 0
+    assert all(item.size is None for item in plan.items)
+    assert all(item.n_bytes is None for item in plan.items)
+    # without the markdown, the size only depends on the metadata
+    confluence_pipeline.wanted_fields = ["source_type", "confluence_url", "title"]
+    plan = confluence_pipeline.plan()
+    assert plan.n_unknown == 0
+    assert all(item.n_tokens > 0 for item in plan.items)
+
+
+if __name__ == "__main__":
+    from docpack.tests import run_cov_test
+
+    run_cov_test(
+        __file__,
+        "docpack.plan",
+        preview=False,
+    )
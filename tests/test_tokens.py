@@ -0,0 +1,247 @@
+# -*- coding: utf-8 -*-
+
+import json
+import shutil
+
+import pytest
+
+import pyatlassian.api as pyatlassian
+
+from docpack.paths import dir_tmp
+from docpack.tokens import estimate_tokens, TokenCounter, pack_by_budget
+from docpack.github_fetcher import GitHubFileRecord, GitHubPipeline
+from docpack.confluence_fetcher import (
+    ConfluencePage,
+    PageHierarchy,
+    ConfluencePipeline,
+)
+from docpack.bundle import BundleReader
+from docpack.manifest import SyncSummary
+
+dir_root = dir_tmp.joinpath("tokens")
+
+
+def test_estimate_tokens():
+    assert estimate_tokens("") == 0
+    assert estimate_tokens("abc") == 1
+    assert estimate_tokens("abcde") == 2
+
+
+def test_token_counter():
+    shutil.rmtree(dir_root, ignore_errors=True)
+    n_call = list()
+
+    def count_words(text: str) -> int:
+        n_call.append(text)
+        return len(text.split())
+
+    cache_path = str(dir_root.joinpath("cache"))
+    token_counter = TokenCounter(
+        name="words",
+        count_tokens=count_words,
+        cache_path=cache_path,
+    )
+    assert token_counter.count("a b c") == 3
+    assert token_counter("a b c") == 3
+    assert token_counter.count("a b") == 2
+    assert len(n_call) == 2
+
+    # the next run reuses the disk cache
+    token_counter = TokenCounter(
+        name="words",
+        count_tokens=count_words,
+        cache_path=cache_path,
+    )
+    assert token_counter.count("a b c") == 3
+    assert len(n_call) == 2
+
+    # another tokenizer does not reuse the counts
+    token_counter = TokenCounter(cache_path=cache_path)
+    assert token_counter.count("a b c") == estimate_tokens("a b c")
+    assert len(n_call) == 2
+
+    assert TokenCounter().count("x" * 10) == 3
+
+
+def test_pack_by_budget():
+    assert pack_by_budget([], 10) == []
+    assert pack_by_budget([3, 4, 5], 100) == [0, 1, 2]
+    # in order, skip what does not fit, smaller ones may still fit
+    assert pack_by_budget([3, 8, 5, 2], 10) == [0, 2, 3]
+    # higher weight first
+    assert pack_by_budget([3, 8, 5, 2], 10, weight_list=[0, 1, 0, 0]) == [1, 3]
+    # then lower priority first
+    assert pack_by_budget([3, 4, 5], 9, priority_list=[1, 0, 0]) == [1, 2]
+    assert pack_by_budget([3, 4, 5], 0) == []
+
+
+def make_repo():
+    dir_repo = dir_root.joinpath("repo")
+    for relpath, size in [
+        ("README.rst", 400),
+        ("docs/a.rst", 800),
+        ("docs/b.rst", 800),
+        ("src/big.py", 4000),
+        ("src/small.py", 400),
+    ]:
+        path = dir_repo.joinpath(relpath)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text("x" * size, encoding="utf-8")
+    return dir_repo
+
+
+def test_github_file_estimate_tokens():
+    github_file = GitHubFileRecord(
+        domain="github.com",
+        account="MacHu-GWU",
+        repo="docpack-project",
+        branch="main",
+        path_parts=("README.rst",),
+        content="x" * 400,
+    )
+    assert github_file.estimate_tokens() == estimate_tokens(github_file.to_xml())
+    assert github_file.estimate_tokens(["path"]) < 20
+    token_counter = TokenCounter(name="chars", count_tokens=len)
+    assert github_file.estimate_tokens(token_counter=token_counter) == len(
+        github_file.to_xml()
+    )
+
+
+def test_github_pipeline():
+    shutil.rmtree(dir_root, ignore_errors=True)
+    dir_repo = make_repo()
+    n_tokens_mapping = {
+        relpath: GitHubFileRecord(
+            domain="github.com",
+            account="MacHu-GWU",
+            repo="docpack-project",
+            branch="main",
+            path_parts=tuple(relpath.split("/")),
+            content=dir_repo.joinpath(relpath).read_text(encoding="utf-8"),
+        ).estimate_tokens()
+        for relpath in ["README.rst", "docs/a.rst", "docs/b.rst", "src/small.py"]
+    }
+    for max_workers in [None, 2]:
+        gh_pipeline = GitHubPipeline(
+            domain="github.com",
+            account="MacHu-GWU",
+            repo="docpack-project",
+            branch="main",
+            dir_repo=dir_repo,
+            # src before docs, unless weighted
+            include=["src/**/*.py", "docs/**/*.rst", "README.rst"],
+            exclude=[],
+            dir_out=dir_root.joinpath(f"out-{max_workers}", "docs"),
+            path_bundle=dir_root.joinpath(f"out-{max_workers}", "knowledge_base.txt"),
+            max_workers=max_workers,
+            token_budget=700,
+            include_weights={"README.rst": 10, "docs/a.rst": 5},
+        )
+        sync_summary = gh_pipeline.fetch()
+        # README.rst and docs/a.rst are weighted, src/big.py does not fit,
+        # src/small.py has priority over docs/b.rst which does not fit anymore
+        assert sync_summary.added == ["README.rst", "docs/a.rst", "src/small.py"]
+        assert sync_summary.over_budget == ["docs/b.rst", "src/big.py"]
+        assert sync_summary.n_tokens_by_source == {
+            relpath: n_tokens_mapping[relpath] for relpath in sync_summary.added
+        }
+        assert sync_summary.n_tokens == sum(
+            n_tokens_mapping[relpath] for relpath in sync_summary.added
+        )
+        assert sync_summary.n_tokens <= 700
+        assert len(list(gh_pipeline.dir_out.iterdir())) == 3
+        with BundleReader(gh_pipeline.path_bundle) as bundle_reader:
+            assert len(bundle_reader) == 3
+
+    # the content read to count the tokens is reused by the export
+    path_list, content_mapping = gh_pipeline._pack(
+        gh_pipeline._list_matching_paths(), SyncSummary()
+    )
+    assert [relpath for relpath, _ in path_list] == list(content_mapping)
+    for relpath, content in content_mapping.items():
+        assert content == dir_repo.joinpath(relpath).read_text(encoding="utf-8")
+
+    with pytest.raises(ValueError):
+        gh_pipeline.fetch_incremental()
+
+
+def make_page(page_id: str, i: int, text: str, id_path: str) -> ConfluencePage:
+    atlas_doc = {
+        "type": "doc",
+        "version": 1,
+        "content": [{"type": "paragraph", "content": [{"type": "text", "text": text}]}],
+    }
+    return ConfluencePage(
+        page_data={
+            "id": page_id,
+            "title": f"Page {page_id}",
+            "body": {"atlas_doc_format": {"value": json.dumps(atlas_doc)}},
+            "_links": {"webui": f"/spaces/UT/pages/{page_id}"},
+        },
+        site_url="https://example.atlassian.net",
+        id_path=id_path,
+        position_path=f"/{i}",
+        breadcrumb_path=f"|| Page {page_id}",
+    )
+
+
+def test_confluence_pipeline():
+    shutil.rmtree(dir_root, ignore_errors=True)
+    # 1 has two children, 2 and 3, and 4 is a standalone page
+    page_list = [
+        make_page("1", 0, "x" * 400, "/1"),
+        make_page("2", 1, "x" * 400, "/1/2"),
+        make_page("3", 2, "x" * 2000, "/1/3"),
+        make_page("4", 3, "x" * 400, "/4"),
+    ]
+    page = page_list[0]
+    assert page.estimate_tokens() == estimate_tokens(page.to_xml())
+
+    confluence_pipeline = ConfluencePipeline(
+        confluence=pyatlassian.confluence.Confluence(
+            url="https://example.atlassian.net",
+            username="user",
+            password="password",
+        ),
+        space_id=1,
+        include=["4", "1/*"],
+        exclude=[],
+        dir_out=dir_root.joinpath("confluence"),
+        cache_key="test",
+        token_budget=400,
+        include_weights={
+            "https://example.atlassian.net/wiki/spaces/UT/pages/2/Page+2": 1,
+        },
+    )
+    # page 2 is weighted, page 4 has priority over page 1, page 3 does not fit
+    n_tokens_list = [page.estimate_tokens() for page in page_list]
+    assert n_tokens_list[1] + n_tokens_list[3] < 400
+    assert n_tokens_list[0] + n_tokens_list[1] + n_tokens_list[3] > 400
+    sync_summary = SyncSummary()
+    matched_pages = confluence_pipeline._pack(
+        hierarchy=PageHierarchy(page_list),
+        matched_pages=page_list,
+        sync_summary=sync_summary,
+    )
+    confluence_pipeline.export_pages(matched_pages, sync_summary=sync_summary)
+    assert sync_summary.added == ["2", "4"]
+    assert sync_summary.over_budget == ["1", "3"]
+    assert sync_summary.n_tokens_by_source == {
+        "2": n_tokens_list[1],
+        "4": n_tokens_list[3],
+    }
+    assert sync_summary.n_tokens == n_tokens_list[1] + n_tokens_list[3]
+    assert sorted(path.name for path in confluence_pipeline.dir_out.iterdir()) == [
+        "Page 2.xml",
+        "Page 4.xml",
+    ]
+
+
+if __name__ == "__main__":
+    from docpack.tests import run_cov_test
+
+    run_cov_test(
+        __file__,
+        "docpack.tokens",
+        preview=False,
+    )
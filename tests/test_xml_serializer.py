@@ -0,0 +1,214 @@
+# -*- coding: utf-8 -*-
+
+import io
+import json
+import itertools
+import dataclasses
+
+from docpack.paths import dir_tmp
+from docpack.constants import TAB, GitHubFileFieldEnum, ConfluencePageFieldEnum
+from docpack.xml_serializer import XmlElement, XmlSerializer
+from docpack.github_fetcher import GitHubFile, GitHubFileRecord
+from docpack.confluence_fetcher import ConfluencePage
+
+
+@dataclasses.dataclass
+class Doc:
+    url: str
+    note: str
+    body: str
+
+
+element_list = [
+    XmlElement(field="source_type", constant="Unit Test"),
+    XmlElement(field="url", attr="url"),
+    XmlElement(field="note", attr="note", optional=True),
+    XmlElement(field="body", attr="body", block=True),
+]
+
+
+def test_xml_serializer():
+    serializer = XmlSerializer.new(element_list)
+    doc = Doc(url="https://example.com/{0}", note="", body="line 1 {}\nline 2")
+    expected = "\n".join(
+        [
+            "<document>",
+            "  <source_type>Unit Test</source_type>",
+            "  <url>https://example.com/{0}</url>",
+            "  <body>",
+            "line 1 {}",
+            "line 2",
+            "  </body>",
+            "</document>",
+        ]
+    )
+    assert serializer.to_xml(doc) == expected
+    buffer = io.StringIO()
+    serializer.write_xml(doc, buffer)
+    assert buffer.getvalue() == expected
+
+    doc.note = "a {note}"
+    expected = expected.replace(
+        "</url>\n",
+        "</url>\n  <note>a {note}</note>\n",
+    )
+    assert serializer.to_xml(doc) == expected
+    buffer = io.StringIO()
+    serializer.write_xml(doc, buffer)
+    assert buffer.getvalue() == expected
+
+    path_out = dir_tmp.joinpath("xml_serializer", "sub", "doc.xml")
+    path_out.unlink(missing_ok=True)
+    serializer.write_file(doc, path_out)
+    assert path_out.read_text(encoding="utf-8") == expected
+
+    assert XmlSerializer.new([]).to_xml(doc) == "<document>\n</document>"
+
+
+# the hand written templates of GitHubFile.to_xml and ConfluencePage.to_xml
+# before the compiled serializer, the output must stay byte identical
+def old_github_file_to_xml(github_file, wanted_fields=None) -> str:
+    if wanted_fields is None:
+        wanted_fields = [field.value for field in GitHubFileFieldEnum]
+    lines = list()
+
+    lines.append("<document>")
+    if GitHubFileFieldEnum.source_type.value in wanted_fields:
+        field = GitHubFileFieldEnum.source_type.value
+        lines.append(f"{TAB}<{field}>GitHub Repository</{field}>")
+    if GitHubFileFieldEnum.github_url.value in wanted_fields:
+        field = GitHubFileFieldEnum.github_url.value
+        lines.append(f"{TAB}<{field}>{github_file.github_url}</{field}>")
+    if GitHubFileFieldEnum.account.value in wanted_fields:
+        field = GitHubFileFieldEnum.account.value
+        lines.append(f"{TAB}<{field}>{github_file.account}</{field}>")
+    if GitHubFileFieldEnum.repo.value in wanted_fields:
+        field = GitHubFileFieldEnum.repo.value
+        lines.append(f"{TAB}<{field}>{github_file.repo}</{field}>")
+    if GitHubFileFieldEnum.branch.value in wanted_fields:
+        field = GitHubFileFieldEnum.branch.value
+        lines.append(f"{TAB}<{field}>{github_file.branch}</{field}>")
+    if GitHubFileFieldEnum.path.value in wanted_fields:
+        field = GitHubFileFieldEnum.path.value
+        lines.append(f"{TAB}<{field}>{github_file.path}</{field}>")
+    if github_file.title:
+        if GitHubFileFieldEnum.title.value in wanted_fields:
+            field = GitHubFileFieldEnum.title.value
+            lines.append(f"{TAB}<{field}>{github_file.title}</{field}>")
+    if github_file.description:
+        if GitHubFileFieldEnum.description.value in wanted_fields:
+            field = GitHubFileFieldEnum.description.value
+            lines.append(f"{TAB}<{field}>")
+            lines.append(github_file.description)
+            lines.append(f"{TAB}</{field}>")
+    if GitHubFileFieldEnum.content.value in wanted_fields:
+        field = GitHubFileFieldEnum.content.value
+        lines.append(f"{TAB}<{field}>")
+        lines.append(github_file.content)
+        lines.append(f"{TAB}</{field}>")
+    lines.append("</document>")
+    return "\n".join(lines)
+
+
+def old_confluence_page_to_xml(page, wanted_fields=None) -> str:
+    if wanted_fields is None:
+        wanted_fields = [field.value for field in ConfluencePageFieldEnum]
+    lines = list()
+    lines.append("<document>")
+    if ConfluencePageFieldEnum.source_type.value in wanted_fields:
+        field = ConfluencePageFieldEnum.source_type.value
+        lines.append(f"{TAB}<{field}>Confluence Page</{field}>")
+    if ConfluencePageFieldEnum.confluence_url.value in wanted_fields:
+        field = ConfluencePageFieldEnum.confluence_url.value
+        lines.append(f"{TAB}<{field}>{page.webui_url}</{field}>")
+    if ConfluencePageFieldEnum.title.value in wanted_fields:
+        field = ConfluencePageFieldEnum.title.value
+        lines.append(f"{TAB}<{field}>{page.title}</{field}>")
+    if ConfluencePageFieldEnum.markdown_content.value in wanted_fields:
+        field = ConfluencePageFieldEnum.markdown_content.value
+        lines.append(f"{TAB}<{field}>")
+        lines.append(page.markdown)
+        lines.append(f"{TAB}</{field}>")
+    lines.append("</document>")
+
+    return "\n".join(lines)
+
+
+def iter_wanted_fields(enum_class):
+    """
+    None, then every subset of the fields, in enum order.
+    """
+    yield None
+    fields = [field.value for field in enum_class]
+    for n in range(len(fields) + 1):
+        for subset in itertools.combinations(fields, n):
+            yield list(subset)
+
+
+def assert_same_xml(document, expected: str, wanted_fields):
+    assert document.to_xml(wanted_fields) == expected
+    buffer = io.StringIO()
+    document.write_xml(buffer, wanted_fields)
+    assert buffer.getvalue() == expected
+
+
+def test_github_file_parity():
+    kwargs = dict(
+        domain="github.com",
+        account="MacHu-GWU",
+        repo="docpack-project",
+        branch="main",
+        path_parts=("docpack", "api {0}.py"),
+        content="line 1 {}\nline 2 {content}\n",
+    )
+    for title, description in [
+        ("", ""),
+        ("Title {title}", ""),
+        ("", "a description\n{0}"),
+        ("Title", "description"),
+    ]:
+        github_file_record = GitHubFileRecord(
+            **kwargs, title=title, description=description
+        )
+        github_file = github_file_record.to_github_file()
+        assert isinstance(github_file, GitHubFile)
+        for wanted_fields in iter_wanted_fields(GitHubFileFieldEnum):
+            expected = old_github_file_to_xml(github_file, wanted_fields)
+            assert_same_xml(github_file, expected, wanted_fields)
+            assert_same_xml(github_file_record, expected, wanted_fields)
+
+
+def test_confluence_page_parity():
+    for title in ["", "Page {0}"]:
+        atlas_doc = {
+            "type": "doc",
+            "version": 1,
+            "content": [
+                {"type": "paragraph", "content": [{"type": "text", "text": "a {b}"}]}
+            ],
+        }
+        page = ConfluencePage(
+            page_data={
+                "id": "1",
+                "title": title,
+                "body": {"atlas_doc_format": {"value": json.dumps(atlas_doc)}},
+                "_links": {"webui": "/spaces/UT/pages/1/{page}"},
+            },
+            site_url="https://example.atlassian.net",
+            id_path="/1",
+            position_path="/0",
+            breadcrumb_path=f"|| {title}",
+        )
+        for wanted_fields in iter_wanted_fields(ConfluencePageFieldEnum):
+            expected = old_confluence_page_to_xml(page, wanted_fields)
+            assert_same_xml(page, expected, wanted_fields)
+
+
+if __name__ == "__main__":
+    from docpack.tests import run_cov_test
+
+    run_cov_test(
+        __file__,
+        "docpack.xml_serializer",
+        preview=False,
+    )
@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+
+"""
+Benchmark random access to one document of a large bundle with
+:class:`~docpack.bundle.BundleReader` vs reading and scanning the whole file.
+
+Run::
+
+    pytest tests_load/test_bundle.py -s
+"""
+
+import time
+import random
+import shutil
+
+from docpack.paths import dir_tmp
+from docpack.bundle import BundleWriter, BundleReader
+from docpack.github_fetcher import GitHubFileRecord, get_github_file_xml_serializer
+
+dir_root = dir_tmp.joinpath("bench_bundle")
+path_bundle = dir_root.joinpath("knowledge_base.txt")
+
+N_DOC = 50_000
+CONTENT = ("x" * 99 + "\n") * 20  # 2KB per document, 100MB in total
+
+
+def setup_module(module):
+    shutil.rmtree(dir_root, ignore_errors=True)
+    serializer = get_github_file_xml_serializer()
+    with BundleWriter(path_bundle=path_bundle) as bundle_writer:
+        for i in range(N_DOC):
+            github_file = GitHubFileRecord(
+                domain="github.com",
+                account="MacHu-GWU",
+                repo="docpack-project",
+                branch="main",
+                path_parts=("docs", f"dir{i % 100}", f"file{i}.md"),
+                content=CONTENT,
+            )
+            bundle_writer.add_document(
+                obj=github_file,
+                serializer=serializer,
+                key=github_file.path,
+                url=github_file.github_url,
+                uri_hash=github_file.uri_hash,
+            )
+
+
+def teardown_module(module):
+    shutil.rmtree(dir_root, ignore_errors=True)
+
+
+def test_random_access():
+    key_list = [
+        f"docs/dir{i % 100}/file{i}.md" for i in random.sample(range(N_DOC), 100)
+    ]
+
+    start = time.perf_counter()
+    for key in key_list[:5]:
+        text = path_bundle.read_text(encoding="utf-8")
+        documents = text.split("\n<document>")
+        _ = [doc for doc in documents if f"<path>{key}</path>" in doc]
+    elapsed = (time.perf_counter() - start) / 5
+    print(f"full scan: {elapsed * 1000:.3f} ms/doc")
+
+    start = time.perf_counter()
+    bundle_reader = BundleReader(path_bundle)
+    elapsed = time.perf_counter() - start
+    print(f"open reader (parse index): {elapsed * 1000:.3f} ms")
+
+    start = time.perf_counter()
+    with bundle_reader:
+        for key in key_list:
+            assert f"<path>{key}</path>" in bundle_reader.get(key)
+    elapsed = (time.perf_counter() - start) / len(key_list)
+    print(f"BundleReader.get: {elapsed * 1000:.3f} ms/doc")
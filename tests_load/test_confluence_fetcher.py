@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+
+"""
+Benchmark building the page hierarchy of synthetic 100k page spaces of
+varying depth with
+:func:`~docpack.confluence_fetcher.enrich_pages_with_hierarchy_data`.
+The pages are shuffled, as the API does not list parents before children.
+
+Then benchmark matching many include / exclude patterns with
+:class:`~docpack.confluence_fetcher.PageHierarchy`, against the per page
+:func:`~docpack.confluence_fetcher.is_matching` check.
+
+Run::
+
+    pytest tests_load/test_confluence_fetcher.py -s
+"""
+
+import time
+import random
+
+import pytest
+
+from docpack.confluence_fetcher import (
+    ConfluencePage,
+    enrich_pages_with_hierarchy_data,
+    is_matching,
+    PageHierarchy,
+)
+
+N_PAGE = 100_000
+
+
+def new_raw_pages(depth: int) -> list[ConfluencePage]:
+    """
+    Chains of ``depth`` pages, the pages of a level are the children of
+    the previous level, spread round robin, so the tree is ``depth`` deep.
+    """
+    n_chain = N_PAGE // depth
+    page_list = list()
+    for i in range(N_PAGE):
+        level, nth = divmod(i, n_chain)
+        if level == 0:
+            parent_id = None
+        else:
+            parent_id = str(i - n_chain)
+        page_list.append(
+            ConfluencePage.model_construct(
+                page_data={
+                    "id": str(i),
+                    "title": f"p{i}",
+                    "parentId": parent_id,
+                    "position": nth,
+                },
+                site_url="https://example.atlassian.net",
+                id_path=None,
+                position_path=None,
+                breadcrumb_path=None,
+            )
+        )
+    random.Random(depth).shuffle(page_list)
+    return page_list
+
+
+@pytest.mark.parametrize("depth", [1, 5, 20, 100])
+def test_enrich_pages_with_hierarchy_data(depth: int):
+    raw_pages = new_raw_pages(depth)
+    start = time.perf_counter()
+    sorted_pages = enrich_pages_with_hierarchy_data(raw_pages)
+    elapsed = time.perf_counter() - start
+    print(
+        f"\n{N_PAGE} pages, depth {depth}: {elapsed:.3f}s "
+        f"({elapsed / N_PAGE * 1_000_000:.2f} us per page)"
+    )
+    assert len(sorted_pages) == N_PAGE
+    assert max(page.id_path.count("/") for page in sorted_pages) == depth
+
+
+def test_find_matching_pages():
+    sorted_pages = enrich_pages_with_hierarchy_data(new_raw_pages(5))
+    rng = random.Random(1)
+    include = [f"{rng.randrange(N_PAGE)}/*" for _ in range(50)]
+    include.extend(str(rng.randrange(N_PAGE)) for _ in range(50))
+    exclude = [f"{rng.randrange(N_PAGE)}/*" for _ in range(50)]
+
+    start = time.perf_counter()
+    hierarchy = PageHierarchy(sorted_pages)
+    matched_pages = hierarchy.find_matching_pages(include, exclude)
+    elapsed = time.perf_counter() - start
+
+    page_mapping = {page.id: page for page in sorted_pages}
+    start = time.perf_counter()
+    expected = [
+        page
+        for page in sorted_pages
+        if is_matching(page_mapping, page, include, exclude)
+    ]
+    elapsed_is_matching = time.perf_counter() - start
+    print(
+        f"\n{N_PAGE} pages, {len(include) + len(exclude)} patterns: "
+        f"{elapsed:.3f}s with intervals, {elapsed_is_matching:.3f}s with is_matching"
+    )
+    assert matched_pages == expected
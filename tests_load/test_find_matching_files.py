@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+
+"""
+Benchmark serial vs parallel directory scanning in ``find_matching_files``.
+
+Run::
+
+    pytest tests_load/test_find_matching_files.py -s
+"""
+
+import time
+import shutil
+
+from docpack.paths import dir_tmp
+from docpack.find_matching_files import find_matching_files
+
+dir_root = dir_tmp.joinpath("bench_find_matching_files")
+
+N_TOP_DIR = 100
+N_SUB_DIR = 10
+N_FILE = 100  # 100 * 10 * 100 = 100k files
+
+
+def setup_module(module):
+    shutil.rmtree(dir_root, ignore_errors=True)
+    for i in range(N_TOP_DIR):
+        for j in range(N_SUB_DIR):
+            dir_sub = dir_root.joinpath(f"pkg{i}", f"sub{j}")
+            dir_sub.mkdir(parents=True)
+            for k in range(N_FILE):
+                ext = "py" if k % 2 else "txt"
+                dir_sub.joinpath(f"file{k}.{ext}").write_text("")
+
+
+def teardown_module(module):
+    shutil.rmtree(dir_root, ignore_errors=True)
+
+
+def _run(workers) -> tuple[float, list]:
+    start = time.perf_counter()
+    path_list = list(
+        find_matching_files(
+            dir_root=dir_root,
+            include=["**/*.py"],
+            exclude=["pkg0/**"],
+            workers=workers,
+        )
+    )
+    return time.perf_counter() - start, path_list
+
+
+def test_serial_vs_parallel():
+    serial_elapsed, serial_path_list = _run(workers=None)
+    print(f"serial: {serial_elapsed:.3f} sec, {len(serial_path_list)} files")
+    expected = sorted(
+        serial_path_list,
+        key=lambda path: path.relative_to(dir_root).as_posix(),
+    )
+    for workers in [2, 4, 8, 16]:
+        elapsed, path_list = _run(workers=workers)
+        print(f"{workers = }: {elapsed:.3f} sec, {len(path_list)} files")
+        assert path_list == expected
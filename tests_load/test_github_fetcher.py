@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+
+"""
+Benchmark the peak memory and run time of ``GitHubPipeline.fetch``, serial
+(streaming) vs ``max_workers``.
+
+Run::
+
+    pytest tests_load/test_github_fetcher.py -s
+"""
+
+import time
+import shutil
+import tracemalloc
+
+from docpack.paths import dir_tmp
+from docpack.github_fetcher import (
+    get_github_url,
+    GitHubFile,
+    GitHubFileRecord,
+    find_matching_github_files_from_cloned_folder,
+    GitHubPipeline,
+)
+
+dir_root = dir_tmp.joinpath("bench_github_fetcher")
+dir_repo = dir_root.joinpath("repo")
+
+N_DIR = 20
+N_FILE = 100  # 20 * 100 = 2000 files
+FILE_SIZE = 50_000  # 2000 * 50KB = 100MB
+
+
+def setup_module(module):
+    shutil.rmtree(dir_root, ignore_errors=True)
+    content = ("x" * 99 + "\n") * (FILE_SIZE // 100)
+    for i in range(N_DIR):
+        dir_sub = dir_repo.joinpath("docs", f"dir{i}")
+        dir_sub.mkdir(parents=True)
+        for j in range(N_FILE):
+            dir_sub.joinpath(f"file{j}.md").write_text(content)
+
+
+def teardown_module(module):
+    shutil.rmtree(dir_root, ignore_errors=True)
+
+
+def _new_pipeline(dir_out, max_workers) -> GitHubPipeline:
+    return GitHubPipeline(
+        domain="github.com",
+        account="MacHu-GWU",
+        repo="docpack-project",
+        branch="main",
+        dir_repo=dir_repo,
+        include=["docs/**/*.md"],
+        exclude=[],
+        dir_out=dir_out,
+        max_workers=max_workers,
+    )
+
+
+def _measure(func) -> tuple[float, int]:
+    tracemalloc.start()
+    start = time.perf_counter()
+    func()
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak
+
+
+def test_fetch():
+    elapsed, peak = _measure(
+        lambda: find_matching_github_files_from_cloned_folder(
+            domain="github.com",
+            account="MacHu-GWU",
+            repo="docpack-project",
+            branch="main",
+            dir_repo=dir_repo,
+            include=["docs/**/*.md"],
+            exclude=[],
+        )
+    )
+    print(f"materialize list: {elapsed:.3f} sec, peak {peak / 1_000_000:.1f} MB")
+
+    output_list = list()
+    for max_workers in [None, 4, 16]:
+        dir_out = dir_root.joinpath(f"out-{max_workers}")
+        gh_pipeline = _new_pipeline(dir_out=dir_out, max_workers=max_workers)
+        elapsed, peak = _measure(gh_pipeline.fetch)
+        print(
+            f"fetch {max_workers = }: {elapsed:.3f} sec, "
+            f"peak {peak / 1_000_000:.1f} MB"
+        )
+        # a bounded number of files in memory, not the whole repo
+        assert peak < N_DIR * N_FILE * FILE_SIZE / 10
+        output_list.append(
+            {path.name: path.read_bytes() for path in dir_out.glob("*.xml")}
+        )
+    assert output_list[0] == output_list[1] == output_list[2]
+
+
+def test_github_file_record():
+    n = 50_000
+    content = "x" * 1000
+    kwargs = dict(domain="github.com", account="a", repo="r", branch="main")
+    path_parts_list = [("docs", f"dir{i % 100}", f"file{i}.md") for i in range(n)]
+
+    start = time.perf_counter()
+    for path_parts in path_parts_list:
+        github_file = GitHubFile(
+            github_url=get_github_url(path_parts=path_parts, **kwargs),
+            path_parts=path_parts,
+            title="",
+            description="",
+            content=content,
+            **kwargs,
+        )
+        _ = (github_file.uri_hash, github_file.breadcrumb_path, github_file.path)
+    elapsed = time.perf_counter() - start
+    print(f"GitHubFile: {elapsed:.3f} sec for {n} files")
+
+    start = time.perf_counter()
+    for path_parts in path_parts_list:
+        github_file = GitHubFileRecord(path_parts=path_parts, content=content, **kwargs)
+        _ = (github_file.uri_hash, github_file.breadcrumb_path, github_file.path)
+    elapsed = time.perf_counter() - start
+    print(f"GitHubFileRecord: {elapsed:.3f} sec for {n} files")
@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+
+"""
+Benchmark near duplicate detection of tens of thousands of templated
+documents with :class:`~docpack.near_dedup.MinHashLSH`, and check that the
+LSH candidates find (almost) all near duplicates without pairwise comparison.
+
+Run::
+
+    pytest tests_load/test_near_dedup.py -s
+"""
+
+import time
+import random
+
+import pytest
+
+pytest.importorskip("numpy")
+
+from docpack.near_dedup import MinHashLSH
+
+N_TEMPLATE = 200
+N_DOC = 20_000
+N_WORD = 300
+
+
+def test_minhash_lsh():
+    rng = random.Random(1)
+    vocab = [f"word{i}" for i in range(5000)]
+    template_list = [rng.choices(vocab, k=N_WORD) for _ in range(N_TEMPLATE)]
+    text_list = list()
+    for i in range(N_DOC):
+        if i < N_TEMPLATE:
+            words = template_list[i]
+        elif i % 2:
+            # a templated page with a few edits
+            words = list(template_list[i % N_TEMPLATE])
+            for _ in range(3):
+                words[rng.randrange(N_WORD)] = rng.choice(vocab)
+        else:
+            # an unrelated page
+            words = rng.choices(vocab, k=N_WORD)
+        text_list.append(" ".join(words))
+    n_near_duplicate = sum(1 for i in range(N_TEMPLATE, N_DOC) if i % 2)
+
+    lsh = MinHashLSH(threshold=0.8)
+    start = time.perf_counter()
+    result_list = [lsh.add(str(i), text) for i, text in enumerate(text_list)]
+    elapsed = time.perf_counter() - start
+    n_found = sum(1 for result in result_list if result is not None)
+    print(
+        f"\n{N_DOC} documents in {elapsed:.2f}s "
+        f"({elapsed / N_DOC * 1000:.3f} ms per document), "
+        f"found {n_found} / {n_near_duplicate} near duplicates"
+    )
+    assert n_found >= 0.98 * n_near_duplicate
+    assert n_found <= n_near_duplicate
@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+
+"""
+Benchmark the per document cost of the XML serialization, the original
+``to_xml`` algorithm (checks every field against ``wanted_fields`` and joins
+a fresh list of lines) vs the compiled :class:`~docpack.xml_serializer.XmlSerializer`.
+
+Run::
+
+    pytest tests_load/test_xml_serializer.py -s
+"""
+
+import io
+import time
+
+from docpack.constants import TAB, GitHubFileFieldEnum
+from docpack.github_fetcher import (
+    GitHubFileRecord,
+    get_github_file_xml_serializer,
+)
+
+N_DOC = 100_000
+
+
+def legacy_to_xml(github_file, wanted_fields=None) -> str:
+    if wanted_fields is None:
+        wanted_fields = [field.value for field in GitHubFileFieldEnum]
+    lines = list()
+    lines.append("<document>")
+    if GitHubFileFieldEnum.source_type.value in wanted_fields:
+        field = GitHubFileFieldEnum.source_type.value
+        lines.append(f"{TAB}<{field}>GitHub Repository</{field}>")
+    if GitHubFileFieldEnum.github_url.value in wanted_fields:
+        field = GitHubFileFieldEnum.github_url.value
+        lines.append(f"{TAB}<{field}>{github_file.github_url}</{field}>")
+    if GitHubFileFieldEnum.account.value in wanted_fields:
+        field = GitHubFileFieldEnum.account.value
+        lines.append(f"{TAB}<{field}>{github_file.account}</{field}>")
+    if GitHubFileFieldEnum.repo.value in wanted_fields:
+        field = GitHubFileFieldEnum.repo.value
+        lines.append(f"{TAB}<{field}>{github_file.repo}</{field}>")
+    if GitHubFileFieldEnum.branch.value in wanted_fields:
+        field = GitHubFileFieldEnum.branch.value
+        lines.append(f"{TAB}<{field}>{github_file.branch}</{field}>")
+    if GitHubFileFieldEnum.path.value in wanted_fields:
+        field = GitHubFileFieldEnum.path.value
+        lines.append(f"{TAB}<{field}>{github_file.path}</{field}>")
+    if github_file.title:
+        if GitHubFileFieldEnum.title.value in wanted_fields:
+            field = GitHubFileFieldEnum.title.value
+            lines.append(f"{TAB}<{field}>{github_file.title}</{field}>")
+    if github_file.description:
+        if GitHubFileFieldEnum.description.value in wanted_fields:
+            field = GitHubFileFieldEnum.description.value
+            lines.append(f"{TAB}<{field}>")
+            lines.append(github_file.description)
+            lines.append(f"{TAB}</{field}>")
+    if GitHubFileFieldEnum.content.value in wanted_fields:
+        field = GitHubFileFieldEnum.content.value
+        lines.append(f"{TAB}<{field}>")
+        lines.append(github_file.content)
+        lines.append(f"{TAB}</{field}>")
+    lines.append("</document>")
+    return "\n".join(lines)
+
+
+def test_to_xml():
+    github_file_list = [
+        GitHubFileRecord(
+            domain="github.com",
+            account="MacHu-GWU",
+            repo="docpack-project",
+            branch="main",
+            path_parts=("docs", f"file{i}.md"),
+            content="x" * 200,
+        )
+        for i in range(N_DOC)
+    ]
+    for wanted_fields in [None, ["path", "content"]]:
+        start = time.perf_counter()
+        legacy_result = [legacy_to_xml(f, wanted_fields) for f in github_file_list]
+        legacy_elapsed = time.perf_counter() - start
+
+        start = time.perf_counter()
+        serializer = get_github_file_xml_serializer(wanted_fields)
+        result = [serializer.to_xml(f) for f in github_file_list]
+        elapsed = time.perf_counter() - start
+
+        start = time.perf_counter()
+        for f in github_file_list:
+            serializer.write_xml(f, io.StringIO())
+        write_elapsed = time.perf_counter() - start
+
+        assert result == legacy_result
+        print(
+            f"{wanted_fields = }: "
+            f"legacy {legacy_elapsed / N_DOC * 1_000_000:.2f} us/doc, "
+            f"compiled {elapsed / N_DOC * 1_000_000:.2f} us/doc, "
+            f"write_xml {write_elapsed / N_DOC * 1_000_000:.2f} us/doc"
+        )